@@ -1,6 +1,5 @@
-import io
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterator, List
 
 from fastapi import BackgroundTasks
 
@@ -21,6 +20,7 @@ from dataherald.api.types.responses import (
     InstructionResponse,
     NLGenerationResponse,
     PromptResponse,
+    ScanJobResponse,
     SQLGenerationResponse,
     TableDescriptionResponse,
 )
@@ -48,12 +48,31 @@ class API(Component, ABC):
         """Returns the current server time in nanoseconds to check if the server is alive"""
         pass
 
+    @abstractmethod
+    def stats(self) -> dict:
+        """Returns the process wide counters of the shared resources"""
+        pass
+
     @abstractmethod
     def scan_db(
         self, scanner_request: ScannerRequest, background_tasks: BackgroundTasks
     ) -> list[TableDescriptionResponse]:
         pass
 
+    @abstractmethod
+    def get_scan_jobs(
+        self, db_connection_id: str | None = None
+    ) -> list[ScanJobResponse]:
+        pass
+
+    @abstractmethod
+    def get_scan_job(self, scan_job_id: str) -> ScanJobResponse:
+        pass
+
+    @abstractmethod
+    def cancel_scan_job(self, scan_job_id: str) -> ScanJobResponse:
+        pass
+
     @abstractmethod
     def refresh_table_description(
         self, refresh_table_description: RefreshTableDescriptionRequest
@@ -123,11 +142,25 @@ class API(Component, ABC):
         pass
 
     @abstractmethod
-    def execute_sql_query(self, sql_generation_id: str, max_rows: int = 100) -> list:
+    def execute_sql_query(
+        self, sql_generation_id: str, max_rows: int = 100, result_format: str = "json"
+    ) -> list | Iterator[bytes]:
+        pass
+
+    @abstractmethod
+    def execute_sql_query_page(
+        self,
+        sql_generation_id: str,
+        page_size: int = 100,
+        continuation_token: str | None = None,
+        result_format: str = "json",
+    ) -> tuple[list | Iterator[bytes], str | None]:
         pass
 
     @abstractmethod
-    def export_csv_file(self, sql_generation_id: str) -> io.StringIO:
+    def export_csv_file(
+        self, sql_generation_id: str, gzip: bool = False, result_format: str = "csv"
+    ) -> Iterator[bytes]:
         pass
 
     @abstractmethod
@@ -205,13 +238,13 @@ class API(Component, ABC):
         pass
 
     @abstractmethod
-    def create_sql_generation(
+    async def create_sql_generation(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
     ) -> SQLGenerationResponse:
         pass
 
     @abstractmethod
-    def create_prompt_and_sql_generation(
+    async def create_prompt_and_sql_generation(
         self, prompt_sql_generation_request: PromptSQLGenerationRequest
     ) -> SQLGenerationResponse:
         pass
@@ -1,12 +1,10 @@
 import asyncio
 import datetime
-import io
 import json
 import logging
 import os
 import time
-from queue import Queue
-from typing import List
+from typing import Iterator, List
 
 from bson.objectid import InvalidId, ObjectId
 from fastapi import BackgroundTasks, HTTPException
@@ -30,6 +28,7 @@ from dataherald.api.types.responses import (
     InstructionResponse,
     NLGenerationResponse,
     PromptResponse,
+    ScanJobResponse,
     SQLGenerationResponse,
     TableDescriptionResponse,
 )
@@ -39,12 +38,17 @@ from dataherald.db import DB
 from dataherald.db_scanner import Scanner
 from dataherald.db_scanner.models.types import (
     QueryHistory,
+    ScanJob,
+    ScanJobStatus,
+    TableDescription,
+    TableDescriptionStatus,
 )
 from dataherald.db_scanner.repository.base import (
     InvalidColumnNameError,
     TableDescriptionRepository,
 )
 from dataherald.db_scanner.repository.query_history import QueryHistoryRepository
+from dataherald.db_scanner.repository.scan_jobs import ScanJobRepository
 from dataherald.finetuning.openai_finetuning import OpenAIFineTuning
 from dataherald.repositories.database_connections import (
     DatabaseConnectionNotFoundError,
@@ -65,14 +69,20 @@ from dataherald.services.sql_generations import (
     EmptySQLGenerationError,
     SQLGenerationService,
 )
+from dataherald.smart_cache import SmartCache
 from dataherald.sql_database.base import (
+    DBConnections,
     SQLDatabase,
     SQLInjectionError,
 )
 from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_database.query_timeout import QueryStats
+from dataherald.sql_database.result_cache import SQLResultCache
+from dataherald.sql_database.result_cursors import InvalidContinuationTokenError
 from dataherald.sql_database.services.database_connection import (
     DatabaseConnectionService,
 )
+from dataherald.sql_database.ssh_tunnel import SSHTunnelManager
 from dataherald.types import (
     BaseLLM,
     CancelFineTuningRequest,
@@ -91,23 +101,31 @@ from dataherald.types import (
 )
 from dataherald.utils.encrypt import FernetEncrypt
 from dataherald.utils.error_codes import error_response, stream_error_response
+from dataherald.utils.exports import arrow_chunks, gzip_chunks, record_batches
 from dataherald.utils.sql_utils import (
     filter_golden_records_based_on_schema,
     validate_finetuning_schema,
 )
+from dataherald.utils.streaming import StreamChannel
+from dataherald.workers.scan import (
+    SCAN_JOB_LEASE_TIMEOUT,
+    ScanJobRecovery,
+    run_scan_job,
+    worker_name,
+)
 
 logger = logging.getLogger(__name__)
 
 MAX_ROWS_TO_CREATE_CSV_FILE = 50
+SCAN_EXECUTION_MODE = os.environ.get("SCAN_EXECUTION_MODE", "background")
 
 
-def async_scanning(scanner, database, table_descriptions, storage):
-    scanner.scan(
-        database,
-        table_descriptions,
-        TableDescriptionRepository(storage),
-        QueryHistoryRepository(storage),
+def async_scanning(system, storage, scan_job_id):
+    scan_job = ScanJobRepository(storage).claim(
+        worker_name("api"), SCAN_JOB_LEASE_TIMEOUT, id=scan_job_id
     )
+    if scan_job:
+        run_scan_job(system, storage, scan_job)
 
 
 def async_fine_tuning(system, storage, model):
@@ -125,12 +143,20 @@ class FastAPI(API):
         super().__init__(system)
         self.system = system
         self.storage = self.system.instance(DB)
+        # Scan jobs left by a stopped API process are run again once their lease expires
+        if SCAN_EXECUTION_MODE == "background":
+            ScanJobRecovery.start(self.system, self.storage)
 
     @override
     def heartbeat(self) -> int:
         """Returns the current server time in nanoseconds to check if the server is alive"""
         return int(time.time_ns())
 
+    @override
+    def stats(self) -> dict:
+        """Returns the process wide counters of the shared resources"""
+        return {"queries": QueryStats.stats(), "ssh_tunnels": SSHTunnelManager.stats()}
+
     @override
     def scan_db(
         self, scanner_request: ScannerRequest, background_tasks: BackgroundTasks
@@ -156,24 +182,97 @@ class FastAPI(API):
             ].append(table_description)
 
         db_connection_repository = DatabaseConnectionRepository(self.storage)
+        for db_connection_id in data:
+            if not db_connection_repository.find_by_id(db_connection_id):
+                raise DatabaseConnectionNotFoundError(
+                    f"Database connection {db_connection_id} not found"
+                )
         scanner = self.system.instance(Scanner)
         rows = scanner.synchronizing(
             scanner_request,
             TableDescriptionRepository(self.storage),
         )
-        database_connection_service = DatabaseConnectionService(scanner, self.storage)
+        scan_job_repository = ScanJobRepository(self.storage)
         for db_connection_id, schemas_and_table_descriptions in data.items():
             for schema, table_descriptions in schemas_and_table_descriptions.items():
-                db_connection = db_connection_repository.find_by_id(db_connection_id)
-                database = database_connection_service.get_sql_database(
-                    db_connection, schema
-                )
-
-                background_tasks.add_task(
-                    async_scanning, scanner, database, table_descriptions, self.storage
+                scan_job = scan_job_repository.insert(
+                    ScanJob(
+                        db_connection_id=db_connection_id,
+                        schema_name=schema,
+                        table_description_ids=[
+                            table_description.id
+                            for table_description in table_descriptions
+                        ],
+                        force=scanner_request.force,
+                        total_tables=len(table_descriptions),
+                        metadata=scanner_request.metadata,
+                    )
                 )
+                # In worker mode the job waits in the queue for `python -m dataherald.workers.scan`
+                if SCAN_EXECUTION_MODE == "background":
+                    background_tasks.add_task(
+                        async_scanning, self.system, self.storage, scan_job.id
+                    )
+            self.system.instance(SmartCache).invalidate(db_connection_id)
         return [TableDescriptionResponse(**row.dict()) for row in rows]
 
+    @override
+    def get_scan_jobs(
+        self, db_connection_id: str | None = None
+    ) -> list[ScanJobResponse]:
+        scan_job_repository = ScanJobRepository(self.storage)
+        query = {}
+        if db_connection_id:
+            query["db_connection_id"] = db_connection_id
+        return [
+            ScanJobResponse(**scan_job.dict())
+            for scan_job in scan_job_repository.find_by(query)
+        ]
+
+    @override
+    def get_scan_job(self, scan_job_id: str) -> ScanJobResponse:
+        scan_job_repository = ScanJobRepository(self.storage)
+        try:
+            scan_job = scan_job_repository.find_by_id(scan_job_id)
+        except InvalidId as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        if not scan_job:
+            raise HTTPException(status_code=404, detail="Scan job not found")
+        return ScanJobResponse(**scan_job.dict())
+
+    @override
+    def cancel_scan_job(self, scan_job_id: str) -> ScanJobResponse:
+        """Cancels a queued or running scan job, running jobs stop after the tables that
+        are being scanned"""
+        scan_job = self.get_scan_job(scan_job_id)
+        if scan_job.status not in [
+            ScanJobStatus.QUEUED.value,
+            ScanJobStatus.RUNNING.value,
+        ]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Scan job has already finished with status {scan_job.status}",
+            )
+        scan_job = ScanJobRepository(self.storage).cancel(scan_job_id)
+        if not scan_job:
+            return self.get_scan_job(scan_job_id)
+        if scan_job.started_at is None:
+            # Queued jobs never ran, so their tables are still synchronizing
+            table_description_repository = TableDescriptionRepository(self.storage)
+            for id in scan_job.table_description_ids:
+                table_description = table_description_repository.find_by_id(id)
+                if table_description:
+                    table_description_repository.save_table_info(
+                        TableDescription(
+                            db_connection_id=table_description.db_connection_id,
+                            table_name=table_description.table_name,
+                            status=TableDescriptionStatus.FAILED.value,
+                            error_message="Scan job cancelled",
+                            schema_name=table_description.schema_name,
+                        )
+                    )
+        return ScanJobResponse(**scan_job.dict())
+
     @override
     def create_database_connection(
         self, database_connection_request: DatabaseConnectionRequest
@@ -209,6 +308,7 @@ class FastAPI(API):
         )
         scanner = self.system.instance(Scanner)
         database_connection_service = DatabaseConnectionService(scanner, self.storage)
+        DBConnections.clear_inspection_caches(db_connection.id)
         try:
             data = {}
             if db_connection.schemas:
@@ -226,6 +326,8 @@ class FastAPI(API):
                 data[None] = sql_database.get_tables_and_views()
 
             scanner_repository = TableDescriptionRepository(self.storage)
+            self.system.instance(SmartCache).invalidate(db_connection.id)
+            SQLResultCache.invalidate(db_connection.id, self.storage)
 
             return [
                 TableDescriptionResponse(**record.dict())
@@ -269,9 +371,11 @@ class FastAPI(API):
                 ssh_settings=database_connection_request.ssh_settings,
                 file_storage=database_connection_request.file_storage,
                 metadata=database_connection_request.metadata,
+                scan_concurrency=database_connection_request.scan_concurrency,
             )
 
-            sql_database = SQLDatabase.get_sql_engine(db_connection, True)
+            DBConnections.clear_inspection_caches(db_connection_id)
+            sql_database = SQLDatabase.get_sql_engine(db_connection)
 
             # Get tables and views and create missing table-descriptions as NOT_SCANNED and update DEPRECATED
             scanner_repository = TableDescriptionRepository(self.storage)
@@ -280,6 +384,8 @@ class FastAPI(API):
             tables = sql_database.get_tables_and_views()
             db_connection = db_connection_repository.update(db_connection)
             scanner.refresh_tables(tables, str(db_connection.id), scanner_repository)
+            self.system.instance(SmartCache).invalidate(db_connection.id)
+            SQLResultCache.invalidate(db_connection.id, self.storage)
         except Exception as e:
             # Encrypt sensible values
             fernet_encrypt = FernetEncrypt()
@@ -319,6 +425,7 @@ class FastAPI(API):
             table_description = scanner_repository.update_fields(
                 table, table_description_request
             )
+            self.system.instance(SmartCache).invalidate(table.db_connection_id)
             return TableDescriptionResponse(**table_description.dict())
         except InvalidColumnNameError as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
@@ -426,29 +533,71 @@ class FastAPI(API):
         return [GoldenSQLResponse(**golden_sql.dict()) for golden_sql in golden_sqls]
 
     @override
-    def execute_sql_query(self, sql_generation_id: str, max_rows: int = 100) -> list:
+    def execute_sql_query(
+        self, sql_generation_id: str, max_rows: int = 100, result_format: str = "json"
+    ) -> list | Iterator[bytes]:
         """Executes a SQL query against the database and returns the results"""
         sql_generation_service = SQLGenerationService(self.system, self.storage)
         try:
-            results = sql_generation_service.execute(sql_generation_id, max_rows)
+            snapshot = sql_generation_service.execute_snapshot(
+                sql_generation_id, max_rows
+            )
+        except SQLGenerationNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e)) from e
+        except SQLInjectionError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        if result_format == "json":
+            return snapshot.records(max_rows)
+        return arrow_chunks(
+            snapshot.columns,
+            record_batches(snapshot.columns, [snapshot.rows(max_rows)]),
+            result_format,
+        )
+
+    @override
+    def execute_sql_query_page(
+        self,
+        sql_generation_id: str,
+        page_size: int = 100,
+        continuation_token: str | None = None,
+        result_format: str = "json",
+    ) -> tuple[list | Iterator[bytes], str | None]:
+        """Executes a SQL query and returns a page of its results with the continuation
+        token of the next page"""
+        sql_generation_service = SQLGenerationService(self.system, self.storage)
+        try:
+            columns, rows, next_token = sql_generation_service.execute_page(
+                sql_generation_id, page_size, continuation_token
+            )
         except SQLGenerationNotFoundError as e:
             raise HTTPException(status_code=404, detail=str(e)) from e
+        except InvalidContinuationTokenError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
         except SQLInjectionError as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
         except SQLAlchemyError as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
-        return results[1].get("result", [])
+        if result_format == "json":
+            return [dict(zip(columns, row, strict=True)) for row in rows], next_token
+        return (
+            arrow_chunks(columns, record_batches(columns, [rows]), result_format),
+            next_token,
+        )
 
     @override
-    def export_csv_file(self, sql_generation_id: str) -> io.StringIO:
-        """Exports a SQL query to a CSV file"""
+    def export_csv_file(
+        self, sql_generation_id: str, gzip: bool = False, result_format: str = "csv"
+    ) -> Iterator[bytes]:
+        """Exports a SQL query to a CSV, Arrow or Parquet file"""
         sql_generation_service = SQLGenerationService(self.system, self.storage)
         try:
-            csv_dataframe = sql_generation_service.create_dataframe(sql_generation_id)
-            csv_stream = io.StringIO()
-            csv_dataframe.to_csv(csv_stream, index=False)
+            stream = sql_generation_service.export(sql_generation_id, result_format)
         except SQLGenerationNotFoundError as e:
             raise HTTPException(status_code=404, detail=str(e)) from e
         except SQLInjectionError as e:
@@ -457,7 +606,7 @@ class FastAPI(API):
             raise HTTPException(status_code=400, detail=str(e)) from e
         except EmptySQLGenerationError as e:
             raise HTTPException(status_code=400, detail=str(e)) from e
-        return csv_stream
+        return gzip_chunks(stream) if gzip else stream
 
     @override
     def delete_golden_sql(self, golden_sql_id: str) -> dict:
@@ -510,6 +659,7 @@ class FastAPI(API):
                 metadata=instruction_request.metadata,
             )
             instruction = instruction_repository.insert(instruction)
+            self.system.instance(SmartCache).invalidate(instruction.db_connection_id)
         except Exception as e:
             return error_response(
                 e, instruction_request.dict(), "instruction_not_created"
@@ -538,9 +688,12 @@ class FastAPI(API):
     @override
     def delete_instruction(self, instruction_id: str) -> dict:
         instruction_repository = InstructionRepository(self.storage)
+        instruction = instruction_repository.find_by_id(instruction_id)
         deleted = instruction_repository.delete_by_id(instruction_id)
         if deleted == 0:
             raise HTTPException(status_code=404, detail="Instruction not found")
+        if instruction is not None:
+            self.system.instance(SmartCache).invalidate(instruction.db_connection_id)
         return {"status": "success"}
 
     @override
@@ -560,6 +713,7 @@ class FastAPI(API):
             metadata=instruction_request.metadata,
         )
         instruction_repository.update(updated_instruction)
+        self.system.instance(SmartCache).invalidate(instruction.db_connection_id)
         return InstructionResponse(**updated_instruction.dict())
 
     @override
@@ -702,13 +856,13 @@ class FastAPI(API):
         return model_repository.update(model)
 
     @override
-    def create_sql_generation(
+    async def create_sql_generation(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
     ) -> SQLGenerationResponse:
         try:
             ObjectId(prompt_id)
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation = sql_generation_service.create(
+            sql_generation = await sql_generation_service.acreate(
                 prompt_id, sql_generation_request
             )
         except Exception as e:
@@ -719,14 +873,16 @@ class FastAPI(API):
         return SQLGenerationResponse(**sql_generation.dict())
 
     @override
-    def create_prompt_and_sql_generation(
+    async def create_prompt_and_sql_generation(
         self, prompt_sql_generation_request: PromptSQLGenerationRequest
     ) -> SQLGenerationResponse:
         try:
             prompt_service = PromptService(self.storage)
-            prompt = prompt_service.create(prompt_sql_generation_request.prompt)
+            prompt = await asyncio.to_thread(
+                prompt_service.create, prompt_sql_generation_request.prompt
+            )
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation = sql_generation_service.create(
+            sql_generation = await sql_generation_service.acreate(
                 prompt.id, prompt_sql_generation_request
             )
         except Exception as e:
@@ -895,20 +1051,20 @@ class FastAPI(API):
         self,
         request: StreamPromptSQLGenerationRequest,
     ):
+        channel = StreamChannel()
         try:
-            queue = Queue()
             prompt_service = PromptService(self.storage)
-            prompt = prompt_service.create(request.prompt)
+            prompt = await asyncio.to_thread(prompt_service.create, request.prompt)
             sql_generation_service = SQLGenerationService(self.system, self.storage)
-            sql_generation_service.start_streaming(prompt.id, request, queue)
-            while True:
-                value = queue.get()
-                if value is None:
-                    break
+            await asyncio.to_thread(
+                sql_generation_service.start_streaming, prompt.id, request, channel
+            )
+            async for value in channel.messages():
                 yield value
-                queue.task_done()
-                await asyncio.sleep(0.001)
         except Exception as e:
             yield json.dumps(
                 stream_error_response(e, request.dict(), "nl_generation_not_created")
             )
+        finally:
+            # Stops the agent thread after its current step if the client disconnected
+            channel.cancel()
@@ -59,3 +59,9 @@ class PromptSQLGenerationNLGenerationRequest(NLGenerationRequest):
 
 class UpdateMetadataRequest(BaseModel):
     metadata: dict | None
+
+
+class ExecutionPageRequest(BaseModel):
+    max_rows: int = 100
+    paginate: bool = False
+    continuation_token: str | None = None
@@ -3,7 +3,7 @@ from datetime import datetime
 import pytz
 from pydantic import BaseModel, validator
 
-from dataherald.db_scanner.models.types import TableDescription
+from dataherald.db_scanner.models.types import ScanJob, TableDescription
 from dataherald.sql_database.models.types import DatabaseConnection
 from dataherald.types import GoldenSQL, IntermediateStep, LLMConfig
 
@@ -39,6 +39,7 @@ class SQLGenerationResponse(BaseResponse):
     tokens_used: int | None
     confidence_score: float | None
     error: str | None
+    stage_timings: dict[str, float] | None
 
     @validator("completed_at", pre=True, always=True)
     def completed_at_as_string(cls, v):
@@ -68,5 +69,9 @@ class TableDescriptionResponse(BaseResponse, TableDescription):
     id: str | None
 
 
+class ScanJobResponse(BaseResponse, ScanJob):
+    pass
+
+
 class GoldenSQLResponse(BaseResponse, GoldenSQL):
     pass
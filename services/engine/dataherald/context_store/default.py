@@ -12,6 +12,7 @@ from dataherald.repositories.database_connections import (
 )
 from dataherald.repositories.golden_sqls import GoldenSQLRepository
 from dataherald.repositories.instructions import InstructionRepository
+from dataherald.smart_cache import SmartCache
 from dataherald.types import GoldenSQL, GoldenSQLRequest, Prompt
 from dataherald.utils.sql_utils import extract_the_schemas_from_sql
 
@@ -108,13 +109,22 @@ class DefaultContextStore(ContextStore):
             )
             stored_golden_sqls.append(golden_sqls_repository.insert(golden_sql))
         self.vector_store.add_records(stored_golden_sqls, self.golden_sql_collection)
+        smart_cache = self.system.instance(SmartCache)
+        for db_connection_id in {
+            golden_sql.db_connection_id for golden_sql in stored_golden_sqls
+        }:
+            smart_cache.invalidate(db_connection_id)
         return stored_golden_sqls
 
     @override
     def remove_golden_sqls(self, ids: List) -> bool:
         """Removes the golden sqls from the DB and the VectorDB"""
         golden_sqls_repository = GoldenSQLRepository(self.db)
+        smart_cache = self.system.instance(SmartCache)
         for id in ids:
+            golden_sql = golden_sqls_repository.find_by_id(id)
+            if golden_sql is not None:
+                smart_cache.invalidate(golden_sql.db_connection_id)
             self.vector_store.delete_record(
                 collection=self.golden_sql_collection, id=id
             )
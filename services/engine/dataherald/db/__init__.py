@@ -27,7 +27,25 @@ class DB(Component, ABC):
         pass
 
     @abstractmethod
-    def find_one(self, collection: str, query: dict) -> dict:
+    def upsert_many(self, collection: str, key: str, objs: list[dict]) -> int:
+        """Inserts the objects or updates the ones with the same `key` field in a single
+        round trip, returns the number of inserted objects"""
+        pass
+
+    @abstractmethod
+    def find_one(
+        self, collection: str, query: dict, projection: dict | None = None
+    ) -> dict:
+        """Returns the first matching document, only with the fields of `projection`
+        when it is set"""
+        pass
+
+    @abstractmethod
+    def find_one_and_update(
+        self, collection: str, query: dict, update: dict, sort: list = None
+    ) -> dict | None:
+        """Atomically applies the update operators to the first matching document and
+        returns it updated"""
         pass
 
     @abstractmethod
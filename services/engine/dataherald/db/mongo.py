@@ -1,9 +1,24 @@
 from bson.objectid import ObjectId
 from overrides import override
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient, ReturnDocument, UpdateOne
 
 from dataherald.config import System
 from dataherald.db import DB
+from dataherald.db_scanner.repository import (
+    column_value_indexes,
+    query_history,
+    scan_jobs,
+    table_embeddings,
+)
+from dataherald.repositories import cache_invalidations
+
+INDEXED_REPOSITORIES = [
+    table_embeddings,
+    cache_invalidations,
+    scan_jobs,
+    column_value_indexes,
+    query_history,
+]
 
 
 class MongoDB(DB):
@@ -14,10 +29,39 @@ class MongoDB(DB):
         db_uri = system.settings.require("db_uri")
         db_name = system.settings.require("db_name")
         self._data_store = MongoClient(db_uri, tz_aware=True)[db_name]
+        self.create_indexes()
+
+    def create_indexes(self) -> None:
+        """Creates the indexes the repositories declare, existing ones are left as is"""
+        for repository in INDEXED_REPOSITORIES:
+            for keys in repository.INDEXES:
+                self._data_store[repository.DB_COLLECTION].create_index(
+                    [(key, ASCENDING) for key in keys]
+                )
+
+    @override
+    def find_one(
+        self, collection: str, query: dict, projection: dict | None = None
+    ) -> dict:
+        return self._data_store[collection].find_one(query, projection)
 
     @override
-    def find_one(self, collection: str, query: dict) -> dict:
-        return self._data_store[collection].find_one(query)
+    def upsert_many(self, collection: str, key: str, objs: list[dict]) -> int:
+        if not objs:
+            return 0
+        result = self._data_store[collection].bulk_write(
+            [UpdateOne({key: obj[key]}, {"$set": obj}, upsert=True) for obj in objs],
+            ordered=False,
+        )
+        return result.upserted_count
+
+    @override
+    def find_one_and_update(
+        self, collection: str, query: dict, update: dict, sort: list = None
+    ) -> dict | None:
+        return self._data_store[collection].find_one_and_update(
+            query, update, sort=sort, return_document=ReturnDocument.AFTER
+        )
 
     @override
     def insert_one(self, collection: str, obj: dict) -> int:
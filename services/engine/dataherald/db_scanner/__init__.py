@@ -1,6 +1,7 @@
 """Base class that all scanner classes inherit from."""
 
 from abc import ABC, abstractmethod
+from typing import Callable
 
 from dataherald.config import Component
 from dataherald.db_scanner.models.types import TableDescription
@@ -18,8 +19,14 @@ class Scanner(Component, ABC):
         table_descriptions: list[TableDescription],
         repository: TableDescriptionRepository,
         query_history_repository: QueryHistoryRepository,
+        *,
+        concurrency: int | None = None,
+        force: bool = False,
+        progress: Callable[[TableDescription, bool], bool] | None = None,
     ) -> None:
-        """ "Scan a db"""
+        """ "Scan a db, up to `concurrency` tables at a time. Unchanged tables are skipped
+        unless `force` is set. `progress` is called with every finished table and whether it
+        was scanned, the scan stops when it returns False"""
 
     @abstractmethod
     def synchronizing(
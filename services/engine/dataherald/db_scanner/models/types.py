@@ -18,6 +18,14 @@ class ColumnDetail(BaseModel):
     low_cardinality: bool = False
     categories: list[Any] | None
     foreign_key: ForeignKeyDetail | None
+    schema_tokens: int | None
+    distinct_count: int | None
+
+
+class ColumnProfile(BaseModel):
+    categories: list[Any] | None
+    # Estimated distinct values of the whole column, None if unknown
+    distinct_count: int | None
 
 
 class TableDescriptionStatus(Enum):
@@ -28,6 +36,11 @@ class TableDescriptionStatus(Enum):
     FAILED = "FAILED"
 
 
+class TableFingerprint(BaseModel):
+    schema_hash: str
+    stats_hash: str | None
+
+
 class TableDescription(BaseModel):
     id: str | None
     db_connection_id: str
@@ -41,6 +54,7 @@ class TableDescription(BaseModel):
     status: str = TableDescriptionStatus.SCANNED.value
     error_message: str | None
     metadata: dict | None
+    fingerprint: TableFingerprint | None
     created_at: datetime = Field(default_factory=datetime.now)
 
     @validator("last_schema_sync", pre=True)
@@ -50,6 +64,33 @@ class TableDescription(BaseModel):
         return value.replace(tzinfo=timezone.utc)  # Set the timezone to UTC
 
 
+class ScanJobStatus(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+
+class ScanJob(BaseModel):
+    id: str | None
+    db_connection_id: str
+    schema_name: str | None
+    table_description_ids: list[str] = []
+    force: bool = False
+    status: str = ScanJobStatus.QUEUED.value
+    total_tables: int = 0
+    scanned_tables: int = 0
+    failed_tables: int = 0
+    error: str | None
+    worker_id: str | None
+    heartbeat_at: datetime | None
+    started_at: datetime | None
+    finished_at: datetime | None
+    metadata: dict | None
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
 class QueryHistory(BaseModel):
     id: str | None
     db_connection_id: str
@@ -57,3 +98,25 @@ class QueryHistory(BaseModel):
     query: str
     user: str
     occurrences: int = 0
+    query_hash: str | None
+
+
+class TableEmbedding(BaseModel):
+    id: str | None
+    db_connection_id: str
+    embedding_model: str
+    schema_name: str | None
+    table_name: str
+    content_hash: str
+    embedding: list[float]
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
+class ColumnValueIndex(BaseModel):
+    id: str | None
+    db_connection_id: str
+    schema_name: str | None
+    table_name: str
+    column_name: str
+    values: list[str]
+    created_at: datetime = Field(default_factory=datetime.now)
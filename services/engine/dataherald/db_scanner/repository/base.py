@@ -4,6 +4,7 @@ from bson.objectid import ObjectId
 from pymongo import ASCENDING
 
 from dataherald.db_scanner.models.types import TableDescription
+from dataherald.db_scanner.repository.table_embeddings import TableEmbeddingRepository
 
 DB_COLLECTION = "table_descriptions"
 
@@ -126,4 +127,7 @@ class TableDescriptionRepository:
                             if value is None or value == []:
                                 continue
                             setattr(column, field, value)
+        TableEmbeddingRepository(self.storage).delete_by_table(
+            table.db_connection_id, table.table_name, table.schema_name
+        )
         return self.update(table)
@@ -0,0 +1,75 @@
+from dataherald.db_scanner.models.types import ColumnValueIndex
+
+DB_COLLECTION = "column_value_indexes"
+# Keys of the indexes created on startup, the lookups of the agent filter by column
+INDEXES = [["db_connection_id", "table_name", "column_name"]]
+
+
+class ColumnValueIndexRepository:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def find_id_by_column(
+        self,
+        db_connection_id: str,
+        table_name: str,
+        column_name: str,
+        schema_name: str | None = None,
+    ) -> str | None:
+        """Returns the id of the index of the column without loading its values, rescans
+        store a new index so the id changes with them"""
+        row = self.storage.find_one(
+            DB_COLLECTION,
+            {
+                "db_connection_id": str(db_connection_id),
+                "schema_name": schema_name,
+                "table_name": table_name,
+                "column_name": column_name,
+            },
+            {"_id": 1},
+        )
+        if not row:
+            return None
+        return str(row["_id"])
+
+    def find_by_id(self, id: str) -> ColumnValueIndex | None:
+        row = self.storage.find_by_id(DB_COLLECTION, id)
+        if not row:
+            return None
+        row["id"] = str(row["_id"])
+        row["db_connection_id"] = str(row["db_connection_id"])
+        return ColumnValueIndex(**row)
+
+    def save(self, column_value_index: ColumnValueIndex) -> ColumnValueIndex:
+        column_value_index_dict = column_value_index.dict(exclude={"id"})
+        column_value_index_dict["db_connection_id"] = str(
+            column_value_index.db_connection_id
+        )
+        column_value_index.id = str(
+            self.storage.update_or_create(
+                DB_COLLECTION,
+                {
+                    "db_connection_id": column_value_index_dict["db_connection_id"],
+                    "schema_name": column_value_index.schema_name,
+                    "table_name": column_value_index.table_name,
+                    "column_name": column_value_index.column_name,
+                },
+                column_value_index_dict,
+            )
+        )
+        return column_value_index
+
+    def delete_by_table(
+        self, db_connection_id: str, table_name: str, schema_name: str | None = None
+    ) -> int:
+        rows = self.storage.find(
+            DB_COLLECTION,
+            {
+                "db_connection_id": str(db_connection_id),
+                "schema_name": schema_name,
+                "table_name": table_name,
+            },
+        )
+        for row in rows:
+            self.storage.delete_by_id(DB_COLLECTION, str(row["_id"]))
+        return len(rows)
@@ -1,12 +1,30 @@
+import hashlib
+
 from dataherald.db_scanner.models.types import QueryHistory
 
 DB_COLLECTION = "query_history"
+# Keys of the indexes created on startup, upserts match the rows by their hash
+INDEXES = [["query_hash"]]
+UPSERT_BATCH_SIZE = 1_000
 
 
 class QueryHistoryRepository:
     def __init__(self, storage):
         self.storage = storage
 
+    @staticmethod
+    def query_hash(query_history: QueryHistory) -> str:
+        return hashlib.sha256(
+            "\x00".join(
+                [
+                    str(query_history.db_connection_id),
+                    query_history.table_name,
+                    query_history.user,
+                    query_history.query,
+                ]
+            ).encode("utf-8")
+        ).hexdigest()
+
     def insert(self, query_history: QueryHistory) -> QueryHistory:
         query_history_dict = query_history.dict(exclude={"id"})
         query_history_dict["db_connection_id"] = str(query_history.db_connection_id)
@@ -15,6 +33,23 @@ class QueryHistoryRepository:
         )
         return query_history
 
+    def upsert_many(self, query_histories: list[QueryHistory]) -> int:
+        """Stores the rows in batches keyed by the (db connection, table, user, query) hash,
+        so scanning the same logs again only refreshes the occurrences"""
+        rows = {}
+        for query_history in query_histories:
+            query_history.query_hash = self.query_hash(query_history)
+            query_history_dict = query_history.dict(exclude={"id"})
+            query_history_dict["db_connection_id"] = str(query_history.db_connection_id)
+            rows[query_history.query_hash] = query_history_dict
+        rows = list(rows.values())
+        inserted = 0
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            inserted += self.storage.upsert_many(
+                DB_COLLECTION, "query_hash", rows[start : start + UPSERT_BATCH_SIZE]
+            )
+        return inserted
+
     def find_by(
         self, query: dict, page: int = 1, limit: int = 10
     ) -> list[QueryHistory]:
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from dataherald.db_scanner.models.types import ScanJob, ScanJobStatus
+
+DB_COLLECTION = "scan_jobs"
+# Keys of the indexes created on startup, the claim query filters by status and sorts
+# by created_at or filters by heartbeat_at
+INDEXES = [["status", "created_at"], ["status", "heartbeat_at"], ["db_connection_id"]]
+
+
+class ScanJobRepository:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def insert(self, scan_job: ScanJob) -> ScanJob:
+        scan_job_dict = scan_job.dict(exclude={"id"})
+        scan_job_dict["db_connection_id"] = str(scan_job.db_connection_id)
+        scan_job.id = str(self.storage.insert_one(DB_COLLECTION, scan_job_dict))
+        return scan_job
+
+    def find_by_id(self, id: str) -> ScanJob | None:
+        row = self.storage.find_one(DB_COLLECTION, {"_id": ObjectId(id)})
+        if not row:
+            return None
+        row["id"] = str(row["_id"])
+        return ScanJob(**row)
+
+    def find_by(self, query: dict, page: int = 0, limit: int = 0) -> list[ScanJob]:
+        rows = self.storage.find(
+            DB_COLLECTION,
+            query,
+            sort=[("created_at", DESCENDING)],
+            page=page,
+            limit=limit,
+        )
+        result = []
+        for row in rows:
+            row["id"] = str(row["_id"])
+            result.append(ScanJob(**row))
+        return result
+
+    def _find_one_and_update(self, query: dict, update: dict) -> ScanJob | None:
+        row = self.storage.find_one_and_update(
+            DB_COLLECTION, query, update, sort=[("created_at", ASCENDING)]
+        )
+        if not row:
+            return None
+        row["id"] = str(row["_id"])
+        return ScanJob(**row)
+
+    def claim(
+        self,
+        worker_id: str,
+        lease_timeout: int,
+        id: str | None = None,
+        queued_before: datetime | None = None,
+    ) -> ScanJob | None:
+        """Atomically moves the oldest queued job, or a running job whose worker stopped
+        sending heartbeats, to RUNNING for this worker. With `queued_before` only the jobs
+        queued before that time are claimed"""
+        now = datetime.now()
+        queued = {"status": ScanJobStatus.QUEUED.value}
+        if queued_before is not None:
+            queued["created_at"] = {"$lt": queued_before}
+        query = {
+            "$or": [
+                queued,
+                {
+                    "status": ScanJobStatus.RUNNING.value,
+                    "heartbeat_at": {"$lt": now - timedelta(seconds=lease_timeout)},
+                },
+            ]
+        }
+        if id:
+            query["_id"] = ObjectId(id)
+        return self._find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "status": ScanJobStatus.RUNNING.value,
+                    "worker_id": worker_id,
+                    "heartbeat_at": now,
+                    "started_at": now,
+                    "scanned_tables": 0,
+                    "failed_tables": 0,
+                }
+            },
+        )
+
+    def add_progress(self, id: str, scanned: bool) -> ScanJob | None:
+        """Counts a finished table and refreshes the heartbeat, returns the job so the worker
+        can see if it was cancelled"""
+        field = "scanned_tables" if scanned else "failed_tables"
+        return self._find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$inc": {field: 1}, "$set": {"heartbeat_at": datetime.now()}},
+        )
+
+    def heartbeat(self, id: str, worker_id: str) -> ScanJob | None:
+        """Renews the lease of a running job, returns None if the job is no longer running
+        for this worker"""
+        return self._find_one_and_update(
+            {
+                "_id": ObjectId(id),
+                "status": ScanJobStatus.RUNNING.value,
+                "worker_id": worker_id,
+            },
+            {"$set": {"heartbeat_at": datetime.now()}},
+        )
+
+    def finish(self, id: str, status: str, error: str | None = None) -> ScanJob | None:
+        """Sets the final status unless the job was cancelled meanwhile"""
+        return self._find_one_and_update(
+            {"_id": ObjectId(id), "status": ScanJobStatus.RUNNING.value},
+            {"$set": {"status": status, "error": error, "finished_at": datetime.now()}},
+        )
+
+    def cancel(self, id: str) -> ScanJob | None:
+        return self._find_one_and_update(
+            {
+                "_id": ObjectId(id),
+                "status": {
+                    "$in": [ScanJobStatus.QUEUED.value, ScanJobStatus.RUNNING.value]
+                },
+            },
+            {
+                "$set": {
+                    "status": ScanJobStatus.CANCELLED.value,
+                    "finished_at": datetime.now(),
+                }
+            },
+        )
@@ -0,0 +1,58 @@
+from dataherald.db_scanner.models.types import TableEmbedding
+
+DB_COLLECTION = "table_embeddings"
+# Keys of the indexes created on startup, every lookup filters by db connection
+INDEXES = [["db_connection_id", "embedding_model", "content_hash"]]
+
+
+class TableEmbeddingRepository:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def find_by_hashes(
+        self, db_connection_id: str, embedding_model: str, content_hashes: list[str]
+    ) -> list[TableEmbedding]:
+        rows = self.storage.find(
+            DB_COLLECTION,
+            {
+                "db_connection_id": str(db_connection_id),
+                "embedding_model": embedding_model,
+                "content_hash": {"$in": content_hashes},
+            },
+        )
+        result = []
+        for row in rows:
+            row["id"] = str(row["_id"])
+            row["db_connection_id"] = str(row["db_connection_id"])
+            result.append(TableEmbedding(**row))
+        return result
+
+    def save(self, table_embedding: TableEmbedding) -> TableEmbedding:
+        table_embedding_dict = table_embedding.dict(exclude={"id"})
+        table_embedding_dict["db_connection_id"] = str(table_embedding.db_connection_id)
+        table_embedding.id = str(
+            self.storage.update_or_create(
+                DB_COLLECTION,
+                {
+                    "db_connection_id": table_embedding_dict["db_connection_id"],
+                    "embedding_model": table_embedding.embedding_model,
+                    "content_hash": table_embedding.content_hash,
+                },
+                table_embedding_dict,
+            )
+        )
+        return table_embedding
+
+    def delete_by_table(
+        self, db_connection_id: str, table_name: str, schema_name: str | None = None
+    ) -> int:
+        query = {
+            "db_connection_id": str(db_connection_id),
+            "table_name": table_name.lower(),
+        }
+        if schema_name is not None:
+            query["schema_name"] = schema_name
+        rows = self.storage.find(DB_COLLECTION, query)
+        for row in rows:
+            self.storage.delete_by_id(DB_COLLECTION, str(row["_id"]))
+        return len(rows)
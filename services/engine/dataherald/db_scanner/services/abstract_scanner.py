@@ -1,10 +1,18 @@
+import os
 from abc import ABC, abstractmethod
 
+import sqlalchemy
+from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
-from dataherald.db_scanner.models.types import QueryHistory
+from dataherald.db_scanner.models.types import ColumnProfile, QueryHistory
 from dataherald.sql_database.base import SQLDatabase
 
+MIN_CATEGORY_VALUE = 1
+MAX_CATEGORY_VALUE = 100
+# Rows read by the dialects without an approximate distinct count to profile a table
+SCAN_PROFILE_SAMPLE_ROWS = int(os.environ.get("SCAN_PROFILE_SAMPLE_ROWS", "10000"))
+
 
 class AbstractScanner(ABC):
     @abstractmethod
@@ -12,9 +20,80 @@ class AbstractScanner(ABC):
         """Returns a list if it is a catalog otherwise return None"""
         pass
 
+    @abstractmethod
+    def profile_columns(
+        self, columns: list[Column], db_engine: SQLDatabase
+    ) -> dict[str, ColumnProfile]:
+        """Returns the categories of every column keyed by column name, None if it is not a
+        catalog, with its estimated distinct count. The distinct values of all the columns
+        are estimated in a single statement"""
+        pass
+
+    @abstractmethod
+    def get_table_stats(self, table: str, db_engine: SQLDatabase) -> dict | None:
+        """Returns cheap statistics like the row count or the last modification time used to
+        detect changes in the table, None if the dialect doesn't have them"""
+        pass
+
     @abstractmethod
     def get_logs(
-        self, table: str, db_engine: SQLDatabase, db_connection_id: str
+        self, tables: list[str], db_engine: SQLDatabase, db_connection_id: str
     ) -> list[QueryHistory]:
-        """Returns a list of logs"""
+        """Returns the logs of all the tables, fetched from the query history once and
+        split by the tables referenced in each query"""
         pass
+
+    def distinct_counts(
+        self,
+        columns: list[Column],
+        db_engine: SQLDatabase,
+        aggregate: callable,
+        sample_rows: int | None = None,
+    ) -> dict[str, int]:
+        """Runs `aggregate` over every column in one SELECT, over the first `sample_rows`
+        rows of the table when it is set"""
+        if not columns:
+            return {}
+        sources = columns
+        if sample_rows:
+            sample = sqlalchemy.select(columns).limit(sample_rows).subquery()
+            sources = [sample.c[column.name] for column in columns]
+        query = sqlalchemy.select(
+            [
+                aggregate(column).label(f"distinct_{index}")
+                for index, column in enumerate(sources)
+            ]
+        )
+        row = db_engine.engine.execute(query).first()
+        return {
+            column.name: int(row[index] or 0) if row else 0
+            for index, column in enumerate(columns)
+        }
+
+    def distinct_values(self, column: Column, db_engine: SQLDatabase) -> list:
+        cardinality_query = sqlalchemy.select([func.distinct(column)]).limit(101)
+        cardinality = db_engine.engine.execute(cardinality_query).fetchall()
+        return [str(category[0]) for category in cardinality]
+
+    def low_cardinality_values(
+        self,
+        columns: list[Column],
+        counts: dict[str, int],
+        db_engine: SQLDatabase,
+        sampled: bool = False,
+    ) -> dict[str, ColumnProfile]:
+        """Fetches the distinct values only for the columns whose count is in the catalog
+        range. Approximate and sampled counts can be low, so the values are checked too.
+        Sampled counts are not kept as the distinct count of the column."""
+        profiles = {}
+        for column in columns:
+            categories = None
+            if MIN_CATEGORY_VALUE < counts[column.name] <= MAX_CATEGORY_VALUE:
+                values = self.distinct_values(column, db_engine)
+                if MIN_CATEGORY_VALUE < len(values) <= MAX_CATEGORY_VALUE:
+                    categories = values
+            profiles[column.name] = ColumnProfile(
+                categories=categories,
+                distinct_count=None if sampled else counts[column.name],
+            )
+        return profiles
@@ -3,8 +3,11 @@ from overrides import override
 from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
-from dataherald.db_scanner.models.types import QueryHistory
-from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
+from dataherald.db_scanner.models.types import ColumnProfile, QueryHistory
+from dataherald.db_scanner.services.abstract_scanner import (
+    SCAN_PROFILE_SAMPLE_ROWS,
+    AbstractScanner,
+)
 from dataherald.sql_database.base import SQLDatabase
 
 MIN_CATEGORY_VALUE = 1
@@ -21,8 +24,29 @@ class BaseScanner(AbstractScanner):
             return [str(category[0]) for category in cardinality]
         return None
 
+    @override
+    def profile_columns(
+        self, columns: list[Column], db_engine: SQLDatabase
+    ) -> dict[str, ColumnProfile]:
+        counts = self.distinct_counts(
+            columns,
+            db_engine,
+            lambda column: func.count(func.distinct(column)),
+            sample_rows=SCAN_PROFILE_SAMPLE_ROWS,
+        )
+        return self.low_cardinality_values(columns, counts, db_engine, sampled=True)
+
+    @override
+    def get_table_stats(
+        self, table: str, db_engine: SQLDatabase  # noqa: ARG002
+    ) -> dict | None:
+        return None
+
     @override
     def get_logs(
-        self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
+        self,
+        tables: list[str],  # noqa: ARG002
+        db_engine: SQLDatabase,  # noqa: ARG002
+        db_connection_id: str,  # noqa: ARG002
     ) -> list[QueryHistory]:
         return []
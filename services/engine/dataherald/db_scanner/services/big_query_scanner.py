@@ -2,11 +2,12 @@ from datetime import datetime, timedelta
 
 import sqlalchemy
 from overrides import override
+from sqlalchemy import bindparam, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
-from dataherald.db_scanner.models.types import QueryHistory
+from dataherald.db_scanner.models.types import ColumnProfile, QueryHistory
 from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
 from dataherald.sql_database.base import SQLDatabase
 
@@ -35,21 +36,46 @@ class BigQueryScanner(AbstractScanner):
 
         return None
 
+    @override
+    def profile_columns(
+        self, columns: list[Column], db_engine: SQLDatabase
+    ) -> dict[str, ColumnProfile]:
+        counts = self.distinct_counts(columns, db_engine, func.APPROX_COUNT_DISTINCT)
+        return self.low_cardinality_values(columns, counts, db_engine)
+
+    @override
+    def get_table_stats(self, table: str, db_engine: SQLDatabase) -> dict | None:
+        dataset = db_engine.engine.url.database
+        if not dataset:
+            return None
+        row = db_engine.engine.execute(
+            text(
+                f"SELECT row_count, last_modified_time FROM `{dataset}.__TABLES__` WHERE table_id = :table_name"  # noqa: S608 E501
+            ),
+            table_name=table,
+        ).first()
+        return dict(row) if row else None
+
     @override
     def get_logs(
-        self, table: str, db_engine: SQLDatabase, db_connection_id: str
+        self, tables: list[str], db_engine: SQLDatabase, db_connection_id: str
     ) -> list[QueryHistory]:
+        if not tables:
+            return []
         filter_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
         rows = db_engine.engine.execute(
-            f"SELECT query, user_email, count(*) as occurrences FROM `region-us.INFORMATION_SCHEMA.JOBS`, UNNEST(referenced_tables) AS t where job_type = 'QUERY' and statement_type = 'SELECT' and t.table_id = '{table}' and state = 'DONE' and creation_time >='{filter_date}' group by query, user_email ORDER BY occurrences DESC limit {MAX_LOGS}"  # noqa: S608 E501
+            text(
+                f"SELECT query, user_email, t.table_id, count(*) as occurrences FROM `region-us.INFORMATION_SCHEMA.JOBS`, UNNEST(referenced_tables) AS t where job_type = 'QUERY' and statement_type = 'SELECT' and t.table_id IN :tables and state = 'DONE' and creation_time >='{filter_date}' group by query, user_email, t.table_id QUALIFY ROW_NUMBER() OVER (PARTITION BY t.table_id ORDER BY occurrences DESC) <= {MAX_LOGS}"  # noqa: S608 E501
+            ).bindparams(bindparam("tables", expanding=True)),
+            tables=list(tables),
         ).fetchall()
         return [
             QueryHistory(
                 db_connection_id=db_connection_id,
-                table_name=table,
+                table_name=row[2],
                 query=row[0],
                 user=row[1],
-                occurrences=row[2],
+                occurrences=row[3],
             )
             for row in rows
         ]
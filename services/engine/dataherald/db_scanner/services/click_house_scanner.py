@@ -1,9 +1,10 @@
 import sqlalchemy
 from overrides import override
+from sqlalchemy import text
 from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
-from dataherald.db_scanner.models.types import QueryHistory
+from dataherald.db_scanner.models.types import ColumnProfile, QueryHistory
 from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
 from dataherald.sql_database.base import SQLDatabase
 
@@ -29,8 +30,28 @@ class ClickHouseScanner(AbstractScanner):
 
         return None
 
+    @override
+    def profile_columns(
+        self, columns: list[Column], db_engine: SQLDatabase
+    ) -> dict[str, ColumnProfile]:
+        counts = self.distinct_counts(columns, db_engine, func.uniqHLL12)
+        return self.low_cardinality_values(columns, counts, db_engine)
+
+    @override
+    def get_table_stats(self, table: str, db_engine: SQLDatabase) -> dict | None:
+        row = db_engine.engine.execute(
+            text(
+                "SELECT total_rows, total_bytes, metadata_modification_time FROM system.tables WHERE database = currentDatabase() AND name = :table_name"  # noqa: E501
+            ),
+            table_name=table,
+        ).first()
+        return dict(row) if row else None
+
     @override
     def get_logs(
-        self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
+        self,
+        tables: list[str],  # noqa: ARG002
+        db_engine: SQLDatabase,  # noqa: ARG002
+        db_connection_id: str,  # noqa: ARG002
     ) -> list[QueryHistory]:
         return []
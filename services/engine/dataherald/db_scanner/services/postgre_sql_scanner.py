@@ -1,7 +1,8 @@
 from overrides import override
+from sqlalchemy import bindparam, text
 from sqlalchemy.sql.schema import Column
 
-from dataherald.db_scanner.models.types import QueryHistory
+from dataherald.db_scanner.models.types import ColumnProfile, QueryHistory
 from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
 from dataherald.sql_database.base import SQLDatabase
 
@@ -13,7 +14,12 @@ class PostgreSqlScanner(AbstractScanner):
     @override
     def cardinality_values(self, column: Column, db_engine: SQLDatabase) -> list | None:
         rs = db_engine.engine.execute(
-            f"SELECT n_distinct, most_common_vals::TEXT::TEXT[] FROM pg_catalog.pg_stats WHERE tablename = '{column.table.name}' AND attname = '{column.name}'"  # noqa: S608 E501
+            text(
+                "SELECT n_distinct, most_common_vals::TEXT::TEXT[] FROM pg_catalog.pg_stats WHERE schemaname = COALESCE(:schema_name, current_schema()) AND tablename = :table_name AND attname = :column_name"  # noqa: E501
+            ),
+            schema_name=column.table.schema,
+            table_name=column.table.name,
+            column_name=column.name,
         ).fetchall()
 
         if (
@@ -23,8 +29,55 @@ class PostgreSqlScanner(AbstractScanner):
             return rs[0]["most_common_vals"]
         return None
 
+    @override
+    def profile_columns(
+        self, columns: list[Column], db_engine: SQLDatabase
+    ) -> dict[str, ColumnProfile]:
+        if not columns:
+            return {}
+        query = text(
+            "SELECT s.attname, s.n_distinct, s.most_common_vals::TEXT::TEXT[] AS most_common_vals, c.reltuples FROM pg_catalog.pg_stats s JOIN pg_catalog.pg_namespace n ON n.nspname = s.schemaname JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename WHERE s.schemaname = COALESCE(:schema_name, current_schema()) AND s.tablename = :table_name AND s.attname IN :column_names"  # noqa: E501
+        ).bindparams(bindparam("column_names", expanding=True))
+        rows = db_engine.engine.execute(
+            query,
+            schema_name=columns[0].table.schema,
+            table_name=columns[0].table.name,
+            column_names=[column.name for column in columns],
+        ).fetchall()
+        stats = {row["attname"]: row for row in rows}
+        profiles = {}
+        for column in columns:
+            row = stats.get(column.name)
+            if row is None:
+                profiles[column.name] = ColumnProfile()
+                continue
+            categories = None
+            if MIN_CATEGORY_VALUE < row["n_distinct"] <= MAX_CATEGORY_VALUE:
+                categories = row["most_common_vals"]
+            # A negative n_distinct is the ratio of distinct values to rows
+            distinct_count = row["n_distinct"]
+            if distinct_count < 0:
+                distinct_count = -distinct_count * max(row["reltuples"], 0)
+            profiles[column.name] = ColumnProfile(
+                categories=categories, distinct_count=round(distinct_count)
+            )
+        return profiles
+
+    @override
+    def get_table_stats(self, table: str, db_engine: SQLDatabase) -> dict | None:
+        row = db_engine.engine.execute(
+            text(
+                "SELECT n_live_tup, n_tup_ins, n_tup_upd, n_tup_del FROM pg_catalog.pg_stat_user_tables WHERE schemaname = current_schema() AND relname = :table_name"  # noqa: E501
+            ),
+            table_name=table,
+        ).first()
+        return dict(row) if row else None
+
     @override
     def get_logs(
-        self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
+        self,
+        tables: list[str],  # noqa: ARG002
+        db_engine: SQLDatabase,  # noqa: ARG002
+        db_connection_id: str,  # noqa: ARG002
     ) -> list[QueryHistory]:
         return []
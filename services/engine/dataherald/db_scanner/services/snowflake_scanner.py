@@ -1,17 +1,24 @@
+import re
 from datetime import datetime, timedelta
 
 import sqlalchemy
 from overrides import override
+from sqlalchemy import text
 from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
-from dataherald.db_scanner.models.types import QueryHistory
+from dataherald.db_scanner.models.types import ColumnProfile, QueryHistory
 from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
 from dataherald.sql_database.base import SQLDatabase
 
 MIN_CATEGORY_VALUE = 1
 MAX_CATEGORY_VALUE = 100
 MAX_LOGS = 5_000
+QUERY_HISTORY_RESULT_LIMIT = 10_000
+# Last identifier of the (database.schema.)table names after FROM and JOIN
+REFERENCED_TABLE_PATTERN = re.compile(
+    r'\b(?:FROM|JOIN)\s+(?:"?[\w$]+"?\.)*"?([\w$]+)"?', re.IGNORECASE
+)
 
 
 class SnowflakeScanner(AbstractScanner):
@@ -31,22 +38,52 @@ class SnowflakeScanner(AbstractScanner):
 
         return None
 
+    @override
+    def profile_columns(
+        self, columns: list[Column], db_engine: SQLDatabase
+    ) -> dict[str, ColumnProfile]:
+        counts = self.distinct_counts(columns, db_engine, func.HLL)
+        return self.low_cardinality_values(columns, counts, db_engine)
+
+    @override
+    def get_table_stats(self, table: str, db_engine: SQLDatabase) -> dict | None:
+        row = db_engine.engine.execute(
+            text(
+                "SELECT ROW_COUNT, LAST_ALTERED FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = CURRENT_SCHEMA() AND UPPER(TABLE_NAME) = UPPER(:table_name)"  # noqa: E501
+            ),
+            table_name=table,
+        ).first()
+        return dict(row) if row else None
+
     @override
     def get_logs(
-        self, table: str, db_engine: SQLDatabase, db_connection_id: str
+        self, tables: list[str], db_engine: SQLDatabase, db_connection_id: str
     ) -> list[QueryHistory]:
+        if not tables:
+            return []
         database_name = db_engine.engine.url.database.split("/")[0]
         filter_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
         rows = db_engine.engine.execute(
-            f"select QUERY_TEXT, USER_NAME, count(*) as occurrences from TABLE(INFORMATION_SCHEMA.QUERY_HISTORY()) where DATABASE_NAME = '{database_name}' and QUERY_TYPE = 'SELECT' and EXECUTION_STATUS = 'SUCCESS' and START_TIME > '{filter_date}' and QUERY_TEXT like '%FROM {table}%' and QUERY_TEXT not like '%QUERY_HISTORY%' group by QUERY_TEXT, USER_NAME ORDER BY occurrences DESC limit {MAX_LOGS}"  # noqa: S608 E501
+            f"select QUERY_TEXT, USER_NAME, count(*) as occurrences from TABLE(INFORMATION_SCHEMA.QUERY_HISTORY(RESULT_LIMIT => {QUERY_HISTORY_RESULT_LIMIT})) where DATABASE_NAME = '{database_name}' and QUERY_TYPE = 'SELECT' and EXECUTION_STATUS = 'SUCCESS' and START_TIME > '{filter_date}' and QUERY_TEXT not like '%QUERY_HISTORY%' group by QUERY_TEXT, USER_NAME ORDER BY occurrences DESC"  # noqa: S608 E501
         ).fetchall()
-        return [
-            QueryHistory(
-                db_connection_id=db_connection_id,
-                table_name=table,
-                query=row[0],
-                user=row[1],
-                occurrences=row[2],
-            )
-            for row in rows
-        ]
+        tables_by_name = {table.lower(): table for table in tables}
+        occurrences_by_table = {}
+        query_histories = []
+        for row in rows:
+            for name in {
+                name.lower() for name in REFERENCED_TABLE_PATTERN.findall(row[0])
+            }:
+                table = tables_by_name.get(name)
+                if table is None or occurrences_by_table.get(table, 0) >= MAX_LOGS:
+                    continue
+                occurrences_by_table[table] = occurrences_by_table.get(table, 0) + 1
+                query_histories.append(
+                    QueryHistory(
+                        db_connection_id=db_connection_id,
+                        table_name=table,
+                        query=row[0],
+                        user=row[1],
+                        occurrences=row[2],
+                    )
+                )
+        return query_histories
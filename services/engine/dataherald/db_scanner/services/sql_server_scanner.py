@@ -1,8 +1,10 @@
 from overrides import override
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import Column
 
-from dataherald.db_scanner.models.types import QueryHistory
+from dataherald.db_scanner.models.types import ColumnProfile, QueryHistory
 from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
 from dataherald.sql_database.base import SQLDatabase
 
@@ -31,8 +33,28 @@ class SqlServerScanner(AbstractScanner):
 
         return None
 
+    @override
+    def profile_columns(
+        self, columns: list[Column], db_engine: SQLDatabase
+    ) -> dict[str, ColumnProfile]:
+        counts = self.distinct_counts(columns, db_engine, func.APPROX_COUNT_DISTINCT)
+        return self.low_cardinality_values(columns, counts, db_engine)
+
+    @override
+    def get_table_stats(self, table: str, db_engine: SQLDatabase) -> dict | None:
+        row = db_engine.engine.execute(
+            text(
+                "SELECT SUM(p.rows) AS row_count, MAX(t.modify_date) AS modify_date FROM sys.tables t JOIN sys.partitions p ON t.object_id = p.object_id AND p.index_id IN (0, 1) WHERE t.name = :table_name"  # noqa: E501
+            ),
+            table_name=table,
+        ).first()
+        return dict(row) if row and row[0] is not None else None
+
     @override
     def get_logs(
-        self, table: str, db_engine: SQLDatabase, db_connection_id: str  # noqa: ARG002
+        self,
+        tables: list[str],  # noqa: ARG002
+        db_engine: SQLDatabase,  # noqa: ARG002
+        db_connection_id: str,  # noqa: ARG002
     ) -> list[QueryHistory]:
         return []
@@ -1,22 +1,32 @@
+import hashlib
+import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Any, List
+from typing import Any, Callable, List
 
 import sqlalchemy
 from clickhouse_sqlalchemy import engines
 from overrides import override
-from sqlalchemy import Column, MetaData, Table, inspect
+from sqlalchemy import Column, MetaData, Table
 from sqlalchemy.schema import CreateTable
 from sqlalchemy.sql.sqltypes import NullType
 
 from dataherald.db_scanner import Scanner
 from dataherald.db_scanner.models.types import (
     ColumnDetail,
+    ColumnProfile,
     TableDescription,
     TableDescriptionStatus,
+    TableFingerprint,
 )
 from dataherald.db_scanner.repository.base import TableDescriptionRepository
+from dataherald.db_scanner.repository.column_value_indexes import (
+    ColumnValueIndexRepository,
+)
 from dataherald.db_scanner.repository.query_history import QueryHistoryRepository
+from dataherald.db_scanner.repository.table_embeddings import TableEmbeddingRepository
 from dataherald.db_scanner.services.abstract_scanner import AbstractScanner
 from dataherald.db_scanner.services.base_scanner import BaseScanner
 from dataherald.db_scanner.services.big_query_scanner import BigQueryScanner
@@ -27,10 +37,17 @@ from dataherald.db_scanner.services.snowflake_scanner import SnowflakeScanner
 from dataherald.db_scanner.services.sql_server_scanner import SqlServerScanner
 from dataherald.sql_database.base import SQLDatabase
 from dataherald.types import ScannerRequest
+from dataherald.utils.column_value_index import (
+    COLUMN_VALUE_INDEX_MAX_VALUES,
+    build_column_value_index,
+)
+from dataherald.utils.schema_budget import count_schema_tokens
 
 MIN_CATEGORY_VALUE = 1
 MAX_CATEGORY_VALUE = 60
 MAX_SIZE_LETTERS = 50
+SCAN_CONCURRENCY = int(os.environ.get("SCAN_CONCURRENCY", "1"))
+SCAN_REFLECTION_BATCH_SIZE = int(os.environ.get("SCAN_REFLECTION_BATCH_SIZE", "100"))
 
 logger = logging.getLogger(__name__)
 
@@ -143,52 +160,69 @@ class SqlAlchemyScanner(Scanner):
             examples_dict.append(temp_dict)
         return examples_dict
 
-    def get_processed_column(  # noqa: PLR0911
+    def get_processed_columns(
         self,
         meta: MetaData,
         table: str,
-        column: dict,
+        columns: list[dict],
+        examples: list[dict],
+        *,
         db_engine: SQLDatabase,
         scanner_service: AbstractScanner,
-    ) -> ColumnDetail:
+    ) -> list[ColumnDetail]:
+        """Profiles all the columns of a table at once. The examples replace the per column
+        length probe, then the dialect estimates the distinct values of the remaining columns
+        in one statement and only the low cardinality ones are fetched."""
         dynamic_meta_table = meta.tables[table]
-
-        field_size_query = sqlalchemy.select(
-            [dynamic_meta_table.c[column["name"]]]
-        ).limit(1)
-
-        field_size = db_engine.engine.execute(field_size_query).first()
-        # Check if the column is empty
-        if not field_size:
-            field_size = [""]
-        if len(str(str(field_size[0]))) > MAX_SIZE_LETTERS:
-            return ColumnDetail(
-                name=column["name"],
-                data_type=str(column["type"]),
-                low_cardinality=False,
+        first_row = examples[0] if examples else {}
+        candidates = [
+            dynamic_meta_table.c[column["name"]]
+            for column in columns
+            if len(first_row.get(column["name"], "")) <= MAX_SIZE_LETTERS
+        ]
+        try:
+            profiles = scanner_service.profile_columns(candidates, db_engine)
+        except Exception as e:
+            logger.warning(
+                f"Unable to profile the columns of {table} in one query, falling back to one query per column: {e}"
             )
-        category_values = scanner_service.cardinality_values(
-            dynamic_meta_table.c[column["name"]], db_engine
-        )
-        if category_values:
-            return ColumnDetail(
-                name=column["name"],
-                data_type=str(column["type"]),
-                low_cardinality=True,
-                categories=category_values,
+            profiles = {}
+            for column in candidates:
+                try:
+                    profiles[column.name] = ColumnProfile(
+                        categories=scanner_service.cardinality_values(column, db_engine)
+                    )
+                except Exception:
+                    profiles[column.name] = ColumnProfile()
+
+        table_columns = []
+        for column in columns:
+            profile = profiles.get(column["name"], ColumnProfile())
+            table_columns.append(
+                ColumnDetail(
+                    name=column["name"],
+                    data_type=str(column["type"]),
+                    low_cardinality=bool(profile.categories),
+                    categories=profile.categories or None,
+                    distinct_count=profile.distinct_count,
+                )
             )
-        return ColumnDetail(
-            name=column["name"],
-            data_type=str(column["type"]),
-            low_cardinality=False,
-        )
+        return table_columns
+
+    def reflect_tables(self, db_engine: SQLDatabase, tables: list[str]) -> MetaData:
+        """Reflects only the given tables and views (and the tables their foreign keys
+        reference) instead of the whole schema"""
+        table_names = set(tables)
+        meta = MetaData(bind=db_engine.engine)
+        meta.reflect(views=True, only=lambda table_name, _: table_name in table_names)
+        return meta
 
     def get_table_schema(
         self, meta: MetaData, db_engine: SQLDatabase, table: str
     ) -> str:
         print(f"Create table schema for: {table}")
 
-        original_table = next((x for x in meta.sorted_tables if x.name == table), None)
+        original_table = meta.tables.get(table)
         if original_table is None:
             raise ValueError(f"Table '{table}' not found in metadata.")
 
@@ -234,6 +268,82 @@ class SqlAlchemyScanner(Scanner):
 
         return create_table_ddl.rstrip()
 
+    def get_table_fingerprint(
+        self,
+        table: str,
+        columns: list[dict],
+        db_engine: SQLDatabase,
+        scanner_service: AbstractScanner,
+    ) -> TableFingerprint:
+        schema_hash = hashlib.sha256(
+            json.dumps(
+                [[column["name"], str(column["type"])] for column in columns]
+            ).encode("utf-8")
+        ).hexdigest()
+        try:
+            stats = scanner_service.get_table_stats(table, db_engine)
+        except Exception as e:
+            logger.warning(f"Unable to get the stats of table {table}: {e}")
+            stats = None
+        stats_hash = None
+        if stats is not None:
+            stats_hash = hashlib.sha256(
+                json.dumps(stats, sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()
+        return TableFingerprint(schema_hash=schema_hash, stats_hash=stats_hash)
+
+    def index_column_values(
+        self,
+        meta: MetaData,
+        table: TableDescription,
+        db_engine: SQLDatabase,
+        storage: Any,
+    ) -> None:
+        """Stores the distinct values of the string columns under the size cap, so entity
+        lookups don't scan the column. The categories of the low cardinality columns are
+        reused, the columns whose profiled distinct count is over the cap are skipped and
+        the other columns cost one DISTINCT query each."""
+        repository = ColumnValueIndexRepository(storage)
+        repository.delete_by_table(
+            table.db_connection_id, table.table_name, table.schema_name
+        )
+        if COLUMN_VALUE_INDEX_MAX_VALUES <= 0:
+            return
+        dynamic_meta_table = meta.tables[table.table_name]
+        for column in table.columns:
+            column_type = dynamic_meta_table.c[column.name].type
+            if not isinstance(column_type, sqlalchemy.types.String):
+                continue
+            if (
+                column.distinct_count is not None
+                and column.distinct_count > COLUMN_VALUE_INDEX_MAX_VALUES
+            ):
+                continue
+            try:
+                if column.categories:
+                    values = column.categories
+                else:
+                    values_query = sqlalchemy.select(
+                        [sqlalchemy.func.distinct(dynamic_meta_table.c[column.name])]
+                    ).limit(COLUMN_VALUE_INDEX_MAX_VALUES + 1)
+                    values = [
+                        row[0]
+                        for row in db_engine.engine.execute(values_query).fetchall()
+                    ]
+                column_value_index = build_column_value_index(
+                    table.db_connection_id,
+                    table.schema_name,
+                    table.table_name,
+                    column.name,
+                    values,
+                )
+                if column_value_index is not None:
+                    repository.save(column_value_index)
+            except Exception as e:
+                logger.warning(
+                    f"Unable to index the values of {table.table_name}.{column.name}: {e}"
+                )
+
     def scan_single_table(
         self,
         meta: MetaData,
@@ -243,44 +353,149 @@ class SqlAlchemyScanner(Scanner):
         repository: TableDescriptionRepository,
         scanner_service: AbstractScanner,
         schema: str | None = None,
+        *,
+        stored_table: TableDescription | None = None,
+        force: bool = False,
     ) -> TableDescription:
+        """Scans a table. Unless `force` is set, the fingerprint of the last scan in
+        `stored_table` is used to skip unchanged tables and to only refresh the columns and
+        examples of the tables whose columns didn't change. Tables without stats are never
+        skipped, since their data may have changed."""
         print(f"Scanning table: {table}")
-        inspector = inspect(db_engine.engine)
-        table_columns = []
-        columns = inspector.get_columns(table_name=table)
-        columns = [column for column in columns if column["name"].find(".") < 0]
+        columns = [
+            {"name": column.name, "type": column.type}
+            for column in meta.tables[table].columns
+            if column.name.find(".") < 0
+        ]
+        fingerprint = self.get_table_fingerprint(
+            table, columns, db_engine, scanner_service
+        )
+        # The fingerprint is only stored by successful scans
+        previous_fingerprint = None
+        if not force and stored_table is not None:
+            previous_fingerprint = stored_table.fingerprint
 
-        for column in columns:
-            print(f"Scanning column: {column['name']}")
-            table_columns.append(
-                self.get_processed_column(
-                    meta=meta,
-                    table=table,
-                    column=column,
-                    db_engine=db_engine,
-                    scanner_service=scanner_service,
+        if previous_fingerprint == fingerprint and fingerprint.stats_hash is not None:
+            logger.info(f"Table {table} didn't change since the last scan, skipping")
+            return repository.save_table_info(
+                TableDescription(
+                    db_connection_id=db_connection_id,
+                    table_name=table,
+                    last_schema_sync=datetime.now(),
+                    error_message="",
+                    status=TableDescriptionStatus.SCANNED.value,
+                    schema_name=schema,
+                    fingerprint=fingerprint,
                 )
             )
 
+        examples = self.get_table_examples(
+            meta=meta, db_engine=db_engine, table=table, rows_number=3
+        )
+        if (
+            previous_fingerprint is not None
+            and previous_fingerprint.schema_hash == fingerprint.schema_hash
+            and stored_table.table_schema
+        ):
+            table_schema = stored_table.table_schema
+        else:
+            table_schema = self.get_table_schema(
+                meta=meta, db_engine=db_engine, table=table
+            )
+
         object = TableDescription(
             db_connection_id=db_connection_id,
             table_name=table,
-            columns=table_columns,
-            table_schema=self.get_table_schema(
-                meta=meta, db_engine=db_engine, table=table
-            ),
-            examples=self.get_table_examples(
-                meta=meta, db_engine=db_engine, table=table, rows_number=3
+            columns=self.get_processed_columns(
+                meta=meta,
+                table=table,
+                columns=columns,
+                examples=examples,
+                db_engine=db_engine,
+                scanner_service=scanner_service,
             ),
+            table_schema=table_schema,
+            examples=examples,
             last_schema_sync=datetime.now(),
             error_message="",
             status=TableDescriptionStatus.SCANNED.value,
             schema_name=schema,
+            fingerprint=fingerprint,
         )
+        count_schema_tokens(object)
 
         repository.save_table_info(object)
+        TableEmbeddingRepository(repository.storage).delete_by_table(
+            db_connection_id, table, schema
+        )
+        self.index_column_values(meta, object, db_engine, repository.storage)
         return object
 
+    def scan_table(
+        self,
+        meta: MetaData,
+        table: TableDescription,
+        db_engine: SQLDatabase,
+        repository: TableDescriptionRepository,
+        scanner_service: AbstractScanner,
+        *,
+        force: bool = False,
+    ) -> bool:
+        """Scans and stores one table, errors are stored in the table description so they
+        never stop the other tables. Returns False if the table failed."""
+        scanned = True
+        try:
+            self.scan_single_table(
+                meta=meta,
+                table=table.table_name,
+                db_engine=db_engine,
+                db_connection_id=table.db_connection_id,
+                repository=repository,
+                scanner_service=scanner_service,
+                schema=table.schema_name,
+                stored_table=table,
+                force=force,
+            )
+        except Exception as e:
+            scanned = False
+            repository.save_table_info(
+                TableDescription(
+                    db_connection_id=table.db_connection_id,
+                    table_name=table.table_name,
+                    status=TableDescriptionStatus.FAILED.value,
+                    error_message=f"{e}",
+                    schema_name=table.schema_name,
+                )
+            )
+        return scanned
+
+    def store_logs(
+        self,
+        table_descriptions: list[TableDescription],
+        db_engine: SQLDatabase,
+        query_history_repository: QueryHistoryRepository,
+        scanner_service: AbstractScanner,
+    ) -> None:
+        """Fetches the query history once for all the tables and upserts it, so rescans
+        don't duplicate the stored queries"""
+        if not table_descriptions:
+            return
+        db_connection_id = table_descriptions[0].db_connection_id
+        try:
+            logger.info(
+                f"Get logs of {len(table_descriptions)} tables for db_connection_id: {db_connection_id}"
+            )
+            query_history = scanner_service.get_logs(
+                [table.table_name for table in table_descriptions],
+                db_engine,
+                db_connection_id,
+            )
+            query_history_repository.upsert_many(query_history)
+        except Exception as e:
+            logger.warning(
+                f"Unable to get logs for db_connection_id {db_connection_id}: {e}"
+            )
+
     @override
     def scan(
         self,
@@ -288,6 +503,10 @@ class SqlAlchemyScanner(Scanner):
         table_descriptions: list[TableDescription],
         repository: TableDescriptionRepository,
         query_history_repository: QueryHistoryRepository,
+        *,
+        concurrency: int | None = None,
+        force: bool = False,
+        progress: Callable[[TableDescription, bool], bool] | None = None,
     ) -> None:
         services = {
             "snowflake": SnowflakeScanner,
@@ -301,39 +520,45 @@ class SqlAlchemyScanner(Scanner):
         if db_engine.engine.dialect.name in services.keys():
             scanner_service = services[db_engine.engine.dialect.name]()
 
-        inspect(db_engine.engine)
-        meta = MetaData(bind=db_engine.engine)
-        MetaData.reflect(meta, views=True)
-
-        for table in table_descriptions:
-            try:
-                self.scan_single_table(
-                    meta=meta,
-                    table=table.table_name,
-                    db_engine=db_engine,
-                    db_connection_id=table.db_connection_id,
-                    repository=repository,
-                    scanner_service=scanner_service,
-                    schema=table.schema_name,
-                )
-            except Exception as e:
-                repository.save_table_info(
-                    TableDescription(
-                        db_connection_id=table.db_connection_id,
-                        table_name=table,
-                        status=TableDescriptionStatus.FAILED.value,
-                        error_message=f"{e}",
-                        schema_name=table.schema_name,
-                    )
-                )
-            try:
-                logger.info(f"Get logs table: {table}")
-                query_history = scanner_service.get_logs(
-                    table.table_name, db_engine, table.db_connection_id
+        # Each worker checks out its own connection from the engine pool, so the pool
+        # size is also an upper bound of the queries sent to the warehouse
+        concurrency = min(
+            max(concurrency or SCAN_CONCURRENCY, 1), len(table_descriptions)
+        )
+        if concurrency > 1:
+            logger.info(
+                f"Scanning {len(table_descriptions)} tables with {concurrency} workers"
+            )
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            for start in range(0, len(table_descriptions), SCAN_REFLECTION_BATCH_SIZE):
+                batch = table_descriptions[start : start + SCAN_REFLECTION_BATCH_SIZE]
+                meta = self.reflect_tables(
+                    db_engine, [table.table_name for table in batch]
                 )
-                if len(query_history) > 0:
-                    for query in query_history:
-                        query_history_repository.insert(query)
-
-            except Exception:  # noqa: S112
-                continue
+                futures = {
+                    executor.submit(
+                        self.scan_table,
+                        meta=meta,
+                        table=table,
+                        db_engine=db_engine,
+                        repository=repository,
+                        scanner_service=scanner_service,
+                        force=force,
+                    ): table
+                    for table in batch
+                }
+                for future in as_completed(futures):
+                    table = futures[future]
+                    try:
+                        scanned = future.result()
+                    except Exception as e:
+                        logger.error(f"Scanning table {table.table_name} failed: {e}")
+                        scanned = False
+                    if progress is not None and not progress(table, scanned):
+                        logger.info("Scan stopped, cancelling the pending tables")
+                        for pending in futures:
+                            pending.cancel()
+                        return
+        self.store_logs(
+            table_descriptions, db_engine, query_history_repository, scanner_service
+        )
@@ -1,4 +1,5 @@
 import logging
+import os
 import re
 import time
 from datetime import date, datetime
@@ -12,7 +13,6 @@ from langchain.prompts.chat import (
 )
 from overrides import override
 from sql_metadata import Parser
-from sqlalchemy import text
 
 from dataherald.config import System
 from dataherald.db import DB
@@ -21,6 +21,7 @@ from dataherald.db_scanner.repository.base import TableDescriptionRepository
 from dataherald.eval import Evaluation, Evaluator
 from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_database.result_snapshots import ResultSnapshots
 from dataherald.types import Prompt, SQLGeneration
 
 logger = logging.getLogger(__name__)
@@ -90,7 +91,7 @@ class SimpleEvaluator(Evaluator):
         if result:
             for row in result:
                 modified_row = {}
-                for key, value in zip(row.keys(), row, strict=True):
+                for key, value in row.items():
                     if type(value) in [
                         date,
                         datetime,
@@ -159,10 +160,13 @@ class SimpleEvaluator(Evaluator):
             )
         chain = LLMChain(llm=self.llm, prompt=chat_prompt)
         try:
-            query = database.parser_to_filter_commands(sql_generation.sql)
-            with database._engine.connect() as connection:
-                execution = connection.execute(text(query))
-                result = execution.fetchmany(TOP_K)
+            result = ResultSnapshots.fetch(
+                database,
+                sql_generation.id,
+                sql_generation.sql,
+                TOP_K,
+                timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", "150")),
+            ).records(TOP_K)
             rows = self.create_sql_results(result)
 
         except SQLInjectionError as e:
@@ -23,9 +23,14 @@ from dataherald.repositories.golden_sqls import GoldenSQLRepository
 from dataherald.types import Finetuning, FineTuningStatus
 from dataherald.utils.agent_prompts import FINETUNING_SYSTEM_INFORMATION
 from dataherald.utils.models_context_window import OPENAI_FINETUNING_MODELS_WINDOW_SIZES
+from dataherald.utils.table_embeddings import (
+    TableEmbeddingCache,
+    normalize_rows,
+    top_k_similarities,
+)
 
 FILE_PROCESSING_ATTEMPTS = 20
-EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL","text-embedding-3-large")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
 CATEGORICAL_COLUMNS_THRESHOLD = 60
 
 logger = logging.getLogger(__name__)
@@ -154,15 +159,11 @@ class OpenAIFineTuning(FinetuningModel):
         table_embeddings: List[List[float]],
         prompt: str,
     ) -> List[TableDescription]:
-        tables_with_similarity = []
         prompt_embedding = self.embedding.embed_query(prompt)
-        similarities = np.dot(table_embeddings, prompt_embedding) / (
-            np.linalg.norm(table_embeddings) * np.linalg.norm(prompt_embedding)
+        ranking = top_k_similarities(
+            normalize_rows(table_embeddings), prompt_embedding, len(tables)
         )
-        for i in range(len(tables)):
-            tables_with_similarity.append((tables[i], similarities[i]))
-        tables_with_similarity.sort(key=lambda x: x[1], reverse=True)
-        return [table[0] for table in tables_with_similarity]
+        return [tables[index] for index, _ in ranking]
 
     def format_dataset(
         self,
@@ -220,7 +221,9 @@ class OpenAIFineTuning(FinetuningModel):
         table_representations = []
         for table in db_scan:
             table_representations.append(self.create_table_representation(table))
-        table_embeddings = self.embedding.embed_documents(table_representations)
+        table_embeddings = TableEmbeddingCache(
+            self.storage, self.embedding
+        ).embed_tables(db_scan, table_representations)
         for index, golden_sql_id in enumerate(self.fine_tuning_model.golden_sqls):
             logger.info(
                 f"Processing golden sql {index + 1} of {len(self.fine_tuning_model.golden_sqls)}"
@@ -0,0 +1,25 @@
+import time
+
+DB_COLLECTION = "cache_invalidations"
+INDEXES = [["db_connection_id"]]
+
+
+class CacheInvalidationRepository:
+    """When the caches of each db connection were last invalidated, so the process local
+    caches of every engine process drop the entries cached before that"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def invalidate(self, db_connection_id: str) -> None:
+        self.storage.update_or_create(
+            DB_COLLECTION,
+            {"db_connection_id": str(db_connection_id)},
+            {"db_connection_id": str(db_connection_id), "invalidated_at": time.time()},
+        )
+
+    def invalidated_at(self, db_connection_id: str) -> float | None:
+        row = self.storage.find_one(
+            DB_COLLECTION, {"db_connection_id": str(db_connection_id)}
+        )
+        return row["invalidated_at"] if row else None
@@ -0,0 +1,81 @@
+"""Compares the DataFrame based table ranking with the vectorized top-k ranking.
+
+Usage: python -m dataherald.scripts.benchmark_table_ranking [--dimensions 3072] [--repeat 5] [table counts ...]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataherald.utils.table_embeddings import normalize_rows, top_k_similarities
+
+TOP_TABLES = 20
+
+
+def cosine_similarity(a: list[float], b: list[float]) -> float:
+    return round(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)), 4)
+
+
+def dataframe_ranking(
+    table_names: list[str], embeddings: list[list[float]], question: list[float]
+) -> list[str]:
+    df = pd.DataFrame(table_names, columns=["table_name"])
+    df["table_embedding"] = embeddings
+    df["similarities"] = df.table_embedding.apply(
+        lambda x: cosine_similarity(x, question)
+    )
+    df = df.sort_values(by="similarities", ascending=False)
+    df = df.head(TOP_TABLES)
+    return [row["table_name"] for _, row in df.iterrows()]
+
+
+def vectorized_ranking(
+    table_names: list[str], matrix: np.ndarray, question: list[float]
+) -> list[str]:
+    return [
+        table_names[index]
+        for index, _ in top_k_similarities(matrix, question, TOP_TABLES)
+    ]
+
+
+def best_of(repeat: int, fn, *args) -> tuple[float, list[str]]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("tables", nargs="*", type=int, default=[100, 800, 2000, 5000])
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        f"{'tables':>8} {'dataframe (ms)':>16} {'vectorized (ms)':>16} {'speedup':>8}"
+    )
+    for number_of_tables in args.tables:
+        table_names = [f"table_{i}" for i in range(number_of_tables)]
+        embeddings = rng.standard_normal((number_of_tables, args.dimensions)).tolist()
+        question = rng.standard_normal(args.dimensions).tolist()
+        # The matrix is normalized once per connection and cached, so it is not part of the timing
+        matrix = normalize_rows(embeddings)
+
+        dataframe_time, dataframe_tables = best_of(
+            args.repeat, dataframe_ranking, table_names, embeddings, question
+        )
+        vectorized_time, vectorized_tables = best_of(
+            args.repeat, vectorized_ranking, table_names, matrix, question
+        )
+        if set(dataframe_tables) != set(vectorized_tables):
+            print(f"Warning: rankings differ for {number_of_tables} tables")
+        print(
+            f"{number_of_tables:>8} {dataframe_time * 1000:>16.2f} {vectorized_time * 1000:>16.2f} "
+            f"{dataframe_time / vectorized_time:>7.1f}x"
+        )
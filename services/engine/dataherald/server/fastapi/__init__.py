@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Annotated, List
 
 import fastapi
 from fastapi import BackgroundTasks, status
@@ -10,6 +10,7 @@ from fastapi.routing import APIRoute
 import dataherald
 from dataherald.api.types.query import Query
 from dataherald.api.types.requests import (
+    ExecutionPageRequest,
     NLGenerationRequest,
     NLGenerationsSQLGenerationRequest,
     PromptRequest,
@@ -25,6 +26,7 @@ from dataherald.api.types.responses import (
     InstructionResponse,
     NLGenerationResponse,
     PromptResponse,
+    ScanJobResponse,
     SQLGenerationResponse,
     TableDescriptionResponse,
 )
@@ -44,6 +46,15 @@ from dataherald.types import (
     TableDescriptionRequest,
     UpdateInstruction,
 )
+from dataherald.utils.exports import (
+    EXECUTE_FORMATS,
+    EXPORT_FORMATS,
+    FILE_EXTENSIONS,
+    MEDIA_TYPES,
+    negotiate_format,
+)
+
+CONTINUATION_TOKEN_HEADER = "X-Continuation-Token"  # noqa: S105
 
 
 def use_route_names_as_operation_ids(app: _FastAPI) -> None:
@@ -58,7 +69,7 @@ def use_route_names_as_operation_ids(app: _FastAPI) -> None:
 
 
 class FastAPI(dataherald.server.Server):
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings):  # noqa: PLR0915
         super().__init__(settings)
         self._app = fastapi.FastAPI(debug=True)
         self._api: dataherald.api.API = dataherald.client(settings)
@@ -95,6 +106,27 @@ class FastAPI(dataherald.server.Server):
             tags=["Table descriptions"],
         )
 
+        self.router.add_api_route(
+            "/api/v1/scan-jobs",
+            self.get_scan_jobs,
+            methods=["GET"],
+            tags=["Scan jobs"],
+        )
+
+        self.router.add_api_route(
+            "/api/v1/scan-jobs/{scan_job_id}",
+            self.get_scan_job,
+            methods=["GET"],
+            tags=["Scan jobs"],
+        )
+
+        self.router.add_api_route(
+            "/api/v1/scan-jobs/{scan_job_id}/cancel",
+            self.cancel_scan_job,
+            methods=["POST"],
+            tags=["Scan jobs"],
+        )
+
         self.router.add_api_route(
             "/api/v1/table-descriptions/refresh",
             self.refresh_table_description,
@@ -368,6 +400,10 @@ class FastAPI(dataherald.server.Server):
             "/api/v1/heartbeat", self.heartbeat, methods=["GET"], tags=["System"]
         )
 
+        self.router.add_api_route(
+            "/api/v1/stats", self.stats, methods=["GET"], tags=["System"]
+        )
+
         self._app.include_router(self.router)
         use_route_names_as_operation_ids(self._app)
 
@@ -379,6 +415,20 @@ class FastAPI(dataherald.server.Server):
     ) -> list[TableDescriptionResponse]:
         return self._api.scan_db(scanner_request, background_tasks)
 
+    def get_scan_jobs(
+        self, db_connection_id: str | None = None
+    ) -> list[ScanJobResponse]:
+        """Lists the scan jobs, newest first"""
+        return self._api.get_scan_jobs(db_connection_id)
+
+    def get_scan_job(self, scan_job_id: str) -> ScanJobResponse:
+        """Returns the status and progress of a scan job"""
+        return self._api.get_scan_job(scan_job_id)
+
+    def cancel_scan_job(self, scan_job_id: str) -> ScanJobResponse:
+        """Cancels a queued or running scan job"""
+        return self._api.cancel_scan_job(scan_job_id)
+
     def refresh_table_description(
         self, refresh_table_description: RefreshTableDescriptionRequest
     ) -> list[TableDescriptionResponse]:
@@ -398,15 +448,17 @@ class FastAPI(dataherald.server.Server):
     def get_prompts(self, db_connection_id: str | None = None) -> list[PromptResponse]:
         return self._api.get_prompts(db_connection_id)
 
-    def create_sql_generation(
+    async def create_sql_generation(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
     ) -> SQLGenerationResponse:
-        return self._api.create_sql_generation(prompt_id, sql_generation_request)
+        return await self._api.create_sql_generation(prompt_id, sql_generation_request)
 
-    def create_prompt_and_sql_generation(
+    async def create_prompt_and_sql_generation(
         self, prompt_sql_generation_request: PromptSQLGenerationRequest
     ) -> SQLGenerationResponse:
-        return self._api.create_prompt_and_sql_generation(prompt_sql_generation_request)
+        return await self._api.create_prompt_and_sql_generation(
+            prompt_sql_generation_request
+        )
 
     def get_sql_generations(
         self, prompt_id: str | None = None
@@ -461,6 +513,9 @@ class FastAPI(dataherald.server.Server):
     def heartbeat(self) -> dict[str, int]:
         return self.root()
 
+    def stats(self) -> dict:
+        return self._api.stats()
+
     def create_database_connection(
         self, database_connection_request: DatabaseConnectionRequest
     ) -> DatabaseConnectionResponse:
@@ -507,17 +562,52 @@ class FastAPI(dataherald.server.Server):
         """Get description"""
         return self._api.get_query_history(db_connection_id)
 
-    def execute_sql_query(self, sql_generation_id: str, max_rows: int = 100) -> list:
-        """Executes a query on the given db_connection_id"""
-        return self._api.execute_sql_query(sql_generation_id, max_rows)
-
-    def export_csv_file(self, sql_generation_id: str) -> StreamingResponse:
-        """Exports a CSV file for the given sql_generation_id"""
-        stream = self._api.export_csv_file(sql_generation_id)
-
-        response = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
+    def execute_sql_query(
+        self,
+        sql_generation_id: str,
+        response: fastapi.Response,
+        page: Annotated[ExecutionPageRequest, fastapi.Depends()],
+        accept: str | None = fastapi.Header(default=None),
+    ) -> list:
+        """Executes a query on the given db_connection_id, the rows are returned as JSON
+        unless an Arrow stream or Parquet is requested in the Accept header. Paginated
+        executions return pages of max_rows rows and the token of the next page in the
+        X-Continuation-Token header"""
+        result_format = negotiate_format(accept, EXECUTE_FORMATS, "json")
+        next_token = None
+        if page.paginate or page.continuation_token:
+            result, next_token = self._api.execute_sql_query_page(
+                sql_generation_id,
+                page.max_rows,
+                page.continuation_token,
+                result_format,
+            )
+        else:
+            result = self._api.execute_sql_query(
+                sql_generation_id, page.max_rows, result_format
+            )
+        if result_format != "json":
+            response = StreamingResponse(result, media_type=MEDIA_TYPES[result_format])
+        if next_token:
+            response.headers[CONTINUATION_TOKEN_HEADER] = next_token
+        return result if result_format == "json" else response
+
+    def export_csv_file(
+        self,
+        sql_generation_id: str,
+        gzip: bool = False,
+        accept: str | None = fastapi.Header(default=None),
+    ) -> StreamingResponse:
+        """Exports a CSV file for the given sql_generation_id, or an Arrow stream or a
+        Parquet file if they are requested in the Accept header"""
+        result_format = negotiate_format(accept, EXPORT_FORMATS, "csv")
+        stream = self._api.export_csv_file(sql_generation_id, gzip, result_format)
+
+        response = StreamingResponse(stream, media_type=MEDIA_TYPES[result_format])
+        if gzip:
+            response.headers["Content-Encoding"] = "gzip"
         response.headers["Content-Disposition"] = (
-            f"attachment; filename=sql_generation_{sql_generation_id}.csv"
+            f"attachment; filename=sql_generation_{sql_generation_id}.{FILE_EXTENSIONS[result_format]}"
         )
         return response
 
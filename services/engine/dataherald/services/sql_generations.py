@@ -1,9 +1,9 @@
+import asyncio
+import logging
 import os
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from datetime import datetime
-from queue import Queue
-
-import pandas as pd
+from typing import Iterator
 
 from dataherald.api.types.requests import SQLGenerationRequest
 from dataherald.config import System
@@ -16,13 +16,28 @@ from dataherald.repositories.sql_generations import (
     SQLGenerationNotFoundError,
     SQLGenerationRepository,
 )
+from dataherald.smart_cache import SmartCache
 from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_database.result_cursors import (
+    ContinuationToken,
+    InvalidContinuationTokenError,
+    ResultCursors,
+)
+from dataherald.sql_database.result_snapshots import ResultSnapshot, ResultSnapshots
+from dataherald.sql_generator import TOOL_STATS_KEYS, SQLGenerator
 from dataherald.sql_generator.create_sql_query_status import create_sql_query_status
 from dataherald.sql_generator.dataherald_finetuning_agent import (
     DataheraldFinetuningAgent,
 )
 from dataherald.sql_generator.dataherald_sqlagent import DataheraldSQLAgent
-from dataherald.types import LLMConfig, SQLGeneration
+from dataherald.types import LLMConfig, Prompt, SQLGeneration
+from dataherald.utils.exports import arrow_chunks, csv_chunks, record_batches
+from dataherald.utils.streaming import StreamChannel
+
+logger = logging.getLogger(__name__)
+
+CSV_EXPORT_CHUNK_SIZE = int(os.getenv("CSV_EXPORT_CHUNK_SIZE", "10000"))
 
 
 class SQLGenerationError(Exception):
@@ -61,11 +76,59 @@ class SQLGenerationService:
         initial_sql_generation.status = sql_generation.status
         initial_sql_generation.error = sql_generation.error
         initial_sql_generation.intermediate_steps = sql_generation.intermediate_steps
+        initial_sql_generation.stage_timings = sql_generation.stage_timings
+        if sql_generation.metadata:
+            initial_sql_generation.metadata = {
+                **(initial_sql_generation.metadata or {}),
+                **sql_generation.metadata,
+            }
         return self.sql_generation_repository.update(initial_sql_generation)
 
-    def create(  # noqa: PLR0912
+    def get_smart_cache(self) -> SmartCache | None:
+        if not self.system.settings["smart_cache_enabled"]:
+            return None
+        return self.system.instance(SmartCache)
+
+    @staticmethod
+    def smart_cache_scope(sql_generation_request: SQLGenerationRequest) -> str:
+        llm_config = (
+            sql_generation_request.llm_config
+            if sql_generation_request.llm_config
+            else LLMConfig()
+        )
+        return "|".join(
+            [
+                sql_generation_request.finetuning_id or "",
+                str(bool(sql_generation_request.low_latency_mode)),
+                llm_config.llm_name,
+                llm_config.api_base or "",
+            ]
+        )
+
+    @staticmethod
+    def from_smart_cache(
+        cached_sql_generation: SQLGeneration,
+        prompt_id: str,
+        metadata: dict | None = None,
+    ) -> SQLGeneration:
+        """Reuses the cached generation for the prompt. The tool stats belong to the
+        generation that was cached, so they are dropped and the metadata of the request
+        takes precedence over the rest of the cached metadata."""
+        cached_sql_generation.prompt_id = prompt_id
+        cached_sql_generation.tokens_used = 0
+        cached_sql_generation.completed_at = datetime.now()
+        cached_metadata = {
+            key: value
+            for key, value in (cached_sql_generation.metadata or {}).items()
+            if key not in TOOL_STATS_KEYS
+        }
+        cached_sql_generation.metadata = {**cached_metadata, **(metadata or {})}
+        return cached_sql_generation
+
+    def initialize(
         self, prompt_id: str, sql_generation_request: SQLGenerationRequest
-    ) -> SQLGeneration:  # noqa: PLR0912
+    ) -> tuple[SQLGeneration, Prompt, DatabaseConnection]:
+        """Stores the pending sql generation and loads its prompt and db connection"""
         initial_sql_generation = SQLGeneration(
             prompt_id=prompt_id,
             created_at=datetime.now(),
@@ -76,11 +139,6 @@ class SQLGenerationService:
             ),
             metadata=sql_generation_request.metadata,
         )
-        langsmith_metadata = (
-            sql_generation_request.metadata.get("lang_smith", {})
-            if sql_generation_request.metadata
-            else {}
-        )
         self.sql_generation_repository.insert(initial_sql_generation)
         prompt_repository = PromptRepository(self.storage)
         prompt = prompt_repository.find_by_id(prompt_id)
@@ -91,82 +149,78 @@ class SQLGenerationService:
             )
         db_connection_repository = DatabaseConnectionRepository(self.storage)
         db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
-        database = SQLDatabase.get_sql_engine(db_connection, True)
-        if sql_generation_request.sql is not None:
-            sql_generation = SQLGeneration(
-                prompt_id=prompt_id,
-                sql=sql_generation_request.sql,
-                tokens_used=0,
+        return initial_sql_generation, prompt, db_connection
+
+    def create_from_sql(
+        self,
+        initial_sql_generation: SQLGeneration,
+        sql: str,
+        db_connection: DatabaseConnection,
+    ) -> SQLGeneration:
+        database = SQLDatabase.get_sql_engine(db_connection)
+        sql_generation = SQLGeneration(
+            prompt_id=initial_sql_generation.prompt_id,
+            sql=sql,
+            tokens_used=0,
+        )
+        try:
+            return create_sql_query_status(
+                db=database, query=sql_generation.sql, sql_generation=sql_generation
             )
-            try:
-                sql_generation = create_sql_query_status(
-                    db=database, query=sql_generation.sql, sql_generation=sql_generation
-                )
-            except Exception as e:
-                self.update_error(initial_sql_generation, str(e))
-                raise SQLGenerationError(str(e), initial_sql_generation.id) from e
-        else:
-            if (
-                sql_generation_request.finetuning_id is None
-                or sql_generation_request.finetuning_id == ""
-            ):
-                if sql_generation_request.low_latency_mode:
-                    raise SQLGenerationError(
-                        "Low latency mode is not supported for our old agent with no finetuning. Please specify a finetuning id.",
-                        initial_sql_generation.id,
-                    )
-                sql_generator = DataheraldSQLAgent(
-                    self.system,
-                    (
-                        sql_generation_request.llm_config
-                        if sql_generation_request.llm_config
-                        else LLMConfig()
-                    ),
-                )
-            else:
-                sql_generator = DataheraldFinetuningAgent(
-                    self.system,
-                    (
-                        sql_generation_request.llm_config
-                        if sql_generation_request.llm_config
-                        else LLMConfig()
-                    ),
-                )
-                sql_generator.finetuning_id = sql_generation_request.finetuning_id
-                sql_generator.use_fintuned_model_only = (
-                    sql_generation_request.low_latency_mode
-                )
-                initial_sql_generation.finetuning_id = (
-                    sql_generation_request.finetuning_id
-                )
-                initial_sql_generation.low_latency_mode = (
-                    sql_generation_request.low_latency_mode
+        except Exception as e:
+            self.update_error(initial_sql_generation, str(e))
+            raise SQLGenerationError(str(e), initial_sql_generation.id) from e
+
+    def get_sql_generator(
+        self,
+        initial_sql_generation: SQLGeneration,
+        sql_generation_request: SQLGenerationRequest,
+    ) -> SQLGenerator:
+        if (
+            sql_generation_request.finetuning_id is None
+            or sql_generation_request.finetuning_id == ""
+        ):
+            if sql_generation_request.low_latency_mode:
+                raise SQLGenerationError(
+                    "Low latency mode is not supported for our old agent with no finetuning. Please specify a finetuning id.",
+                    initial_sql_generation.id,
                 )
-            try:
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(
-                        self.generate_response_with_timeout,
-                        sql_generator,
-                        prompt,
-                        db_connection,
-                        metadata=langsmith_metadata,
-                    )
-                    try:
-                        sql_generation = future.result(
-                            timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", 150))
-                        )
-                    except TimeoutError as e:
-                        self.update_error(
-                            initial_sql_generation, "SQL generation request timed out"
-                        )
-                        raise SQLGenerationError(
-                            "SQL generation request timed out",
-                            initial_sql_generation.id,
-                        ) from e
-            except Exception as e:
-                self.update_error(initial_sql_generation, str(e))
-                raise SQLGenerationError(str(e), initial_sql_generation.id) from e
+            return DataheraldSQLAgent(
+                self.system,
+                (
+                    sql_generation_request.llm_config
+                    if sql_generation_request.llm_config
+                    else LLMConfig()
+                ),
+            )
+        sql_generator = DataheraldFinetuningAgent(
+            self.system,
+            (
+                sql_generation_request.llm_config
+                if sql_generation_request.llm_config
+                else LLMConfig()
+            ),
+        )
+        sql_generator.finetuning_id = sql_generation_request.finetuning_id
+        sql_generator.use_fintuned_model_only = sql_generation_request.low_latency_mode
+        initial_sql_generation.finetuning_id = sql_generation_request.finetuning_id
+        initial_sql_generation.low_latency_mode = (
+            sql_generation_request.low_latency_mode
+        )
+        return sql_generator
+
+    def complete(
+        self,
+        initial_sql_generation: SQLGeneration,
+        sql_generation: SQLGeneration,
+        prompt: Prompt,
+        db_connection: DatabaseConnection,
+        sql_generation_request: SQLGenerationRequest,
+    ) -> SQLGeneration:
+        """Evaluates the generated SQL if it was requested and stores the result"""
         if sql_generation_request.evaluate:
+            # The evaluation result snapshot is reused by later executions of the generation
+            sql_generation.id = initial_sql_generation.id
             evaluator = self.system.instance(Evaluator)
             evaluator.llm_config = (
                 sql_generation_request.llm_config
@@ -184,8 +238,156 @@ class SQLGenerationService:
             initial_sql_generation, sql_generation
         )
 
+    def create(
+        self, prompt_id: str, sql_generation_request: SQLGenerationRequest
+    ) -> SQLGeneration:
+        initial_sql_generation, prompt, db_connection = self.initialize(
+            prompt_id, sql_generation_request
+        )
+        langsmith_metadata = (
+            sql_generation_request.metadata.get("lang_smith", {})
+            if sql_generation_request.metadata
+            else {}
+        )
+        if sql_generation_request.sql is not None:
+            sql_generation = self.create_from_sql(
+                initial_sql_generation, sql_generation_request.sql, db_connection
+            )
+        else:
+            sql_generator = self.get_sql_generator(
+                initial_sql_generation, sql_generation_request
+            )
+            smart_cache = self.get_smart_cache()
+            smart_cache_scope = self.smart_cache_scope(sql_generation_request)
+            cached_sql_generation = (
+                smart_cache.lookup(prompt, db_connection, smart_cache_scope)
+                if smart_cache
+                else None
+            )
+            if cached_sql_generation is not None:
+                sql_generation = self.from_smart_cache(
+                    cached_sql_generation, prompt_id, sql_generation_request.metadata
+                )
+            else:
+                try:
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        future = executor.submit(
+                            self.generate_response_with_timeout,
+                            sql_generator,
+                            prompt,
+                            db_connection,
+                            metadata=langsmith_metadata,
+                        )
+                        try:
+                            sql_generation = future.result(
+                                timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", 150))
+                            )
+                        except TimeoutError as e:
+                            self.update_error(
+                                initial_sql_generation,
+                                "SQL generation request timed out",
+                            )
+                            raise SQLGenerationError(
+                                "SQL generation request timed out",
+                                initial_sql_generation.id,
+                            ) from e
+                except Exception as e:
+                    self.update_error(initial_sql_generation, str(e))
+                    raise SQLGenerationError(str(e), initial_sql_generation.id) from e
+                if smart_cache:
+                    smart_cache.add(
+                        prompt, sql_generation, db_connection, smart_cache_scope
+                    )
+        return self.complete(
+            initial_sql_generation,
+            sql_generation,
+            prompt,
+            db_connection,
+            sql_generation_request,
+        )
+
+    async def acreate(
+        self, prompt_id: str, sql_generation_request: SQLGenerationRequest
+    ) -> SQLGeneration:
+        """Same as `create` but the agent runs on the event loop with `ainvoke`, so a
+        generation doesn't hold a thread while it waits for the LLM. The storage, the
+        database and the evaluation calls are blocking and run in worker threads."""
+        initial_sql_generation, prompt, db_connection = await asyncio.to_thread(
+            self.initialize, prompt_id, sql_generation_request
+        )
+        langsmith_metadata = (
+            sql_generation_request.metadata.get("lang_smith", {})
+            if sql_generation_request.metadata
+            else {}
+        )
+        if sql_generation_request.sql is not None:
+            sql_generation = await asyncio.to_thread(
+                self.create_from_sql,
+                initial_sql_generation,
+                sql_generation_request.sql,
+                db_connection,
+            )
+        else:
+            sql_generator = self.get_sql_generator(
+                initial_sql_generation, sql_generation_request
+            )
+            smart_cache = self.get_smart_cache()
+            smart_cache_scope = self.smart_cache_scope(sql_generation_request)
+            cached_sql_generation = (
+                await asyncio.to_thread(
+                    smart_cache.lookup, prompt, db_connection, smart_cache_scope
+                )
+                if smart_cache
+                else None
+            )
+            if cached_sql_generation is not None:
+                sql_generation = self.from_smart_cache(
+                    cached_sql_generation, prompt_id, sql_generation_request.metadata
+                )
+            else:
+                try:
+                    sql_generation = await asyncio.wait_for(
+                        sql_generator.agenerate_response(
+                            prompt, db_connection, metadata=langsmith_metadata
+                        ),
+                        timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", "150")),
+                    )
+                except TimeoutError as e:
+                    await asyncio.to_thread(
+                        self.update_error,
+                        initial_sql_generation,
+                        "SQL generation request timed out",
+                    )
+                    raise SQLGenerationError(
+                        "SQL generation request timed out", initial_sql_generation.id
+                    ) from e
+                except Exception as e:
+                    await asyncio.to_thread(
+                        self.update_error, initial_sql_generation, str(e)
+                    )
+                    raise SQLGenerationError(str(e), initial_sql_generation.id) from e
+                if smart_cache:
+                    await asyncio.to_thread(
+                        smart_cache.add,
+                        prompt,
+                        sql_generation,
+                        db_connection,
+                        smart_cache_scope,
+                    )
+        return await asyncio.to_thread(
+            self.complete,
+            initial_sql_generation,
+            sql_generation,
+            prompt,
+            db_connection,
+            sql_generation_request,
+        )
+
     def start_streaming(
-        self, prompt_id: str, sql_generation_request: SQLGenerationRequest, queue: Queue
+        self,
+        prompt_id: str,
+        sql_generation_request: SQLGenerationRequest,
+        queue: StreamChannel,
     ):
         initial_sql_generation = SQLGeneration(
             prompt_id=prompt_id,
@@ -212,39 +414,33 @@ class SQLGenerationService:
             )
         db_connection_repository = DatabaseConnectionRepository(self.storage)
         db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
-        if (
-            sql_generation_request.finetuning_id is None
-            or sql_generation_request.finetuning_id == ""
-        ):
-            if sql_generation_request.low_latency_mode:
-                raise SQLGenerationError(
-                    "Low latency mode is not supported for our old agent with no finetuning. Please specify a finetuning id.",
-                    initial_sql_generation.id,
-                )
-            sql_generator = DataheraldSQLAgent(
-                self.system,
-                (
-                    sql_generation_request.llm_config
-                    if sql_generation_request.llm_config
-                    else LLMConfig()
-                ),
+        sql_generator = self.get_sql_generator(
+            initial_sql_generation, sql_generation_request
+        )
+        smart_cache = self.get_smart_cache()
+        smart_cache_scope = self.smart_cache_scope(sql_generation_request)
+        cached_sql_generation = (
+            smart_cache.lookup(prompt, db_connection, smart_cache_scope)
+            if smart_cache
+            else None
+        )
+        if cached_sql_generation is not None:
+            sql_generation = self.from_smart_cache(
+                cached_sql_generation, prompt_id, sql_generation_request.metadata
             )
-        else:
-            sql_generator = DataheraldFinetuningAgent(
-                self.system,
-                (
-                    sql_generation_request.llm_config
-                    if sql_generation_request.llm_config
-                    else LLMConfig()
-                ),
+            queue.put(
+                "\n**Final Answer:**\n ```sql\n"
+                + sql_generator.format_sql_query(sql_generation.sql)
+                + "\n```"
             )
-            sql_generator.finetuning_id = sql_generation_request.finetuning_id
-            sql_generator.use_fintuned_model_only = (
-                sql_generation_request.low_latency_mode
+            queue.put(None)
+            self.update_the_initial_sql_generation(
+                initial_sql_generation, sql_generation
             )
-            initial_sql_generation.finetuning_id = sql_generation_request.finetuning_id
-            initial_sql_generation.low_latency_mode = (
-                sql_generation_request.low_latency_mode
+            return
+        if smart_cache:
+            sql_generator.on_stream_complete = lambda sql_generation: smart_cache.add(
+                prompt, sql_generation, db_connection, smart_cache_scope
             )
         try:
             sql_generator.stream_response(
@@ -262,6 +458,12 @@ class SQLGenerationService:
         return self.sql_generation_repository.find_by(query)
 
     def execute(self, sql_generation_id: str, max_rows: int = 100) -> tuple[str, dict]:
+        records = self.execute_snapshot(sql_generation_id, max_rows).records(max_rows)
+        return str(records), {"result": records}
+
+    def execute_snapshot(
+        self, sql_generation_id: str, max_rows: int = 100
+    ) -> ResultSnapshot:
         sql_generation = self.sql_generation_repository.find_by_id(sql_generation_id)
         if not sql_generation:
             raise SQLGenerationNotFoundError(
@@ -271,8 +473,81 @@ class SQLGenerationService:
         prompt = prompt_repository.find_by_id(sql_generation.prompt_id)
         db_connection_repository = DatabaseConnectionRepository(self.storage)
         db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
-        database = SQLDatabase.get_sql_engine(db_connection, True)
-        return database.run_sql(sql_generation.sql, max_rows)
+        database = SQLDatabase.get_sql_engine(db_connection)
+        return ResultSnapshots.fetch(
+            database,
+            sql_generation_id,
+            sql_generation.sql,
+            max_rows,
+            timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", "150")),
+        )
+
+    def execute_page(
+        self,
+        sql_generation_id: str,
+        page_size: int = 100,
+        continuation_token: str | None = None,
+    ) -> tuple[list[str], list[tuple], str | None]:
+        """Returns the columns, a page of rows and the continuation token of the next page,
+        None when it is the last one. Pages are sliced from the result snapshot when it has
+        them, otherwise read from a server side cursor that stays open between the calls.
+        """
+        offset, cursor_id = 0, None
+        if continuation_token:
+            token = ContinuationToken.decode(continuation_token)
+            if token.sql_generation_id != sql_generation_id:
+                raise InvalidContinuationTokenError(
+                    f"The continuation token does not belong to sql generation {sql_generation_id}"
+                )
+            offset, cursor_id = token.offset, token.cursor_id
+        sql_generation = self.sql_generation_repository.find_by_id(sql_generation_id)
+        if not sql_generation:
+            raise SQLGenerationNotFoundError(
+                f"SQL Generation {sql_generation_id} not found"
+            )
+        snapshot = ResultSnapshots.get(
+            sql_generation_id, sql_generation.sql, offset + page_size
+        )
+        if snapshot is not None:
+            ResultCursors.close(cursor_id)
+            cursor_id = None
+            columns = snapshot.columns
+            rows = snapshot.rows(page_size, offset)
+            has_more = not snapshot.complete or snapshot.row_count > offset + page_size
+        else:
+            cursor = ResultCursors.get(cursor_id, sql_generation.sql)
+            if cursor is None or cursor.position != offset:
+                ResultCursors.close(cursor_id)
+                prompt_repository = PromptRepository(self.storage)
+                prompt = prompt_repository.find_by_id(sql_generation.prompt_id)
+                db_connection_repository = DatabaseConnectionRepository(self.storage)
+                db_connection = db_connection_repository.find_by_id(
+                    prompt.db_connection_id
+                )
+                database = SQLDatabase.get_sql_engine(db_connection)
+                cursor_id, cursor = ResultCursors.open(
+                    database,
+                    sql_generation.sql,
+                    page_size,
+                    timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", "150")),
+                )
+                if offset:
+                    logger.info(
+                        f"The result cursor of sql generation {sql_generation_id} expired, skipping {offset} rows"
+                    )
+                    cursor.skip(offset)
+            columns = cursor.columns
+            rows, has_more = cursor.fetch(page_size)
+            if not has_more:
+                ResultCursors.close(cursor_id)
+        next_token = None
+        if has_more:
+            next_token = ContinuationToken(
+                sql_generation_id=sql_generation_id,
+                offset=offset + len(rows),
+                cursor_id=cursor_id,
+            ).encode()
+        return columns, rows, next_token
 
     def update_metadata(self, sql_generation_id, metadata_request) -> SQLGeneration:
         sql_generation = self.sql_generation_repository.find_by_id(sql_generation_id)
@@ -283,21 +558,44 @@ class SQLGenerationService:
         sql_generation.metadata = metadata_request.metadata
         return self.sql_generation_repository.update(sql_generation)
 
-    def create_dataframe(self, sql_generation_id):
+    def export(
+        self,
+        sql_generation_id: str,
+        result_format: str = "csv",
+        chunk_size: int = CSV_EXPORT_CHUNK_SIZE,
+    ) -> Iterator[bytes]:
+        """Returns the generation results in pieces encoded as CSV, an Arrow IPC stream or
+        Parquet. The query is streamed with a server side cursor, or as Arrow batches when
+        the driver has them, unless its complete results are already in memory."""
         sql_generation = self.sql_generation_repository.find_by_id(sql_generation_id)
         if not sql_generation:
             raise SQLGenerationNotFoundError(
                 f"Sql generation {sql_generation_id} not found"
             )
-        prompt_repository = PromptRepository(self.storage)
-        prompt = prompt_repository.find_by_id(sql_generation.prompt_id)
-        db_connection_repository = DatabaseConnectionRepository(self.storage)
-        db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
-        database = SQLDatabase.get_sql_engine(db_connection)
-        results = database.run_sql(sql_generation.sql)
-        if results is None:
+        snapshot = ResultSnapshots.get(sql_generation_id, sql_generation.sql)
+        if snapshot is not None:
+            columns, chunks = snapshot.columns, snapshot.chunks(chunk_size)
+            if result_format != "csv":
+                chunks = record_batches(columns, chunks)
+        else:
+            prompt_repository = PromptRepository(self.storage)
+            prompt = prompt_repository.find_by_id(sql_generation.prompt_id)
+            db_connection_repository = DatabaseConnectionRepository(self.storage)
+            db_connection = db_connection_repository.find_by_id(prompt.db_connection_id)
+            database = SQLDatabase.get_sql_engine(db_connection)
+            timeout = int(os.environ.get("DH_ENGINE_TIMEOUT", "150"))
+            if result_format == "csv":
+                columns, chunks = database.stream_sql(
+                    sql_generation.sql, chunk_size, timeout
+                )
+            else:
+                columns, chunks = database.stream_arrow(
+                    sql_generation.sql, chunk_size, timeout
+                )
+        if not columns:
             raise EmptySQLGenerationError(
                 f"Sql generation {sql_generation_id} is empty"
             )
-        data = results[1]["result"]
-        return pd.DataFrame(data)
+        if result_format == "csv":
+            return csv_chunks(columns, chunks)
+        return arrow_chunks(columns, chunks, result_format)
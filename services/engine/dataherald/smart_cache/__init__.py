@@ -1,17 +1,36 @@
 """Base class that all cache classes inherit from."""
 
 from abc import ABC, abstractmethod
-from typing import Any, Union
 
-from dataherald.config import Component
-from dataherald.types import Response
+from dataherald.config import Component, System
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.types import Prompt, SQLGeneration
 
 
 class SmartCache(Component, ABC):
     @abstractmethod
-    def add(self, key: str, value: Response) -> dict[str, Any]:
-        """Adds a key-value pair to the cache."""
+    def __init__(self, system: System):
+        self.system = system
 
     @abstractmethod
-    def lookup(self, key: str) -> str:
-        """Looks up a key in the cache."""
+    def add(
+        self,
+        prompt: Prompt,
+        sql_generation: SQLGeneration,
+        database_connection: DatabaseConnection,
+        scope: str = "",
+    ) -> None:
+        """Stores a VALID sql generation for the prompt. `scope` separates entries generated with different settings."""
+
+    @abstractmethod
+    def lookup(
+        self,
+        prompt: Prompt,
+        database_connection: DatabaseConnection,
+        scope: str = "",
+    ) -> SQLGeneration | None:
+        """Returns a previously stored sql generation for an equivalent prompt, if any."""
+
+    @abstractmethod
+    def invalidate(self, db_connection_id: str) -> None:
+        """Drops every entry of the db connection."""
@@ -0,0 +1,216 @@
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import List
+
+from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
+from overrides import override
+from pydantic import BaseModel
+
+from dataherald.config import System
+from dataherald.db import DB
+from dataherald.repositories.cache_invalidations import CacheInvalidationRepository
+from dataherald.smart_cache import SmartCache
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.types import Prompt, SQLGeneration
+from dataherald.utils.table_embeddings import normalize_rows, top_k_similarities
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
+SMART_CACHE_TTL = int(os.environ.get("SMART_CACHE_TTL", "86400"))
+SMART_CACHE_MAX_ENTRIES = int(os.environ.get("SMART_CACHE_MAX_ENTRIES", "1000"))
+SMART_CACHE_SIMILARITY_THRESHOLD = float(
+    os.environ.get("SMART_CACHE_SIMILARITY_THRESHOLD", "0.98")
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    return text.rstrip("?.!;").strip()
+
+
+class CacheEntry(BaseModel):
+    db_connection_id: str
+    key: tuple
+    normalized_text: str
+    sql_generation: SQLGeneration
+    embedding: List[float] | None
+    created_at: float
+    expires_at: float
+
+
+class InMemorySmartCache(SmartCache):
+    """Process local SQL generation cache.
+
+    The first tier matches the normalized prompt text exactly, the second one compares the
+    prompt embedding with the cached prompts of the same db connection and scope and accepts
+    the closest one above SMART_CACHE_SIMILARITY_THRESHOLD. Entries expire after
+    SMART_CACHE_TTL seconds and the least recently used ones are evicted past
+    SMART_CACHE_MAX_ENTRIES.
+
+    Invalidations are stored in the cache_invalidations collection, so the entries cached
+    by other engine processes are dropped by their next lookup.
+    """
+
+    def __init__(self, system: System):
+        super().__init__(system)
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        # Prompt embeddings computed by lookups, reused when the generation is added
+        self._embeddings: OrderedDict[tuple, List[float]] = OrderedDict()
+        self._lock = Lock()
+
+    def get_invalidations(self) -> CacheInvalidationRepository:
+        return CacheInvalidationRepository(self.system.instance(DB))
+
+    def get_embedding_model(self, database_connection: DatabaseConnection):
+        if self.system.settings["azure_api_key"] is not None:
+            return AzureOpenAIEmbeddings(
+                openai_api_key=database_connection.decrypt_api_key(),
+                model=EMBEDDING_MODEL,
+            )
+        return OpenAIEmbeddings(
+            openai_api_key=database_connection.decrypt_api_key(),
+            model=EMBEDDING_MODEL,
+        )
+
+    def embed_prompt(
+        self, text: str, database_connection: DatabaseConnection
+    ) -> List[float] | None:
+        if SMART_CACHE_SIMILARITY_THRESHOLD > 1:
+            return None
+        try:
+            return self.get_embedding_model(database_connection).embed_query(text)
+        except Exception as e:
+            logger.warning(f"Smart cache could not embed the prompt: {e}")
+            return None
+
+    @staticmethod
+    def entry_key(prompt: Prompt, scope: str) -> tuple:
+        return (
+            str(prompt.db_connection_id),
+            tuple(sorted(prompt.schemas or [])),
+            scope,
+            normalize_prompt(prompt.text),
+        )
+
+    def remove_invalidated(self, db_connection_id: str) -> None:
+        """Drops the entries of the db connection cached before its last invalidation"""
+        with self._lock:
+            if not any(
+                entry.db_connection_id == db_connection_id
+                for entry in self._entries.values()
+            ):
+                return
+        try:
+            invalidated_at = self.get_invalidations().invalidated_at(db_connection_id)
+        except Exception as e:
+            logger.warning(f"Smart cache could not load the invalidations: {e}")
+            return
+        if invalidated_at is None:
+            return
+        with self._lock:
+            for key in [
+                key
+                for key, entry in self._entries.items()
+                if entry.db_connection_id == db_connection_id
+                and entry.created_at < invalidated_at
+            ]:
+                del self._entries[key]
+
+    def remove_expired(self) -> None:
+        now = time.monotonic()
+        for key in [
+            key for key, entry in self._entries.items() if entry.expires_at < now
+        ]:
+            del self._entries[key]
+
+    @override
+    def add(
+        self,
+        prompt: Prompt,
+        sql_generation: SQLGeneration,
+        database_connection: DatabaseConnection,
+        scope: str = "",
+    ) -> None:
+        if sql_generation.status != "VALID" or not sql_generation.sql:
+            return
+        key = self.entry_key(prompt, scope)
+        with self._lock:
+            embedding = self._embeddings.pop(key, None)
+        entry = CacheEntry(
+            db_connection_id=key[0],
+            key=key,
+            normalized_text=key[-1],
+            sql_generation=sql_generation.copy(deep=True),
+            embedding=embedding or self.embed_prompt(key[-1], database_connection),
+            created_at=time.time(),
+            expires_at=time.monotonic() + SMART_CACHE_TTL,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.remove_expired()
+            while len(self._entries) > SMART_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    @override
+    def lookup(
+        self,
+        prompt: Prompt,
+        database_connection: DatabaseConnection,
+        scope: str = "",
+    ) -> SQLGeneration | None:
+        key = self.entry_key(prompt, scope)
+        self.remove_invalidated(key[0])
+        with self._lock:
+            self.remove_expired()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry.sql_generation.copy(deep=True)
+            candidates = [
+                entry
+                for entry in self._entries.values()
+                if entry.key[:-1] == key[:-1] and entry.embedding is not None
+            ]
+        # Embedded on every miss, `add` stores the generation with this embedding
+        embedding = self.embed_prompt(key[-1], database_connection)
+        if embedding is None:
+            return None
+        with self._lock:
+            self._embeddings[key] = embedding
+            while len(self._embeddings) > SMART_CACHE_MAX_ENTRIES:
+                self._embeddings.popitem(last=False)
+        if not candidates:
+            return None
+        ranking = top_k_similarities(
+            normalize_rows([entry.embedding for entry in candidates]), embedding, 1
+        )
+        if not ranking or ranking[0][1] < SMART_CACHE_SIMILARITY_THRESHOLD:
+            return None
+        entry = candidates[ranking[0][0]]
+        logger.info(
+            f"Smart cache hit for '{prompt.text}' with '{entry.normalized_text}' ({ranking[0][1]:.4f})"
+        )
+        with self._lock:
+            if entry.key in self._entries:
+                self._entries.move_to_end(entry.key)
+        return entry.sql_generation.copy(deep=True)
+
+    @override
+    def invalidate(self, db_connection_id: str) -> None:
+        try:
+            self.get_invalidations().invalidate(db_connection_id)
+        except Exception as e:
+            logger.warning(f"Smart cache could not store the invalidation: {e}")
+        with self._lock:
+            for key in [
+                key
+                for key, entry in self._entries.items()
+                if entry.db_connection_id == str(db_connection_id)
+            ]:
+                del self._entries[key]
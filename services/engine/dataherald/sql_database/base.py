@@ -1,21 +1,57 @@
 """SQL wrapper around SQLDatabase in langchain."""
 
+import hashlib
 import logging
+import os
 import re
-from typing import List
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import RLock
+from typing import Any, Iterator, List
 from urllib.parse import unquote
 
+import pyarrow as pa
 import sqlparse
-from sqlalchemy import MetaData, create_engine, inspect, text
-from sqlalchemy.engine import Engine
-from sqlalchemy.exc import OperationalError
-from sshtunnel import SSHTunnelForwarder
+from google.cloud.bigquery import QueryJobConfig
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Connection, Engine
 
 from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_database.query_timeout import (
+    CURSOR_INFO_KEY,
+    QueryStats,
+    cancel_query,
+    set_session_timeout,
+)
+from dataherald.sql_database.ssh_tunnel import SSHTunnelManager
 from dataherald.utils.encrypt import FernetEncrypt
 from dataherald.utils.error_codes import CustomError
+from dataherald.utils.exports import decimal_types, record_batches
 from dataherald.utils.s3 import S3
 
+SQL_STATEMENT_TIMEOUT = int(os.getenv("SQL_STATEMENT_TIMEOUT", "600"))
+# Seconds the query thread is given to exit once its query was cancelled
+CANCEL_GRACE_PERIOD = 5
+# Dialects whose drivers return the results as Arrow record batches
+ARROW_DIALECTS = {"snowflake", "duckdb", "bigquery"}
+# Quoted literals and identifiers, they are case sensitive
+QUOTED_SQL = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`)")
+# Dialects that compile a query without running it with EXPLAIN
+EXPLAIN_DIALECTS = {
+    "postgresql",
+    "redshift",
+    "snowflake",
+    "mysql",
+    "sqlite",
+    "duckdb",
+    "databricks",
+    "clickhouse",
+}
+# Databricks returns the planning errors as the text of the plan instead of raising them
+EXPLAIN_ERROR_MARKERS = ("Error occurred during query planning",)
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,58 +73,204 @@ class SSHInvalidDatabaseConnectionError(CustomError):
 
 
 class DBConnections:
-    db_connections = {}
+    """Bounded LRU pool of SQLDatabase instances keyed by db connection id and schema.
+
+    Each entry keeps a fingerprint of the connection settings, so an engine is only rebuilt
+    when the settings change. Engines idle for more than DB_CONNECTIONS_IDLE_TIMEOUT seconds
+    or past DB_CONNECTIONS_MAX_ENGINES are disposed.
+    """
+
+    max_engines = int(os.getenv("DB_CONNECTIONS_MAX_ENGINES", "50"))
+    idle_timeout = int(os.getenv("DB_CONNECTIONS_IDLE_TIMEOUT", "1800"))
+    db_connections: OrderedDict = OrderedDict()
+    _lock = RLock()
+    _key_locks: dict = {}
+
+    @staticmethod
+    def key_lock(key: tuple) -> RLock:
+        with DBConnections._lock:
+            return DBConnections._key_locks.setdefault(key, RLock())
+
+    @staticmethod
+    def get(key: tuple, fingerprint: str) -> "SQLDatabase | None":
+        with DBConnections._lock:
+            DBConnections.evict_idle()
+            entry = DBConnections.db_connections.get(key)
+            if entry is None:
+                return None
+            if entry["fingerprint"] != fingerprint:
+                DBConnections.remove(key)
+                return None
+            entry["last_used"] = time.monotonic()
+            DBConnections.db_connections.move_to_end(key)
+            return entry["sql_database"]
 
     @staticmethod
-    def add(uri, engine):
-        DBConnections.db_connections[uri] = engine
+    def add(key: tuple, fingerprint: str, sql_database: "SQLDatabase") -> None:
+        with DBConnections._lock:
+            if key in DBConnections.db_connections:
+                DBConnections.remove(key)
+            DBConnections.db_connections[key] = {
+                "fingerprint": fingerprint,
+                "sql_database": sql_database,
+                "last_used": time.monotonic(),
+            }
+            while len(DBConnections.db_connections) > DBConnections.max_engines:
+                DBConnections.evict(next(iter(DBConnections.db_connections)))
+
+    @staticmethod
+    def remove(key: tuple) -> None:
+        with DBConnections._lock:
+            entry = DBConnections.db_connections.pop(key, None)
+        if entry is not None:
+            logger.info(f"Disposing engine of db connection: {key}")
+            entry["sql_database"].dispose()
+
+    @staticmethod
+    def evict(key: tuple) -> None:
+        """Disposes the engine and forgets the lock of its key, the keys of evicted
+        engines would otherwise keep their locks forever"""
+        with DBConnections._lock:
+            DBConnections._key_locks.pop(key, None)
+        DBConnections.remove(key)
+
+    @staticmethod
+    def clear_inspection_caches(db_connection_id: str) -> None:
+        """Forgets the cached table and view names of every engine of the db connection"""
+        with DBConnections._lock:
+            sql_databases = [
+                entry["sql_database"]
+                for key, entry in DBConnections.db_connections.items()
+                if key[0] == str(db_connection_id)
+            ]
+        for sql_database in sql_databases:
+            sql_database.clear_inspection_cache()
+
+    @staticmethod
+    def evict_idle() -> None:
+        now = time.monotonic()
+        with DBConnections._lock:
+            idle_keys = [
+                key
+                for key, entry in DBConnections.db_connections.items()
+                if now - entry["last_used"] > DBConnections.idle_timeout
+            ]
+            for key in idle_keys:
+                DBConnections.evict(key)
 
 
 class SQLDatabase:
+    inspection_cache_ttl = int(os.getenv("INSPECTION_CACHE_TTL", "300"))
+
     def __init__(self, engine: Engine):
         """Create engine from database URI."""
         self._engine = engine
+        self._ssh_tunnel_key = None
+        self._inspection_cache = {}
+        self._inspection_lock = RLock()
 
     @property
     def engine(self) -> Engine:
         """Return SQL Alchemy engine."""
         return self._engine
 
+    def dispose(self) -> None:
+        """Close every pooled connection of the engine and release its SSH tunnel."""
+        self._engine.dispose()
+        if self._ssh_tunnel_key is not None:
+            SSHTunnelManager.release(self._ssh_tunnel_key)
+            self._ssh_tunnel_key = None
+
     @classmethod
     def from_uri(
         cls, database_uri: str, engine_args: dict | None = None
     ) -> "SQLDatabase":
         """Construct a SQLAlchemy engine from URI."""
-        _engine_args = engine_args or {}
+        _engine_args = {"pool_pre_ping": True, **(engine_args or {})}
         if database_uri.lower().startswith("duckdb"):
             config = {"autoload_known_extensions": False}
             _engine_args["connect_args"] = {"config": config}
         engine = create_engine(database_uri, **_engine_args)
+        cls.register_query_timeouts(engine)
         return cls(engine)
 
+    @staticmethod
+    def register_query_timeouts(engine: Engine) -> None:
+        """Sets the server side statement timeout on every new connection and keeps the
+        running cursor of each connection so `run_sql` can cancel it."""
+        dialect = engine.dialect.name
+
+        def on_connect(dbapi_connection, connection_record):  # noqa: ARG001
+            try:
+                set_session_timeout(dialect, dbapi_connection, SQL_STATEMENT_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Unable to set the {dialect} statement timeout: {e}")
+
+        def on_cursor_execute(conn, cursor, *_):
+            conn.info[CURSOR_INFO_KEY] = cursor
+
+        if SQL_STATEMENT_TIMEOUT > 0:
+            event.listen(engine, "connect", on_connect)
+        event.listen(engine, "before_cursor_execute", on_cursor_execute)
+
+    @staticmethod
+    def connection_fingerprint(database_info: DatabaseConnection) -> str:
+        """Hash of the settings used to build the engine, plain values are hashed since the
+        encryption is not deterministic."""
+        fernet_encrypt = FernetEncrypt()
+        values = [
+            fernet_encrypt.decrypt(database_info.connection_uri),
+            database_info.path_to_credentials_file or "",
+            str(bool(database_info.use_ssh)),
+        ]
+        if database_info.use_ssh and database_info.ssh_settings:
+            ssh = database_info.ssh_settings
+            values += [
+                ssh.host or "",
+                ssh.port or "",
+                ssh.username or "",
+                fernet_encrypt.decrypt(ssh.password) if ssh.password else "",
+                (
+                    fernet_encrypt.decrypt(ssh.private_key_password)
+                    if ssh.private_key_password
+                    else ""
+                ),
+            ]
+        return hashlib.sha256("\x00".join(values).encode("utf-8")).hexdigest()
+
     @classmethod
     def get_sql_engine(
-        cls, database_info: DatabaseConnection, refresh_connection=False
+        cls,
+        database_info: DatabaseConnection,
+        refresh_connection=False,
+        schema: str | None = None,
     ) -> "SQLDatabase":
+        """Returns the pooled engine of the db connection, building it if it is missing, its
+        settings changed or refresh_connection is set."""
         logger.info(f"Connecting db: {database_info.id}")
-        try:
-            if (
-                database_info.id
-                and database_info.id in DBConnections.db_connections
-                and not refresh_connection
-            ):
-                sql_database = DBConnections.db_connections[database_info.id]
-                sql_database.engine.connect()
-                return sql_database
-        except OperationalError:
-            pass
+        if not database_info.id:
+            # Unsaved connections are not pooled, the caller disposes the engine
+            return cls.build_sql_engine(database_info)
+
+        key = (str(database_info.id), schema)
+        fingerprint = cls.connection_fingerprint(database_info)
+        with DBConnections.key_lock(key):
+            if refresh_connection:
+                DBConnections.remove(key)
+            else:
+                sql_database = DBConnections.get(key, fingerprint)
+                if sql_database is not None:
+                    return sql_database
+            sql_database = cls.build_sql_engine(database_info)
+            DBConnections.add(key, fingerprint, sql_database)
+            return sql_database
 
+    @classmethod
+    def build_sql_engine(cls, database_info: DatabaseConnection) -> "SQLDatabase":
         fernet_encrypt = FernetEncrypt()
         try:
             if database_info.use_ssh:
-                engine = cls.from_uri_ssh(database_info)
-                DBConnections.add(database_info.id, engine)
-                return engine
+                return cls.from_uri_ssh(database_info)
         except Exception as e:
             raise SSHInvalidDatabaseConnectionError(
                 "Invalid SSH connection", description=str(e)
@@ -105,8 +287,8 @@ class SQLDatabase:
                 db_uri = db_uri + f"?credentials_path={file_path}"
 
             engine = cls.from_uri(db_uri)
-            engine.engine.connect()
-            DBConnections.add(database_info.id, engine)
+            with engine.engine.connect():
+                pass
         except Exception as e:
             raise InvalidDBConnectionError(  # noqa: B904
                 f"Unable to connect to db: {database_info.alias}", description=str(e)
@@ -143,35 +325,52 @@ class SQLDatabase:
 
     @classmethod
     def from_uri_ssh(cls, database_info: DatabaseConnection):
-        file_path = database_info.path_to_credentials_file
-        if file_path.lower().startswith("s3"):
-            s3 = S3()
-            file_path = s3.download(file_path)
-
         fernet_encrypt = FernetEncrypt()
         db_uri = unquote(fernet_encrypt.decrypt(database_info.connection_uri))
         db_uri_obj = cls.extract_parameters(db_uri)
         ssh = database_info.ssh_settings
 
-        server = SSHTunnelForwarder(
-            (ssh.host, 22 if not ssh.port else int(ssh.port)),
-            ssh_username=ssh.username,
+        tunnel_key = SSHTunnelManager.tunnel_key(
+            ssh.host,
+            22 if not ssh.port else int(ssh.port),
+            ssh.username,
+            db_uri_obj["host"],
+            5432 if not db_uri_obj["port"] else int(db_uri_obj["port"]),
+        )
+        local_host, local_port = SSHTunnelManager.acquire(
+            tunnel_key,
             ssh_password=fernet_encrypt.decrypt(ssh.password),
-            ssh_pkey=file_path,
+            ssh_pkey=database_info.path_to_credentials_file,
             ssh_private_key_password=fernet_encrypt.decrypt(ssh.private_key_password),
-            remote_bind_address=(
-                db_uri_obj["host"],
-                5432 if not db_uri_obj["port"] else int(db_uri_obj["port"]),
-            ),
         )
-        server.stop(force=True)
-        server.start()
-        local_port = str(server.local_bind_port)
-        local_host = str(server.local_bind_host)
-
-        return cls.from_uri(
-            f"{db_uri_obj['driver']}://{db_uri_obj['user']}:{db_uri_obj['password']}@{local_host}:{local_port}/{db_uri_obj['db']}"
+        try:
+            sql_database = cls.from_uri(
+                f"{db_uri_obj['driver']}://{db_uri_obj['user']}:{db_uri_obj['password']}@{local_host}:{local_port}/{db_uri_obj['db']}"
+            )
+        except Exception:
+            SSHTunnelManager.release(tunnel_key)
+            raise
+        sql_database._ssh_tunnel_key = tunnel_key
+        # Every new DBAPI connection checks the tunnel first so a dropped ssh session is
+        # restarted on the same local port instead of failing the query
+        event.listen(
+            sql_database.engine,
+            "do_connect",
+            lambda *_: SSHTunnelManager.ensure_active(tunnel_key),
+        )
+        # Checked out connections keep the tunnel open after an evicted engine is
+        # disposed, until the query they are running returns them
+        event.listen(
+            sql_database.engine,
+            "checkout",
+            lambda *_: SSHTunnelManager.checkout(tunnel_key),
         )
+        event.listen(
+            sql_database.engine,
+            "checkin",
+            lambda *_: SSHTunnelManager.checkin(tunnel_key),
+        )
+        return sql_database
 
     @classmethod
     def parser_to_filter_commands(cls, command: str) -> str:
@@ -202,28 +401,271 @@ class SQLDatabase:
 
         return command
 
-    def run_sql(self, command: str, top_k: int = None) -> tuple[str, dict]:
+    @staticmethod
+    def normalize_sql(command: str) -> str:
+        """Strips the comments, the trailing semicolon and repeated whitespace so the same
+        query written twice has the same text."""
+        command = sqlparse.format(command, strip_comments=True)
+        return re.sub(r"\s+", " ", command).strip().rstrip(";").strip()
+
+    @classmethod
+    def fingerprint_sql(cls, command: str) -> str:
+        """Normalizes the query and case folds everything outside its quoted literals and
+        identifiers, which are case sensitive"""
+        command = cls.normalize_sql(command.replace("```sql", "").replace("```", ""))
+        return "".join(
+            part if index % 2 else part.casefold()
+            for index, part in enumerate(QUOTED_SQL.split(command))
+        )
+
+    def validate_sql(self, command: str, timeout: int | None = None) -> None:
+        """Checks the query compiles in the database without running it: a dry run for
+        BigQuery, EXPLAIN when the dialect has it and a query that returns no rows for
+        SQL Server. Raises the database error if the query is invalid."""
+        command = self.parser_to_filter_commands(command)
+        statement = command.strip().rstrip(";")
+        if self.dialect == "bigquery":
+            connection = self._engine.raw_connection()
+            try:
+                connection.cursor().execute(
+                    statement, job_config=QueryJobConfig(dry_run=True)
+                )
+            finally:
+                connection.close()
+            return
+        if self.dialect in EXPLAIN_DIALECTS:
+            _, result = self.run_sql(f"EXPLAIN {statement}", top_k=1, timeout=timeout)
+            plan = "\n".join(
+                str(value) for row in result.get("result", []) for value in row
+            )
+            for marker in EXPLAIN_ERROR_MARKERS:
+                if marker in plan:
+                    raise ValueError(plan[plan.index(marker) :].strip())
+        elif self.dialect == "mssql" and not statement.upper().startswith("WITH"):
+            self.run_sql(
+                f"SELECT * FROM ({statement}) AS validation WHERE 1 = 0",  # noqa: S608
+                timeout=timeout,
+            )
+        else:
+            self.run_sql(command, top_k=1, timeout=timeout)
+
+    def run_sql(
+        self, command: str, top_k: int = None, timeout: int | None = None
+    ) -> tuple[str, dict]:
         """Execute a SQL statement and return a string representing the results.
 
         If the statement returns rows, a string of the results is returned.
         If the statement returns no rows, an empty string is returned.
+        If it runs for more than `timeout` seconds the query is cancelled in the database
+        and TimeoutError is raised.
         """
-        with self._engine.connect() as connection:
-            command = self.parser_to_filter_commands(command)
-            cursor = connection.execute(text(command))
-            if cursor.returns_rows and top_k:
-                result = cursor.fetchmany(top_k)
-                return str(result), {"result": result}
-            if cursor.returns_rows:
-                result = cursor.fetchall()
-                return str(result), {"result": result}
+        command = self.parser_to_filter_commands(command)
+        QueryStats.increment("executed")
+        if not timeout:
+            with self._engine.connect() as connection:
+                return self.fetch_results(connection, command, top_k)
+
+        running = {}
+
+        def execute():
+            try:
+                with self._engine.connect() as connection:
+                    running["connection"] = connection
+                    running["result"] = self.fetch_results(connection, command, top_k)
+            except Exception as e:
+                running["error"] = e
+
+        thread = threading.Thread(target=execute, daemon=True)
+        thread.start()
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            QueryStats.increment("timed_out")
+            self.cancel(running.get("connection"))
+            thread.join(timeout=CANCEL_GRACE_PERIOD)
+            raise TimeoutError("The query execution exceeded the timeout")
+        if "error" in running:
+            raise running["error"]
+        return running["result"]
+
+    def stream_sql(
+        self, command: str, chunk_size: int = 10_000, timeout: int | None = None
+    ) -> tuple[list[str], Iterator[list]]:
+        """Executes the query with a server side cursor where the driver has one and returns
+        its columns and an iterator of row chunks, so the rows are never all in memory.
+
+        The query runs before returning so its errors are raised here. Like in `run_sql`
+        it is cancelled and TimeoutError is raised if it doesn't start returning rows
+        within `timeout` seconds, reading the chunks is left to the statement timeout so
+        slow clients are not cut off. The connection is opened inside the iterator, which
+        is already started, so it is closed once the iterator is exhausted, closed or
+        garbage collected."""
+        columns, _, rows = self.stream_rows(command, chunk_size, timeout)
+        return columns, rows
+
+    def stream_rows(
+        self, command: str, chunk_size: int, timeout: int | None = None
+    ) -> tuple[list[str], list[tuple], Iterator[list]]:
+        """Like `stream_sql` but also returns the DB-API description of the columns"""
+        command = self.parser_to_filter_commands(command)
+        QueryStats.increment("executed")
+
+        def chunks():
+            connection = self._engine.connect().execution_options(stream_results=True)
+            try:
+                with self.query_deadline(connection, timeout):
+                    cursor = connection.execute(text(command))
+                if not cursor.returns_rows:
+                    yield [], []
+                    return
+                yield list(cursor.keys()), list(cursor.cursor.description or [])
+                yield from cursor.partitions(chunk_size)
+            finally:
+                connection.close()
+
+        rows = chunks()
+        columns, description = next(rows)
+        if not columns:
+            rows.close()
+            return [], [], iter(())
+        return columns, description, rows
+
+    def stream_arrow(
+        self, command: str, chunk_size: int = 10_000, timeout: int | None = None
+    ) -> tuple[list[str], Iterator[pa.RecordBatch]]:
+        """Like `stream_sql` but returns Arrow record batches, fetched natively from
+        Snowflake, DuckDB and BigQuery (storage API) and converted from the rows for the
+        other dialects."""
+        command = self.parser_to_filter_commands(command)
+        if self.dialect in ARROW_DIALECTS:
+            try:
+                return self.fetch_arrow_batches(command, chunk_size, timeout)
+            except TimeoutError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"Unable to fetch {self.dialect} results as Arrow, converting the rows: {e}"
+                )
+        columns, description, chunks = self.stream_rows(command, chunk_size, timeout)
+        return columns, record_batches(columns, chunks, decimal_types(description))
+
+    def fetch_arrow_batches(
+        self, command: str, chunk_size: int, timeout: int | None = None
+    ) -> tuple[list[str], Iterator[pa.RecordBatch]]:
+        QueryStats.increment("executed")
+
+        def batches():
+            connection = self._engine.raw_connection()
+            try:
+                with self.query_deadline(connection, timeout):
+                    if self.dialect == "bigquery":
+                        rows = connection._client.query_and_wait(
+                            command, page_size=chunk_size
+                        )
+                    else:
+                        cursor = connection.cursor()
+                        connection.info[CURSOR_INFO_KEY] = cursor
+                        cursor.execute(command)
+                if self.dialect == "bigquery":
+                    yield [field.name for field in rows.schema]
+                    yield from rows.to_arrow_iterable(
+                        bqstorage_client=connection._bqstorage_client
+                    )
+                    return
+                yield [description[0] for description in cursor.description]
+                if self.dialect == "snowflake":
+                    for table in cursor.fetch_arrow_batches():
+                        yield from table.to_batches(chunk_size)
+                else:
+                    yield from cursor.fetch_record_batch(chunk_size)
+            finally:
+                connection.close()
+
+        iterator = batches()
+        return next(iterator), iterator
+
+    @staticmethod
+    def fetch_results(connection, command: str, top_k: int = None) -> tuple[str, dict]:
+        cursor = connection.execute(text(command))
+        if cursor.returns_rows and top_k:
+            result = cursor.fetchmany(top_k)
+            return str(result), {"result": result, "columns": list(cursor.keys())}
+        if cursor.returns_rows:
+            result = cursor.fetchall()
+            return str(result), {"result": result, "columns": list(cursor.keys())}
         return "", {}
 
+    @contextmanager
+    def query_deadline(self, connection, timeout: int | None) -> Iterator[None]:
+        """Cancels the query the block runs on the connection once it takes more than
+        `timeout` seconds, its error is then raised as TimeoutError"""
+        if not timeout:
+            yield
+            return
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            QueryStats.increment("timed_out")
+            self.cancel(connection)
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        except Exception as e:
+            if expired.is_set():
+                raise TimeoutError("The query execution exceeded the timeout") from e
+            raise
+        finally:
+            timer.cancel()
+
+    def cancel(self, connection) -> None:
+        """Cancels the query running on the connection, the warehouse statement timeout is
+        left to stop it if the dialect can't be cancelled from here. The connection is a
+        Connection or the pooled connection returned by raw_connection()."""
+        if connection is None:
+            QueryStats.increment("cancel_failed")
+            return
+        if isinstance(connection, Connection):
+            connection = connection.connection
+        try:
+            if cancel_query(
+                self.dialect,
+                connection.connection,
+                connection.info.get(CURSOR_INFO_KEY),
+            ):
+                QueryStats.increment("cancelled")
+                logger.info(f"Cancelled {self.dialect} query after the timeout")
+                return
+        except Exception as e:
+            logger.warning(f"Unable to cancel the {self.dialect} query: {e}")
+        QueryStats.increment("cancel_failed")
+
+    def cached_inspection(self, method: str, *args, **kwargs) -> Any:
+        """Calls the SQLAlchemy inspector method, results are kept for INSPECTION_CACHE_TTL
+        seconds. Since engines are pooled per db connection the cache is too."""
+        key = (method, args, tuple(sorted(kwargs.items())))
+        with self._inspection_lock:
+            cached = self._inspection_cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+        result = getattr(inspect(self._engine), method)(*args, **kwargs)
+        with self._inspection_lock:
+            self._inspection_cache[key] = (
+                time.monotonic() + self.inspection_cache_ttl,
+                result,
+            )
+        return result
+
+    def clear_inspection_cache(self) -> None:
+        with self._inspection_lock:
+            self._inspection_cache.clear()
+
     def get_tables_and_views(self) -> List[str]:
-        inspector = inspect(self._engine)
-        meta = MetaData(bind=self._engine)
-        MetaData.reflect(meta, views=True)
-        rows = inspector.get_table_names() + inspector.get_view_names()
+        rows = self.cached_inspection("get_table_names") + self.cached_inspection(
+            "get_view_names"
+        )
         if len(rows) == 0:
             raise EmptyDBError("The db is empty it could be a permission issue")
         return [row.lower() for row in rows]
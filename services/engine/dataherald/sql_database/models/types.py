@@ -102,6 +102,7 @@ class DatabaseConnection(BaseModel):
     ssh_settings: SSHSettings | None = None
     file_storage: FileStorage | None = None
     metadata: dict | None
+    scan_concurrency: int | None = Field(default=None, ge=1)
     created_at: datetime = Field(default_factory=datetime.now)
 
     @classmethod
@@ -0,0 +1,70 @@
+import logging
+from threading import Lock
+
+from google.cloud.bigquery import QueryJobConfig
+
+logger = logging.getLogger(__name__)
+
+CURSOR_INFO_KEY = "dataherald_cursor"
+
+
+def set_session_timeout(dialect: str, dbapi_connection, timeout: int) -> None:
+    """Sets the server side statement timeout (in seconds) of a new DBAPI connection, so
+    queries that outlive the client are stopped by the warehouse itself."""
+    if dialect in ("postgresql", "redshift"):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {timeout * 1000}")
+        cursor.close()
+        # SET is rolled back with the transaction when the connection returns to the pool
+        dbapi_connection.commit()
+    elif dialect == "snowflake":
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {timeout}")
+        cursor.close()
+    elif dialect == "mysql":
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET SESSION max_execution_time = {timeout * 1000}")
+        cursor.close()
+    elif dialect == "bigquery":
+        client = dbapi_connection._client
+        job_config = client.default_query_job_config or QueryJobConfig()
+        job_config.job_timeout_ms = timeout * 1000
+        client.default_query_job_config = job_config
+    elif dialect == "mssql":
+        # pyodbc applies it to every statement of the connection
+        dbapi_connection.timeout = timeout
+
+
+def cancel_query(dialect: str, dbapi_connection, cursor) -> bool:
+    """Asks the warehouse to stop the query running on the connection, returns False if the
+    dialect has no way to do it. BigQuery jobs are stopped by their job timeout."""
+    if dialect in ("postgresql", "redshift"):
+        dbapi_connection.cancel()
+        return True
+    if dialect == "snowflake" and cursor is not None and cursor.sfqid:
+        cursor.abort_query(cursor.sfqid)
+        return True
+    if dialect == "mssql" and cursor is not None:
+        cursor.cancel()
+        return True
+    if dialect == "sqlite":
+        dbapi_connection.interrupt()
+        return True
+    return False
+
+
+class QueryStats:
+    """Process wide counters of the executed, timed out and cancelled queries."""
+
+    counters = {"executed": 0, "timed_out": 0, "cancelled": 0, "cancel_failed": 0}
+    _lock = Lock()
+
+    @staticmethod
+    def increment(counter: str) -> None:
+        with QueryStats._lock:
+            QueryStats.counters[counter] += 1
+
+    @staticmethod
+    def stats() -> dict:
+        with QueryStats._lock:
+            return dict(QueryStats.counters)
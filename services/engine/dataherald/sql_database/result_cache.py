@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock, RLock
+from typing import Any
+
+import sqlparse
+from pydantic import BaseModel
+
+from dataherald.repositories.cache_invalidations import CacheInvalidationRepository
+from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
+
+# Functions whose result changes between executions of the same query
+NONDETERMINISTIC_SQL = re.compile(
+    r"\b(current_date|current_time|current_timestamp|localtime|localtimestamp|now|"
+    r"getdate|sysdate|systimestamp|today|random|rand|newid|uuid)\b",
+    re.IGNORECASE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResult(BaseModel):
+    result: str
+    size: int
+    expires_at: float
+    # Wall clock time, compared with the invalidations recorded by other processes
+    created_at: float
+
+
+class SQLResultCacheStats:
+    """Hits and misses of the SQL result cache during one generation"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class SQLResultCache:
+    """Process local results of the queries the agents run, keyed by db connection and
+    SQL fingerprint, so exploratory queries repeated across questions run once.
+    Invalidations are also recorded in the cache_invalidations collection, every
+    generation drops the results its process cached before the last one.
+
+    It is disabled unless SQL_RESULT_CACHE_TTL is set. Only single SELECT statements
+    without time or random functions are stored. Results expire after
+    SQL_RESULT_CACHE_TTL seconds and the least recently used ones of a db connection
+    are evicted past SQL_RESULT_CACHE_MAX_BYTES.
+    """
+
+    ttl = int(os.getenv("SQL_RESULT_CACHE_TTL", "0"))
+    max_bytes = int(os.getenv("SQL_RESULT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+    connections: dict = {}
+    _lock = RLock()
+
+    @staticmethod
+    def enabled() -> bool:
+        return SQLResultCache.ttl > 0
+
+    @staticmethod
+    def cacheable(command: str) -> bool:
+        try:
+            SQLDatabase.parser_to_filter_commands(command)
+        except SQLInjectionError:
+            return False
+        statements = [
+            statement
+            for statement in sqlparse.parse(
+                command.replace("```sql", "").replace("```", "")
+            )
+            if str(statement).strip()
+        ]
+        return (
+            len(statements) == 1
+            and statements[0].get_type() == "SELECT"
+            and NONDETERMINISTIC_SQL.search(command) is None
+        )
+
+    @staticmethod
+    def fingerprint(command: str, top_k: int | None) -> str:
+        return hashlib.sha256(
+            f"{top_k}:{SQLDatabase.fingerprint_sql(command)}".encode()
+        ).hexdigest()
+
+    @staticmethod
+    def get(db_connection_id: str, fingerprint: str) -> str | None:
+        with SQLResultCache._lock:
+            results = SQLResultCache.connections.get(str(db_connection_id))
+            if results is None:
+                return None
+            cached = results.get(fingerprint)
+            if cached is None or cached.expires_at < time.monotonic():
+                return None
+            results.move_to_end(fingerprint)
+            return cached.result
+
+    @staticmethod
+    def add(db_connection_id: str, fingerprint: str, result: str) -> None:
+        size = sys.getsizeof(result)
+        if size > SQLResultCache.max_bytes:
+            return
+        with SQLResultCache._lock:
+            results = SQLResultCache.connections.setdefault(
+                str(db_connection_id), OrderedDict()
+            )
+            results.pop(fingerprint, None)
+            results[fingerprint] = CachedResult(
+                result=result,
+                size=size,
+                expires_at=time.monotonic() + SQLResultCache.ttl,
+                created_at=time.time(),
+            )
+            SQLResultCache.evict(results)
+
+    @staticmethod
+    def evict(results: OrderedDict) -> None:
+        now = time.monotonic()
+        for key in [key for key, cached in results.items() if cached.expires_at < now]:
+            del results[key]
+        total = sum(cached.size for cached in results.values())
+        while total > SQLResultCache.max_bytes:
+            _, cached = results.popitem(last=False)
+            total -= cached.size
+
+    @staticmethod
+    def invalidate(db_connection_id: str, storage: Any | None = None) -> None:
+        """Drops the results of the db connection, with `storage` the other processes
+        drop theirs on their next generation"""
+        if storage is not None:
+            try:
+                CacheInvalidationRepository(storage).invalidate(db_connection_id)
+            except Exception as e:
+                logger.warning(
+                    f"SQL result cache could not store the invalidation: {e}"
+                )
+        with SQLResultCache._lock:
+            SQLResultCache.connections.pop(str(db_connection_id), None)
+
+    @staticmethod
+    def remove_invalidated(db_connection_id: str, storage: Any) -> None:
+        """Drops the results of the db connection cached before its last invalidation"""
+        if not SQLResultCache.enabled() or not db_connection_id:
+            return
+        with SQLResultCache._lock:
+            if not SQLResultCache.connections.get(str(db_connection_id)):
+                return
+        try:
+            invalidated_at = CacheInvalidationRepository(storage).invalidated_at(
+                db_connection_id
+            )
+        except Exception as e:
+            logger.warning(f"SQL result cache could not load the invalidations: {e}")
+            return
+        if invalidated_at is None:
+            return
+        with SQLResultCache._lock:
+            results = SQLResultCache.connections.get(str(db_connection_id), {})
+            for key in [
+                key
+                for key, cached in results.items()
+                if cached.created_at < invalidated_at
+            ]:
+                del results[key]
+
+    @staticmethod
+    def run_sql(
+        database: SQLDatabase,
+        db_connection_id: str | None,
+        command: str,
+        *,
+        top_k: int | None = None,
+        timeout: int | None = None,
+        stats: SQLResultCacheStats | None = None,
+    ) -> str:
+        """Returns the stored result of the query if there is one, otherwise runs it with
+        SQLDatabase.run_sql and stores its result when the query can be cached."""
+        if (
+            not SQLResultCache.enabled()
+            or not db_connection_id
+            or not SQLResultCache.cacheable(command)
+        ):
+            return database.run_sql(command, top_k=top_k, timeout=timeout)[0]
+        fingerprint = SQLResultCache.fingerprint(command, top_k)
+        result = SQLResultCache.get(db_connection_id, fingerprint)
+        if stats is not None:
+            stats.record(result is not None)
+        if result is not None:
+            logger.info(f"Using the cached result of a query on {db_connection_id}")
+            return result
+        result = database.run_sql(command, top_k=top_k, timeout=timeout)[0]
+        SQLResultCache.add(db_connection_id, fingerprint, result)
+        return result
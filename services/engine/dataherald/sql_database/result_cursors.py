@@ -0,0 +1,216 @@
+import base64
+import binascii
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from threading import Lock, Thread
+from typing import Iterator
+
+from pydantic import BaseModel, ValidationError
+
+from dataherald.sql_database.base import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidContinuationTokenError(Exception):
+    pass
+
+
+class ContinuationToken(BaseModel):
+    """Opaque token returned with a page of results, it points to the next row of the
+    query and to the cursor that is reading it."""
+
+    sql_generation_id: str
+    offset: int
+    cursor_id: str | None = None
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.json().encode("utf-8")).decode("ascii")
+
+    @classmethod
+    def decode(cls, token: str) -> "ContinuationToken":
+        try:
+            return cls(**json.loads(base64.urlsafe_b64decode(token.encode("ascii"))))
+        except (
+            binascii.Error,
+            UnicodeError,
+            ValueError,
+            TypeError,
+            ValidationError,
+        ) as e:
+            raise InvalidContinuationTokenError(
+                f"Invalid continuation token {token}"
+            ) from e
+
+
+class ResultCursor:
+    """Reads the rows of a query from a server side cursor one page at a time. It keeps
+    one row ahead to know if there is a next page."""
+
+    def __init__(
+        self, sql: str, columns: list[str], chunks: Iterator[list], engine=None
+    ):
+        self.sql = sql
+        self.engine = engine
+        self.columns = columns
+        self.chunks = chunks
+        self.buffer = []
+        self.position = 0
+        self.exhausted = False
+        self.expires_at = time.monotonic() + ResultCursors.ttl
+        self.lock = Lock()
+
+    def fill(self, count: int) -> None:
+        while len(self.buffer) < count and not self.exhausted:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+            else:
+                self.buffer.extend(tuple(row) for row in chunk)
+
+    def fetch(self, page_size: int) -> tuple[list[tuple], bool]:
+        """Returns the next `page_size` rows and whether more rows follow them"""
+        with self.lock:
+            self.fill(page_size + 1)
+            rows, self.buffer = self.buffer[:page_size], self.buffer[page_size:]
+            self.position += len(rows)
+            self.expires_at = time.monotonic() + ResultCursors.ttl
+            return rows, bool(self.buffer)
+
+    def skip(self, count: int) -> None:
+        while count > 0:
+            rows, has_more = self.fetch(min(count, 10_000))
+            count -= len(rows)
+            if not has_more:
+                return
+
+    def close(self) -> None:
+        with self.lock:
+            self.chunks.close()
+
+
+class ResultCursors:
+    """Open server side cursors of the paginated executions, keyed by an id that is
+    carried in the continuation token.
+
+    Each cursor holds a database connection, so cursors are closed once their last page
+    is read, after RESULT_CURSOR_TTL idle seconds, or when more than RESULT_CURSOR_MAX are
+    open, the least recently used first. The cursors of one engine are also kept below
+    RESULT_CURSOR_MAX_PER_ENGINE and below its pool size, so the other queries of the
+    db connection still get a connection. A daemon thread closes the idle cursors
+    without waiting for the next page request.
+    """
+
+    ttl = int(os.getenv("RESULT_CURSOR_TTL", "300"))
+    max_cursors = int(os.getenv("RESULT_CURSOR_MAX", "20"))
+    max_per_engine = int(os.getenv("RESULT_CURSOR_MAX_PER_ENGINE", "4"))
+    cursors: OrderedDict = OrderedDict()
+    _lock = Lock()
+    _reaper: Thread | None = None
+
+    @staticmethod
+    def open(
+        database: SQLDatabase,
+        sql: str,
+        chunk_size: int = 1_000,
+        timeout: int | None = None,
+    ) -> tuple[str, ResultCursor]:
+        ResultCursors.start_reaper()
+        limit = ResultCursors.engine_limit(database.engine)
+        with ResultCursors._lock:
+            engine_cursors = [
+                cursor_id
+                for cursor_id, cursor in ResultCursors.cursors.items()
+                if cursor.engine is database.engine
+            ]
+            evicted = [
+                ResultCursors.cursors.pop(cursor_id)
+                for cursor_id in engine_cursors[
+                    : max(len(engine_cursors) - limit + 1, 0)
+                ]
+            ]
+        ResultCursors.close_all(evicted)
+        columns, chunks = database.stream_sql(sql, chunk_size, timeout)
+        cursor_id = str(uuid.uuid4())
+        cursor = ResultCursor(sql, columns, chunks, database.engine)
+        with ResultCursors._lock:
+            ResultCursors.cursors[cursor_id] = cursor
+        ResultCursors.evict()
+        return cursor_id, cursor
+
+    @staticmethod
+    def engine_limit(engine) -> int:
+        limit = ResultCursors.max_per_engine
+        pool_size = getattr(engine.pool, "size", None)
+        if callable(pool_size):
+            limit = min(limit, pool_size() - 1)
+        return max(limit, 1)
+
+    @staticmethod
+    def get(cursor_id: str | None, sql: str) -> ResultCursor | None:
+        if not cursor_id:
+            return None
+        ResultCursors.evict()
+        with ResultCursors._lock:
+            cursor = ResultCursors.cursors.get(cursor_id)
+            if cursor is None or cursor.sql != sql:
+                return None
+            ResultCursors.cursors.move_to_end(cursor_id)
+            return cursor
+
+    @staticmethod
+    def close(cursor_id: str | None) -> None:
+        with ResultCursors._lock:
+            cursor = ResultCursors.cursors.pop(cursor_id, None)
+        if cursor is not None:
+            cursor.close()
+
+    @staticmethod
+    def close_all(cursors: list[ResultCursor]) -> None:
+        for cursor in cursors:
+            try:
+                cursor.close()
+            except Exception as e:
+                logger.warning(f"Unable to close a result cursor: {e}")
+
+    @staticmethod
+    def evict() -> None:
+        """Closes the expired cursors and the least recently used ones past
+        RESULT_CURSOR_MAX. They are closed outside the lock, closing a cursor waits for
+        the page it is reading."""
+        now = time.monotonic()
+        with ResultCursors._lock:
+            evicted = [
+                ResultCursors.cursors.pop(cursor_id)
+                for cursor_id, cursor in list(ResultCursors.cursors.items())
+                if cursor.expires_at < now
+            ]
+            while len(ResultCursors.cursors) > ResultCursors.max_cursors:
+                cursor_id, cursor = ResultCursors.cursors.popitem(last=False)
+                logger.info(
+                    f"Closing the least recently used result cursor {cursor_id}"
+                )
+                evicted.append(cursor)
+        ResultCursors.close_all(evicted)
+
+    @staticmethod
+    def start_reaper() -> None:
+        with ResultCursors._lock:
+            if ResultCursors._reaper is not None:
+                return
+            ResultCursors._reaper = Thread(
+                target=ResultCursors.run_reaper,
+                name="result-cursor-reaper",
+                daemon=True,
+            )
+            ResultCursors._reaper.start()
+
+    @staticmethod
+    def run_reaper() -> None:
+        while True:
+            time.sleep(max(min(ResultCursors.ttl, 60), 1))
+            ResultCursors.evict()
@@ -0,0 +1,164 @@
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Iterator
+
+from pydantic import BaseModel
+
+from dataherald.sql_database.base import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class ResultSnapshot(BaseModel):
+    """Rows of a query stored by column, `complete` is False when the query returned more
+    rows than were fetched."""
+
+    sql: str
+    columns: list[str]
+    data: list[tuple]
+    complete: bool
+    size: int
+    expires_at: float
+
+    @property
+    def row_count(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def covers(self, sql: str, max_rows: int | None) -> bool:
+        if self.sql != sql or self.expires_at < time.monotonic():
+            return False
+        return self.complete or (max_rows is not None and self.row_count >= max_rows)
+
+    def chunks(self, chunk_size: int) -> Iterator[list[tuple]]:
+        for start in range(0, self.row_count, chunk_size):
+            yield list(
+                zip(
+                    *[values[start : start + chunk_size] for values in self.data],
+                    strict=True,
+                )
+            )
+
+    def rows(self, max_rows: int | None = None, offset: int = 0) -> list[tuple]:
+        end = (
+            self.row_count
+            if max_rows is None
+            else min(offset + max_rows, self.row_count)
+        )
+        return list(zip(*[values[offset:end] for values in self.data], strict=True))
+
+    def records(self, max_rows: int | None = None) -> list[dict]:
+        count = self.row_count if max_rows is None else min(max_rows, self.row_count)
+        return [
+            {
+                column: values[index]
+                for column, values in zip(self.columns, self.data, strict=True)
+            }
+            for index in range(count)
+        ]
+
+
+class ResultSnapshots:
+    """Process local results of the generated queries keyed by sql_generation_id.
+
+    The first execution of a generation is stored so executing it, answering it in natural
+    language, evaluating it and exporting it run the query once. Snapshots expire after
+    RESULT_SNAPSHOT_TTL seconds and the least recently used ones are evicted past
+    RESULT_SNAPSHOT_MAX_BYTES.
+    """
+
+    ttl = int(os.getenv("RESULT_SNAPSHOT_TTL", "600"))
+    max_bytes = int(os.getenv("RESULT_SNAPSHOT_MAX_BYTES", str(256 * 1024 * 1024)))
+    snapshots: OrderedDict = OrderedDict()
+    _lock = RLock()
+
+    @staticmethod
+    def estimate_size(data: list[tuple]) -> int:
+        return sum(
+            sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+            for column in data
+        )
+
+    @staticmethod
+    def get(
+        sql_generation_id: str | None, sql: str, max_rows: int | None = None
+    ) -> ResultSnapshot | None:
+        if not sql_generation_id:
+            return None
+        with ResultSnapshots._lock:
+            snapshot = ResultSnapshots.snapshots.get(sql_generation_id)
+            if snapshot is None or not snapshot.covers(sql, max_rows):
+                return None
+            ResultSnapshots.snapshots.move_to_end(sql_generation_id)
+            return snapshot
+
+    @staticmethod
+    def add(sql_generation_id: str | None, snapshot: ResultSnapshot) -> None:
+        if not sql_generation_id or snapshot.size > ResultSnapshots.max_bytes:
+            return
+        with ResultSnapshots._lock:
+            ResultSnapshots.snapshots.pop(sql_generation_id, None)
+            ResultSnapshots.snapshots[sql_generation_id] = snapshot
+            ResultSnapshots.evict()
+
+    @staticmethod
+    def evict() -> None:
+        now = time.monotonic()
+        with ResultSnapshots._lock:
+            for key in [
+                key
+                for key, snapshot in ResultSnapshots.snapshots.items()
+                if snapshot.expires_at < now
+            ]:
+                del ResultSnapshots.snapshots[key]
+            total = sum(
+                snapshot.size for snapshot in ResultSnapshots.snapshots.values()
+            )
+            while total > ResultSnapshots.max_bytes:
+                _, snapshot = ResultSnapshots.snapshots.popitem(last=False)
+                total -= snapshot.size
+
+    @staticmethod
+    def remove(sql_generation_id: str) -> None:
+        with ResultSnapshots._lock:
+            ResultSnapshots.snapshots.pop(sql_generation_id, None)
+
+    @staticmethod
+    def fetch(
+        database: SQLDatabase,
+        sql_generation_id: str | None,
+        sql: str,
+        max_rows: int | None = None,
+        timeout: int | None = None,
+    ) -> ResultSnapshot:
+        """Returns the stored rows of the generation if they cover `max_rows` (all the rows
+        when it is None), otherwise runs the query, cancelled after `timeout` seconds, and
+        stores its rows."""
+        snapshot = ResultSnapshots.get(sql_generation_id, sql, max_rows)
+        if snapshot is not None:
+            logger.info(
+                f"Using the result snapshot of sql generation {sql_generation_id}"
+            )
+            return snapshot
+        # One extra row tells whether the query returned more rows than max_rows
+        _, result = database.run_sql(
+            sql, None if max_rows is None else max_rows + 1, timeout=timeout
+        )
+        rows = result.get("result", [])
+        complete = max_rows is None or len(rows) <= max_rows
+        rows = rows if complete else rows[:max_rows]
+        columns = result.get("columns", [])
+        data = list(zip(*rows, strict=True)) if rows else [() for _ in columns]
+        snapshot = ResultSnapshot(
+            sql=sql,
+            columns=columns,
+            data=data,
+            complete=complete,
+            size=ResultSnapshots.estimate_size(data),
+            expires_at=time.monotonic() + ResultSnapshots.ttl,
+        )
+        ResultSnapshots.add(sql_generation_id, snapshot)
+        return snapshot
@@ -34,31 +34,35 @@ class DatabaseConnectionService:
                     database_connection.dialect.value,
                 )
             )
-        return SQLDatabase.get_sql_engine(database_connection, True)
+        return SQLDatabase.get_sql_engine(database_connection, schema=schema)
 
     def get_current_schema(
         self, database_connection: DatabaseConnection
     ) -> list[str] | None:
-        sql_database = SQLDatabase.get_sql_engine(database_connection, True)
-        inspector = inspect(sql_database.engine)
-        if inspector.default_schema_name and database_connection.dialect not in [
-            "mssql",
-            "mysql",
-            "clickhouse",
-            "duckdb",
-        ]:
-            return [inspector.default_schema_name]
-        if database_connection.dialect == "bigquery":
-            pattern = r"([^:/]+)://([^/]+)/([^/]+)(\?[^/]+)"
-            match = re.match(pattern, str(sql_database.engine.url))
-            if match:
-                return [match.group(3)]
-        elif database_connection.dialect == "databricks":
-            pattern = r"&schema=([^&]*)"
-            match = re.search(pattern, str(sql_database.engine.url))
-            if match:
-                return [match.group(1)]
-        return None
+        sql_database = SQLDatabase.get_sql_engine(database_connection)
+        try:
+            inspector = inspect(sql_database.engine)
+            if inspector.default_schema_name and database_connection.dialect not in [
+                "mssql",
+                "mysql",
+                "clickhouse",
+                "duckdb",
+            ]:
+                return [inspector.default_schema_name]
+            if database_connection.dialect == "bigquery":
+                pattern = r"([^:/]+)://([^/]+)/([^/]+)(\?[^/]+)"
+                match = re.match(pattern, str(sql_database.engine.url))
+                if match:
+                    return [match.group(3)]
+            elif database_connection.dialect == "databricks":
+                pattern = r"&schema=([^&]*)"
+                match = re.search(pattern, str(sql_database.engine.url))
+                if match:
+                    return [match.group(1)]
+            return None
+        finally:
+            if not database_connection.id:
+                sql_database.dispose()
 
     def remove_schema_in_uri(self, connection_uri: str, dialect: str) -> str:
         if dialect in ["snowflake"]:
@@ -89,6 +93,18 @@ class DatabaseConnectionService:
             return f"{connection_uri}?options=-csearch_path={schema}"
         return connection_uri
 
+    @staticmethod
+    def get_unsaved_tables(
+        database_connection: DatabaseConnection, schema: str | None = None
+    ) -> list[str]:
+        """Lists the tables of a connection that is not stored yet. Its engine is not
+        pooled, so it is disposed once the tables are listed."""
+        sql_database = SQLDatabase.get_sql_engine(database_connection, schema=schema)
+        try:
+            return sql_database.get_tables_and_views()
+        finally:
+            sql_database.dispose()
+
     def create(
         self, database_connection_request: DatabaseConnectionRequest
     ) -> DatabaseConnection:
@@ -102,6 +118,7 @@ class DatabaseConnectionService:
             ssh_settings=database_connection_request.ssh_settings,
             file_storage=database_connection_request.file_storage,
             metadata=database_connection_request.metadata,
+            scan_concurrency=database_connection_request.scan_concurrency,
         )
         if database_connection.schemas and database_connection.dialect in [
             "redshift",
@@ -130,11 +147,11 @@ class DatabaseConnectionService:
                         str(database_connection.dialect),
                     )
                 )
-                sql_database = SQLDatabase.get_sql_engine(database_connection, True)
-                schemas_and_tables[schema] = sql_database.get_tables_and_views()
+                schemas_and_tables[schema] = self.get_unsaved_tables(
+                    database_connection, schema
+                )
         else:
-            sql_database = SQLDatabase.get_sql_engine(database_connection, True)
-            schemas_and_tables[None] = sql_database.get_tables_and_views()
+            schemas_and_tables[None] = self.get_unsaved_tables(database_connection)
 
         # Connect db
         db_connection_repository = DatabaseConnectionRepository(self.storage)
@@ -0,0 +1,258 @@
+import logging
+import os
+import time
+from threading import RLock, Thread
+
+from sshtunnel import SSHTunnelForwarder
+
+from dataherald.utils.s3 import S3
+
+logger = logging.getLogger(__name__)
+
+
+class SSHTunnelManager:
+    """Shares one SSHTunnelForwarder per (ssh host, ssh port, ssh user, remote host, remote port).
+
+    Engines acquire a tunnel and release it when they are disposed, their checked out
+    connections hold a reference of their own so a disposed engine that is still running a
+    query keeps its tunnel. Tunnels keep the ssh session alive every SSH_TUNNEL_KEEPALIVE
+    seconds, are checked every SSH_TUNNEL_HEALTH_CHECK_INTERVAL seconds and restarted on
+    the same local port when they go down, and are closed once nobody used them for
+    SSH_TUNNEL_IDLE_TIMEOUT seconds.
+    """
+
+    keepalive = float(os.getenv("SSH_TUNNEL_KEEPALIVE", "30"))
+    idle_timeout = int(os.getenv("SSH_TUNNEL_IDLE_TIMEOUT", "300"))
+    health_check_interval = float(os.getenv("SSH_TUNNEL_HEALTH_CHECK_INTERVAL", "60"))
+    tunnels: dict = {}
+    private_keys: dict = {}
+    counters = {"reconnects": 0, "failed_health_checks": 0}
+    # _lock only guards the dicts, the ssh handshakes run under the lock of their tunnel
+    # so a slow bastion host does not block the other tunnels. The key locks are kept
+    # when a tunnel closes, a new lock would let two threads start the same tunnel
+    _lock = RLock()
+    _key_locks: dict = {}
+    _health_checker: Thread | None = None
+
+    @staticmethod
+    def tunnel_key(
+        ssh_host: str,
+        ssh_port: int,
+        ssh_username: str,
+        remote_host: str,
+        remote_port: int,
+    ) -> tuple:
+        return (ssh_host, ssh_port, ssh_username, remote_host, remote_port)
+
+    @staticmethod
+    def key_lock(key) -> RLock:
+        with SSHTunnelManager._lock:
+            return SSHTunnelManager._key_locks.setdefault(key, RLock())
+
+    @staticmethod
+    def private_key_file(path: str | None) -> str | None:
+        """Returns a local copy of the private key, keys stored in S3 are downloaded once."""
+        if not path or not path.lower().startswith("s3"):
+            return path
+        with SSHTunnelManager.key_lock(path):
+            file_location = SSHTunnelManager.private_keys.get(path)
+            if file_location is None or not os.path.exists(file_location):
+                file_location = S3().download(path)
+                SSHTunnelManager.private_keys[path] = file_location
+            return file_location
+
+    @staticmethod
+    def start_server(
+        key: tuple, credentials: dict, local_bind_address: tuple | None = None
+    ) -> SSHTunnelForwarder:
+        ssh_host, ssh_port, ssh_username, remote_host, remote_port = key
+        options = (
+            {"local_bind_address": local_bind_address} if local_bind_address else {}
+        )
+        server = SSHTunnelForwarder(
+            (ssh_host, ssh_port),
+            ssh_username=ssh_username,
+            ssh_password=credentials["ssh_password"],
+            ssh_pkey=SSHTunnelManager.private_key_file(credentials["ssh_pkey"]),
+            ssh_private_key_password=credentials["ssh_private_key_password"],
+            remote_bind_address=(remote_host, remote_port),
+            set_keepalive=SSHTunnelManager.keepalive,
+            **options,
+        )
+        server.start()
+        return server
+
+    @staticmethod
+    def acquire(
+        key: tuple,
+        ssh_password: str | None = None,
+        ssh_pkey: str | None = None,
+        ssh_private_key_password: str | None = None,
+    ) -> tuple[str, int]:
+        """Returns the local (host, port) of the tunnel, starting it if there is none."""
+        SSHTunnelManager.close_idle()
+        SSHTunnelManager.start_health_checks()
+        with SSHTunnelManager.key_lock(key):
+            entry = SSHTunnelManager.tunnels.get(key)
+            if entry is None:
+                credentials = {
+                    "ssh_password": ssh_password,
+                    "ssh_pkey": ssh_pkey,
+                    "ssh_private_key_password": ssh_private_key_password,
+                }
+                server = SSHTunnelManager.start_server(key, credentials)
+                logger.info(
+                    f"Started SSH tunnel {key} on port {server.local_bind_port}"
+                )
+                entry = {
+                    "server": server,
+                    "credentials": credentials,
+                    "local_bind_address": (
+                        str(server.local_bind_host),
+                        server.local_bind_port,
+                    ),
+                    "refs": 0,
+                    "connections": 0,
+                    "last_used": time.monotonic(),
+                }
+                with SSHTunnelManager._lock:
+                    SSHTunnelManager.tunnels[key] = entry
+            else:
+                SSHTunnelManager.ensure_active(key)
+            with SSHTunnelManager._lock:
+                entry["refs"] += 1
+                entry["last_used"] = time.monotonic()
+            return entry["local_bind_address"]
+
+    @staticmethod
+    def release(key: tuple) -> None:
+        with SSHTunnelManager._lock:
+            entry = SSHTunnelManager.tunnels.get(key)
+            if entry is not None:
+                entry["refs"] = max(entry["refs"] - 1, 0)
+                entry["last_used"] = time.monotonic()
+        SSHTunnelManager.close_idle()
+
+    @staticmethod
+    def checkout(key: tuple) -> None:
+        """Counts a connection checked out from an engine using the tunnel."""
+        with SSHTunnelManager._lock:
+            entry = SSHTunnelManager.tunnels.get(key)
+            if entry is not None:
+                entry["connections"] += 1
+                entry["last_used"] = time.monotonic()
+
+    @staticmethod
+    def checkin(key: tuple) -> None:
+        with SSHTunnelManager._lock:
+            entry = SSHTunnelManager.tunnels.get(key)
+            if entry is not None:
+                entry["connections"] = max(entry["connections"] - 1, 0)
+                entry["last_used"] = time.monotonic()
+
+    @staticmethod
+    def ensure_active(key: tuple) -> None:
+        """Restarts the tunnel on its previous local port if the ssh session or the
+        forwarding went down."""
+        with SSHTunnelManager.key_lock(key):
+            entry = SSHTunnelManager.tunnels.get(key)
+            if entry is None:
+                return
+            server = entry["server"]
+            server.check_tunnels()
+            if server.is_active and all(server.tunnel_is_up.values()):
+                return
+            logger.warning(f"SSH tunnel {key} is down, reconnecting")
+            server.stop(force=True)
+            entry["server"] = SSHTunnelManager.start_server(
+                key, entry["credentials"], entry["local_bind_address"]
+            )
+            with SSHTunnelManager._lock:
+                SSHTunnelManager.counters["reconnects"] += 1
+
+    @staticmethod
+    def start_health_checks() -> None:
+        if SSHTunnelManager.health_check_interval <= 0:
+            return
+        with SSHTunnelManager._lock:
+            if SSHTunnelManager._health_checker is not None:
+                return
+            SSHTunnelManager._health_checker = Thread(
+                target=SSHTunnelManager.run_health_checks,
+                name="ssh-tunnel-health-checks",
+                daemon=True,
+            )
+            SSHTunnelManager._health_checker.start()
+
+    @staticmethod
+    def run_health_checks() -> None:
+        while True:
+            time.sleep(SSHTunnelManager.health_check_interval)
+            SSHTunnelManager.check_tunnels()
+
+    @staticmethod
+    def check_tunnels() -> None:
+        """Closes the idle tunnels and restarts the ones that went down, so they are
+        ready before the next query instead of on its connect."""
+        SSHTunnelManager.close_idle()
+        with SSHTunnelManager._lock:
+            keys = list(SSHTunnelManager.tunnels)
+        for key in keys:
+            try:
+                SSHTunnelManager.ensure_active(key)
+            except Exception as e:
+                with SSHTunnelManager._lock:
+                    SSHTunnelManager.counters["failed_health_checks"] += 1
+                logger.warning(f"Unable to restart SSH tunnel {key}: {e}")
+
+    @staticmethod
+    def close(key: tuple) -> None:
+        with SSHTunnelManager.key_lock(key):
+            with SSHTunnelManager._lock:
+                entry = SSHTunnelManager.tunnels.pop(key, None)
+            if entry is not None:
+                logger.info(f"Closing SSH tunnel {key}")
+                entry["server"].stop(force=True)
+
+    @staticmethod
+    def close_idle() -> None:
+        now = time.monotonic()
+        with SSHTunnelManager._lock:
+            idle_keys = [
+                key
+                for key, entry in SSHTunnelManager.tunnels.items()
+                if entry["refs"] == 0
+                and entry["connections"] == 0
+                and now - entry["last_used"] > SSHTunnelManager.idle_timeout
+            ]
+        for key in idle_keys:
+            with SSHTunnelManager.key_lock(key):
+                with SSHTunnelManager._lock:
+                    entry = SSHTunnelManager.tunnels.get(key)
+                    if (
+                        entry is None
+                        or entry["refs"] > 0
+                        or entry["connections"] > 0
+                        or now - entry["last_used"] <= SSHTunnelManager.idle_timeout
+                    ):
+                        continue
+                SSHTunnelManager.close(key)
+
+    @staticmethod
+    def stats() -> dict:
+        with SSHTunnelManager._lock:
+            return {
+                "tunnels": len(SSHTunnelManager.tunnels),
+                "active_tunnels": sum(
+                    1
+                    for entry in SSHTunnelManager.tunnels.values()
+                    if entry["server"].is_active
+                ),
+                "engines": sum(
+                    entry["refs"] for entry in SSHTunnelManager.tunnels.values()
+                ),
+                "connections": sum(
+                    entry["connections"] for entry in SSHTunnelManager.tunnels.values()
+                ),
+                **SSHTunnelManager.counters,
+            }
@@ -1,12 +1,15 @@
 """Base class that all sql generation classes inherit from."""
 
+import asyncio
+import contextvars
 import datetime
 import logging
 import os
 import re
+import time
 from abc import ABC, abstractmethod
-from queue import Queue
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
 
 import sqlparse
 from langchain.agents.agent import AgentExecutor
@@ -15,17 +18,26 @@ from langchain.schema import AgentAction, LLMResult
 from langchain_community.callbacks import get_openai_callback
 
 from dataherald.config import Component, System
-from dataherald.db_scanner.models.types import TableDescription
+from dataherald.db_scanner.models.types import TableDescription, TableDescriptionStatus
+from dataherald.db_scanner.repository.base import TableDescriptionRepository
 from dataherald.model.chat_model import ChatModel
 from dataherald.repositories.sql_generations import (
     SQLGenerationRepository,
 )
 from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_database.result_cache import SQLResultCache, SQLResultCacheStats
 from dataherald.sql_generator.create_sql_query_status import create_sql_query_status
+from dataherald.sql_generator.tool_memo import ToolMemo
 from dataherald.types import IntermediateStep, LLMConfig, Prompt, SQLGeneration
+from dataherald.utils.schema_budget import SCHEMA_TOKEN_BUDGET, SchemaBudgetStats
+from dataherald.utils.streaming import StreamCancelledError, StreamChannel
 from dataherald.utils.strings import contains_line_breaks
 
+logger = logging.getLogger(__name__)
+# Metadata keys of the tool stats of a generation, added by report_tool_stats
+TOOL_STATS_KEYS = ("sql_result_cache", "schema_budget")
+
 
 class EngineTimeOutORItemLimitError(Exception):
     pass
@@ -40,11 +52,67 @@ def replace_unprocessable_characters(text: str) -> str:
 class SQLGenerator(Component, ABC):
     metadata: Any
     llm: ChatModel | None = None
+    # Shared by the setup stages of all the generations, sync and async
+    stage_executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv("SQL_GENERATION_SETUP_WORKERS", "32")),
+        thread_name_prefix="sql-generation-setup",
+    )
 
     def __init__(self, system: System, llm_config: LLMConfig):  # noqa: ARG002
         self.system = system
         self.llm_config = llm_config
         self.model = ChatModel(self.system)
+        # Normalized queries the agent ran successfully, validation doesn't run them again
+        self.executed_queries = set()
+        # Observations of the deterministic tools, repeated calls are not run again
+        self.tool_memo = ToolMemo()
+        self.sql_result_cache_stats = SQLResultCacheStats()
+        self.schema_budget_stats = SchemaBudgetStats()
+        # Durations of the setup stages of the last generation, in seconds
+        self.stage_timings = None
+        # Called with the stored generation when a streamed generation finishes
+        self.on_stream_complete = None
+
+    @staticmethod
+    def load_db_scan(
+        storage: Any, database_connection: DatabaseConnection, user_prompt: Prompt
+    ) -> List[TableDescription]:
+        repository = TableDescriptionRepository(storage)
+        db_scan = repository.get_all_tables_by_db(
+            {
+                "db_connection_id": str(database_connection.id),
+                "status": TableDescriptionStatus.SCANNED.value,
+            }
+        )
+        if not db_scan:
+            raise ValueError("No scanned tables found for database")
+        return SQLGenerator.filter_tables_by_schema(db_scan=db_scan, prompt=user_prompt)
+
+    @staticmethod
+    def run_stages(
+        stages: Dict[str, Callable[[], Any]],
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Runs independent setup stages concurrently and returns their results and their
+        durations in seconds, `setup` is the time it took to run all of them."""
+        timings = {}
+
+        def timed(name: str, stage: Callable[[], Any]) -> Any:
+            start = time.perf_counter()
+            try:
+                return stage()
+            finally:
+                timings[name] = round(time.perf_counter() - start, 4)
+
+        start = time.perf_counter()
+        futures = {
+            name: SQLGenerator.stage_executor.submit(
+                contextvars.copy_context().run, timed, name, stage
+            )
+            for name, stage in stages.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
+        timings["setup"] = round(time.perf_counter() - start, 4)
+        return results, timings
 
     def check_for_time_out_or_tool_limit(self, response: dict) -> dict:
         if (
@@ -98,7 +166,9 @@ class SQLGenerator(Component, ABC):
     def create_sql_query_status(
         self, db: SQLDatabase, query: str, sql_generation: SQLGeneration
     ) -> SQLGeneration:
-        return create_sql_query_status(db, query, sql_generation)
+        return create_sql_query_status(
+            db, query, sql_generation, executed_queries=self.executed_queries
+        )
 
     def format_sql_query(self, sql_query: str) -> str:
         comments = [
@@ -138,6 +208,7 @@ class SQLGenerator(Component, ABC):
         """Constructs the intermediate steps."""
         formatted_intermediate_steps = []
         for step in intermediate_steps:
+            cached = self.tool_memo.was_hit(step[0].tool, step[0].tool_input)
             if step[0].tool == "SqlDbQuery":
                 formatted_intermediate_steps.append(
                     IntermediateStep(
@@ -145,6 +216,7 @@ class SQLGenerator(Component, ABC):
                         action=step[0].tool,
                         action_input=step[0].tool_input,
                         observation="QUERY RESULTS ARE NOT STORED FOR PRIVACY REASONS.",
+                        cached=cached,
                     )
                 )
             else:
@@ -154,13 +226,27 @@ class SQLGenerator(Component, ABC):
                         action=step[0].tool,
                         action_input=step[0].tool_input,
                         observation=self.truncate_observations(step[1]),
+                        cached=cached,
                     )
                 )
+        if self.tool_memo.hits:
+            logger.info(f"{self.tool_memo.hits} tool calls answered from the memo")
         formatted_intermediate_steps[0].thought = suffix.split("Thought: ")[1].split(
             "{agent_scratchpad}"
         )[0]
         return formatted_intermediate_steps
 
+    def report_tool_stats(self, response: SQLGeneration) -> None:
+        """Adds the hits and misses of the SQL result cache and the tokens of the budgeted
+        schemas to the generation metadata"""
+        stats = {}
+        if SQLResultCache.enabled():
+            stats["sql_result_cache"] = self.sql_result_cache_stats.dict()
+        if SCHEMA_TOKEN_BUDGET > 0:
+            stats["schema_budget"] = self.schema_budget_stats.dict()
+        if stats:
+            response.metadata = {**(response.metadata or {}), **stats}
+
     def truncate_observations(self, obervarion: str, max_length: int = 2000) -> str:
         """Truncate the tool input."""
         return (
@@ -180,13 +266,30 @@ class SQLGenerator(Component, ABC):
         """Generates a response to a user question."""
         pass
 
+    async def agenerate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        """Generates a response to a user question without blocking the event loop, the
+        generators that have no async implementation run in a worker thread."""
+        return await asyncio.to_thread(
+            self.generate_response,
+            user_prompt,
+            database_connection,
+            context,
+            metadata,
+        )
+
     def stream_agent_steps(  # noqa: PLR0912, C901
         self,
         question: str,
         agent_executor: AgentExecutor,
         response: SQLGeneration,
         sql_generation_repository: SQLGenerationRepository,
-        queue: Queue,
+        queue: StreamChannel,
         metadata: dict = None,
     ):  # noqa: PLR0912
         try:
@@ -194,6 +297,7 @@ class SQLGenerator(Component, ABC):
                 for chunk in agent_executor.stream(
                     {"input": question}, {"metadata": metadata}
                 ):
+                    queue.raise_if_cancelled()
                     if "actions" in chunk:
                         for message in chunk["messages"]:
                             queue.put(
@@ -204,8 +308,12 @@ class SQLGenerator(Component, ABC):
                             )
                     elif "steps" in chunk:
                         for step in chunk["steps"]:
+                            cached = self.tool_memo.was_hit(
+                                step.action.tool, step.action.tool_input
+                            )
+                            label = "Observation (cached)" if cached else "Observation"
                             queue.put(
-                                f"\n**Observation:**\n {self.format_sql_query_intermediate_steps(step.observation)}\n"
+                                f"\n**{label}:**\n {self.format_sql_query_intermediate_steps(step.observation)}\n"
                             )
                     elif "output" in chunk:
                         queue.put(
@@ -221,6 +329,9 @@ class SQLGenerator(Component, ABC):
             raise SQLInjectionError(e) from e
         except EngineTimeOutORItemLimitError as e:
             raise EngineTimeOutORItemLimitError(e) from e
+        except StreamCancelledError as e:
+            response.status = "INVALID"
+            response.error = str(e)
         except Exception as e:
             response.sql = ("",)
             response.status = ("INVALID",)
@@ -229,6 +340,7 @@ class SQLGenerator(Component, ABC):
             queue.put(None)
             response.tokens_used = cb.total_tokens
             response.completed_at = datetime.datetime.now()
+            self.report_tool_stats(response)
             if not response.error:
                 if response.sql:
                     response = self.create_sql_query_status(
@@ -240,6 +352,8 @@ class SQLGenerator(Component, ABC):
                     response.status = "INVALID"
                     response.error = "No SQL query generated"
             sql_generation_repository.update(response)
+            if self.on_stream_complete is not None:
+                self.on_stream_complete(response)
 
     @abstractmethod
     def stream_response(
@@ -247,7 +361,7 @@ class SQLGenerator(Component, ABC):
         user_prompt: Prompt,
         database_connection: DatabaseConnection,
         response: SQLGeneration,
-        queue: Queue,
+        queue: StreamChannel,
         metadata: dict = None,
     ):
         """Streams a response to a user question."""
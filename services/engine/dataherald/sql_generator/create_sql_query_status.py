@@ -1,8 +1,25 @@
+import logging
 import os
 
 from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.types import SQLGeneration
-from dataherald.utils.timeout_utils import run_with_timeout
+
+logger = logging.getLogger(__name__)
+
+# "reuse" trusts the agent's successful executions of the same query and otherwise only
+# compiles it, "execute" runs the whole query again
+SQL_VALIDATION_MODES = ["reuse", "execute"]
+
+
+def get_sql_validation_mode() -> str:
+    mode = os.getenv("SQL_VALIDATION_MODE", "reuse")
+    if mode not in SQL_VALIDATION_MODES:
+        logger.warning(
+            f"Unknown SQL_VALIDATION_MODE {mode!r}, expected one of "
+            f"{SQL_VALIDATION_MODES}, using reuse"
+        )
+        return "reuse"
+    return mode
 
 
 def format_error_message(
@@ -23,6 +40,7 @@ def create_sql_query_status(
     db: SQLDatabase,
     query: str,
     sql_generation: SQLGeneration,
+    executed_queries: set[str] | None = None,
 ) -> SQLGeneration:
     """Find the sql query status and populate the fields sql_query_result, sql_generation_status, and error_message"""
     if query == "":
@@ -30,12 +48,13 @@ def create_sql_query_status(
         sql_generation.error = "Sorry, we couldn't generate an SQL from your prompt"
     else:
         try:
-            query = db.parser_to_filter_commands(query)
-            run_with_timeout(
-                db.run_sql,
-                args=(query,),
-                timeout_duration=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
-            )
+            timeout = int(os.getenv("SQL_EXECUTION_TIMEOUT", "60"))
+            if get_sql_validation_mode() == "execute":
+                db.run_sql(query, timeout=timeout)
+            elif db.normalize_sql(query) in (executed_queries or set()):
+                db.parser_to_filter_commands(query)
+            else:
+                db.validate_sql(query, timeout=timeout)
             sql_generation.status = "VALID"
             sql_generation.error = None
         except TimeoutError:
@@ -1,14 +1,14 @@
+import asyncio
 import datetime
+import inspect
 import logging
 import os
 from functools import wraps
-from queue import Queue
 from threading import Thread
-from typing import Any, Callable, Dict, List, Type
+from typing import Any, Callable, Dict, List, Set, Tuple, Type
 
 import numpy as np
 import openai
-import pandas as pd
 from google.api_core.exceptions import GoogleAPIError
 from langchain.agents.agent import AgentExecutor
 from langchain.agents.agent_toolkits.base import BaseToolkit
@@ -21,8 +21,10 @@ from langchain.callbacks.manager import (
 from langchain.chains.llm import LLMChain
 from langchain.tools.base import BaseTool
 from langchain_community.callbacks import get_openai_callback
+from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+from langchain_core.runnables.config import run_in_executor
 from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from overrides import override
 from pydantic import BaseModel, Field
 from sql_metadata import Parser
@@ -41,8 +43,14 @@ from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.sql_database.models.types import (
     DatabaseConnection,
 )
+from dataherald.sql_database.result_cache import SQLResultCache
 from dataherald.sql_generator import EngineTimeOutORItemLimitError, SQLGenerator
-from dataherald.types import FineTuningStatus, Prompt, SQLGeneration
+from dataherald.sql_generator.tool_memo import (
+    SQL_TIMEOUT_OBSERVATION,
+    ToolMemo,
+    memoize,
+)
+from dataherald.types import Finetuning, FineTuningStatus, Prompt, SQLGeneration
 from dataherald.utils.agent_prompts import (
     ERROR_PARSING_MESSAGE,
     FINETUNING_AGENT_PREFIX,
@@ -52,13 +60,18 @@ from dataherald.utils.agent_prompts import (
     FORMAT_INSTRUCTIONS,
 )
 from dataherald.utils.models_context_window import OPENAI_FINETUNING_MODELS_WINDOW_SIZES
-from dataherald.utils.timeout_utils import run_with_timeout
+from dataherald.utils.schema_index import SchemaIndex
+from dataherald.utils.streaming import StreamChannel
+from dataherald.utils.table_embeddings import (
+    TableEmbeddingCache,
+    top_k_similarities,
+)
 
 logger = logging.getLogger(__name__)
 
 
 TOP_K = SQLGenerator.get_upper_bound_limit()
-EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL","text-embedding-3-large")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
 TOP_TABLES = 20
 
 
@@ -74,31 +87,41 @@ def replace_unprocessable_characters(text: str) -> str:
     return text.replace(r"\_", "_")
 
 
+def error_message(e: Exception) -> str:  # noqa: PLR0911
+    if isinstance(e, openai.AuthenticationError):
+        return f"OpenAI API authentication error: {e}"
+    if isinstance(e, openai.RateLimitError):
+        return f"OpenAI API request exceeded rate limit: {e}"
+    if isinstance(e, openai.BadRequestError):
+        return f"OpenAI API request timed out: {e}"
+    if isinstance(e, openai.APIResponseValidationError):
+        return f"OpenAI API response is invalid: {e}"
+    if isinstance(e, openai.OpenAIError):
+        return f"OpenAI API returned an error: {e}"
+    if isinstance(e, GoogleAPIError):
+        return f"Google API returned an error: {e}"
+    return f"Error: {e}"
+
+
 def catch_exceptions():  # noqa: C901
     def decorator(fn: Callable[[str], str]) -> Callable[[str], str]:  # noqa: C901
+        if inspect.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await fn(*args, **kwargs)
+                except (openai.OpenAIError, GoogleAPIError, SQLAlchemyError) as e:
+                    return error_message(e)
+
+            return async_wrapper
+
         @wraps(fn)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: PLR0911
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
             try:
                 return fn(*args, **kwargs)
-            except openai.AuthenticationError as e:
-                # Handle authentication error here
-                return f"OpenAI API authentication error: {e}"
-            except openai.RateLimitError as e:
-                # Handle API error here, e.g. retry or log
-                return f"OpenAI API request exceeded rate limit: {e}"
-            except openai.BadRequestError as e:
-                # Handle connection error here
-                return f"OpenAI API request timed out: {e}"
-            except openai.APIResponseValidationError as e:
-                # Handle rate limit error (we recommend using exponential backoff)
-                return f"OpenAI API response is invalid: {e}"
-            except openai.OpenAIError as e:
-                # Handle timeout error (we recommend using exponential backoff)
-                return f"OpenAI API returned an error: {e}"
-            except GoogleAPIError as e:
-                return f"Google API returned an error: {e}"
-            except SQLAlchemyError as e:
-                return f"Error: {e}"
+            except (openai.OpenAIError, GoogleAPIError, SQLAlchemyError) as e:
+                return error_message(e)
 
         return wrapper
 
@@ -117,6 +140,7 @@ class BaseSQLDatabaseTool(BaseModel):
     """Base tool for interacting with the SQL database and the context information."""
 
     db: SQLDatabase = Field(exclude=True)
+    memo: ToolMemo | None = Field(exclude=True, default=None)
 
     class Config(BaseTool.Config):
         """Configuration for this pydantic object."""
@@ -148,9 +172,9 @@ class SystemTime(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         tool_input: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("SystemTime tool does not support async")
+        return self._run(tool_input)
 
 
 class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -164,6 +188,7 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     """
     db_scan: List[TableDescription]
     embedding: OpenAIEmbeddings
+    storage: Any = Field(exclude=True, default=None)
     few_shot_examples: List[dict] | None = Field(exclude=True, default=None)
 
     def get_embedding(
@@ -173,16 +198,24 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
         text = text.replace("\n", " ")
         return self.embedding.embed_query(text)
 
+    async def aget_embedding(
+        self,
+        text: str,
+    ) -> List[float]:
+        text = text.replace("\n", " ")
+        return await self.embedding.aembed_query(text)
+
     def get_docs_embedding(
         self,
         docs: List[str],
-    ) -> List[List[float]]:
-        return self.embedding.embed_documents(docs)
-
-    def cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        return round(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)), 4)
+    ) -> np.ndarray:
+        return TableEmbeddingCache(self.storage, self.embedding).embedding_matrix(
+            self.db_scan, docs
+        )
 
-    def similar_tables_based_on_few_shot_examples(self, df: pd.DataFrame) -> List[str]:
+    def similar_tables_based_on_few_shot_examples(
+        self, ranked_tables: List[Tuple[str | None, str, float]]
+    ) -> Set[Tuple[str | None, str]]:
         most_similar_tables = set()
         if self.few_shot_examples is not None:
             for example in self.few_shot_examples:
@@ -190,77 +223,91 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
                     tables = Parser(example["sql"]).tables
                 except Exception as e:
                     logger.error(f"Error parsing SQL: {str(e)}")
+                    continue
                 for table in tables:
-                    found_tables = df[df.table_name == table]
-                    for _, row in found_tables.iterrows():
-                        most_similar_tables.add((row["schema_name"], row["table_name"]))
-            df.drop(
-                df[
-                    df.table_name.isin([table[1] for table in most_similar_tables])
-                ].index,
-                inplace=True,
-            )
+                    for schema_name, table_name, _ in ranked_tables:
+                        if table_name == table:
+                            most_similar_tables.add((schema_name, table_name))
         return most_similar_tables
 
+    def get_table_representation(self, table: TableDescription) -> str:
+        col_rep = ""
+        for column in table.columns:
+            if column.description:
+                col_rep += f"{column.name}: {column.description}, "
+            else:
+                col_rep += f"{column.name}, "
+        if table.description:
+            return f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
+        return f"Table {table.table_name} contain columns: [{col_rep}]"
+
     @catch_exceptions()
-    def _run(  # noqa: PLR0912
+    @memoize()
+    def _run(
         self,
         user_question: str,
         run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
         """Use the concatenation of table name, columns names, and the description of the table as the table representation"""
         question_embedding = self.get_embedding(user_question)
-        table_representations = []
-        for table in self.db_scan:
-            col_rep = ""
-            for column in table.columns:
-                if column.description:
-                    col_rep += f"{column.name}: {column.description}, "
-                else:
-                    col_rep += f"{column.name}, "
-            if table.description:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
-            else:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}]"
-            table_representations.append(
-                [table.schema_name, table.table_name, table_rep]
-            )
-        df = pd.DataFrame(
-            table_representations,
-            columns=["schema_name", "table_name", "table_representation"],
+        table_embeddings = self.get_docs_embedding(
+            [self.get_table_representation(table) for table in self.db_scan]
         )
-        df["table_embedding"] = self.get_docs_embedding(df.table_representation)
-        df["similarities"] = df.table_embedding.apply(
-            lambda x: self.cosine_similarity(x, question_embedding)
+        return self.rank_tables(question_embedding, table_embeddings)
+
+    @catch_exceptions()
+    @memoize()
+    async def _arun(
+        self,
+        user_question: str = "",
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
+    ) -> str:
+        question_embedding = await self.aget_embedding(user_question)
+        # The cached table embeddings are read from and written to the storage
+        table_embeddings = await run_in_executor(
+            None,
+            self.get_docs_embedding,
+            [self.get_table_representation(table) for table in self.db_scan],
         )
-        df = df.sort_values(by="similarities", ascending=True)
-        df = df.tail(TOP_TABLES)
-        most_similar_tables = self.similar_tables_based_on_few_shot_examples(df)
-        table_relevance = ""
-        for _, row in df.iterrows():
-            if row["schema_name"] is not None:
-                table_name = row["schema_name"] + "." + row["table_name"]
-            else:
-                table_name = row["table_name"]
-            table_relevance += (
-                f'Table: `{table_name}`, relevance score: {row["similarities"]}\n'
+        return self.rank_tables(question_embedding, table_embeddings)
+
+    def rank_tables(
+        self, question_embedding: List[float], table_embeddings: np.ndarray
+    ) -> str:
+        ranked_tables = [
+            (
+                self.db_scan[index].schema_name,
+                self.db_scan[index].table_name,
+                round(similarity, 4),
+            )
+            for index, similarity in top_k_similarities(
+                table_embeddings, question_embedding, TOP_TABLES
             )
+        ]
+        most_similar_tables = self.similar_tables_based_on_few_shot_examples(
+            ranked_tables
+        )
+        most_similar_table_names = {table[1] for table in most_similar_tables}
+        ranked_tables = [
+            table for table in ranked_tables if table[1] not in most_similar_table_names
+        ]
+        ranked_tables.reverse()
+        table_relevance = ""
+        for schema_name, name, similarity in ranked_tables:
+            table_name = schema_name + "." + name if schema_name is not None else name
+            table_relevance += f"Table: `{table_name}`, relevance score: {similarity}\n"
         if len(most_similar_tables) > 0:
+            max_similarity = max([table[2] for table in ranked_tables], default=1.0)
             for table in most_similar_tables:
                 if table[0] is not None:
                     table_name = table[0] + "." + table[1]
                 else:
                     table_name = table[1]
-                table_relevance += f"Table: `{table_name}`, relevance score: {max(df['similarities'])}\n"
+                table_relevance += (
+                    f"Table: `{table_name}`, relevance score: {max_similarity}\n"
+                )
         return table_relevance
 
-    async def _arun(
-        self,
-        user_question: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
-    ) -> str:
-        raise NotImplementedError("TablesSQLDatabaseTool does not support async")
-
 
 class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
     """Tool for querying a SQL database."""
@@ -274,7 +321,12 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
     """
     args_schema: Type[BaseModel] = SQLInput
 
+    executed_queries: Any = Field(exclude=True, default=None)
+    db_connection_id: str | None = Field(exclude=True, default=None)
+    result_cache_stats: Any = Field(exclude=True, default=None)
+
     @catch_exceptions()
+    @memoize()
     def _run(
         self,
         query: str,
@@ -286,21 +338,27 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
             query = query.replace("```sql", "").replace("```", "")
 
         try:
-            return run_with_timeout(
-                self.db.run_sql,
-                args=(query,),
-                kwargs={"top_k": TOP_K},
-                timeout_duration=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
-            )[0]
+            result = SQLResultCache.run_sql(
+                self.db,
+                self.db_connection_id,
+                query,
+                top_k=TOP_K,
+                timeout=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
+                stats=self.result_cache_stats,
+            )
+            if self.executed_queries is not None:
+                self.executed_queries.add(self.db.normalize_sql(query))
+            return result
         except TimeoutError:
-            return "SQL query execution time exceeded, proceed without query execution"
+            return SQL_TIMEOUT_OBSERVATION
 
     async def _arun(
         self,
         query: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("QuerySQLDataBaseTool does not support async")
+        """Execute the query in a worker thread, the database drivers are blocking."""
+        return await run_in_executor(None, self._run, query)
 
 
 class GenerateSQL(BaseSQLDatabaseTool, BaseTool):
@@ -320,20 +378,17 @@ class GenerateSQL(BaseSQLDatabaseTool, BaseTool):
     api_key: str = Field(exclude=True)
     openai_fine_tuning: OpenAIFineTuning = Field(exclude=True)
     embedding: OpenAIEmbeddings = Field(exclude=True)
+    storage: Any = Field(exclude=True, default=None)
 
-    @catch_exceptions()
-    def _run(
-        self,
-        question: str = "",
-        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
-    ) -> str:
-        """Execute the query, return the results or an error message."""
+    def create_messages(self, question: str) -> List[dict]:
         table_representations = []
         for table in self.db_scan:
             table_representations.append(
                 self.openai_fine_tuning.create_table_representation(table)
             )
-        table_embeddings = self.embedding.embed_documents(table_representations)
+        table_embeddings = TableEmbeddingCache(
+            self.storage, self.embedding
+        ).embed_tables(self.db_scan, table_representations)
         system_prompt = (
             FINETUNING_SYSTEM_INFORMATION
             + self.openai_fine_tuning.format_dataset(
@@ -344,24 +399,43 @@ class GenerateSQL(BaseSQLDatabaseTool, BaseTool):
             )
         )
         user_prompt = "User Question: " + question + "\n SQL: "
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    @catch_exceptions()
+    def _run(
+        self,
+        question: str = "",
+        run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
+    ) -> str:
+        """Execute the query, return the results or an error message."""
         client = OpenAI(api_key=self.api_key)
         response = client.chat.completions.create(
             model=self.finetuning_model_id,
             temperature=0.0,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+            messages=self.create_messages(question),
         )
         returned_sql = response.choices[0].message.content
         return f"```sql\n{returned_sql}```"
 
+    @catch_exceptions()
     async def _arun(
         self,
-        tool_input: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        question: str = "",
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GenerateSQL tool does not support async")
+        # The table embeddings are cached in the storage and the dataset is tokenized
+        messages = await run_in_executor(None, self.create_messages, question)
+        client = AsyncOpenAI(api_key=self.api_key)
+        response = await client.chat.completions.create(
+            model=self.finetuning_model_id,
+            temperature=0.0,
+            messages=messages,
+        )
+        returned_sql = response.choices[0].message.content
+        return f"```sql\n{returned_sql}```"
 
 
 class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -375,9 +449,16 @@ class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     Example Input: table1, table2, table3
     """
     db_scan: List[TableDescription]
+    schema_index: SchemaIndex | None = Field(exclude=True, default=None)
+
+    def get_schema_index(self) -> SchemaIndex:
+        if self.schema_index is None:
+            self.schema_index = SchemaIndex(self.db_scan)
+        return self.schema_index
 
     @catch_exceptions()
-    def _run(  # noqa: C901
+    @memoize()
+    def _run(
         self,
         table_names: str,
         run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
@@ -392,35 +473,18 @@ class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
             else:
                 processed_table_names.append(formatted_table)
         tables_schema = ""
-        for table in self.db_scan:
-            if table.table_name in processed_table_names:
-                tables_schema += "```sql\n"
-                tables_schema += table.table_schema + "\n"
-                descriptions = []
-                if table.description is not None:
-                    if table.schema_name:
-                        table_name = f"{table.schema_name}.{table.table_name}"
-                    else:
-                        table_name = table.table_name
-                    descriptions.append(f"Table `{table_name}`: {table.description}\n")
-                    for column in table.columns:
-                        if column.description is not None:
-                            descriptions.append(
-                                f"Column `{column.name}`: {column.description}\n"
-                            )
-                if len(descriptions) > 0:
-                    tables_schema += f"/*\n{''.join(descriptions)}*/\n"
-                tables_schema += "```\n"
+        for table in self.get_schema_index().find_tables(processed_table_names):
+            tables_schema += "```sql\n" + table.schema_snippet + "```\n"
         if tables_schema == "":
             tables_schema += "Tables not found in the database"
         return tables_schema
 
     async def _arun(
         self,
-        table_name: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        table_names: str,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("SchemaSQLDatabaseTool does not support async")
+        return self._run(table_names)
 
 
 class SQLDatabaseToolkit(BaseToolkit):
@@ -435,7 +499,13 @@ class SQLDatabaseToolkit(BaseToolkit):
     model_name: str = Field(exclude=True)
     openai_fine_tuning: OpenAIFineTuning = Field(exclude=True)
     embedding: OpenAIEmbeddings = Field(exclude=True)
+    executed_queries: Any = Field(exclude=True, default=None)
+    db_connection_id: str | None = Field(exclude=True, default=None)
+    result_cache_stats: Any = Field(exclude=True, default=None)
+    storage: Any = Field(exclude=True, default=None)
     few_shot_examples: List[dict] | None = Field(exclude=True, default=None)
+    memo: ToolMemo | None = Field(exclude=True, default=None)
+    schema_index: SchemaIndex | None = Field(exclude=True, default=None)
 
     @property
     def dialect(self) -> str:
@@ -452,16 +522,33 @@ class SQLDatabaseToolkit(BaseToolkit):
         tools = []
         if not self.use_finetuned_model_only:
             tools.append(SystemTime(db=self.db))
-            tools.append(SchemaSQLDatabaseTool(db=self.db, db_scan=self.db_scan))
+            tools.append(
+                SchemaSQLDatabaseTool(
+                    db=self.db,
+                    db_scan=self.db_scan,
+                    schema_index=self.schema_index,
+                    memo=self.memo,
+                )
+            )
             tools.append(
                 TablesSQLDatabaseTool(
                     db=self.db,
                     db_scan=self.db_scan,
                     embedding=self.embedding,
+                    storage=self.storage,
                     few_shot_examples=self.few_shot_examples,
+                    memo=self.memo,
                 )
             )
-        tools.append(QuerySQLDataBaseTool(db=self.db))
+        tools.append(
+            QuerySQLDataBaseTool(
+                db=self.db,
+                executed_queries=self.executed_queries,
+                db_connection_id=self.db_connection_id,
+                result_cache_stats=self.result_cache_stats,
+                memo=self.memo,
+            )
+        )
         tools.append(
             GenerateSQL(
                 db=self.db,
@@ -471,6 +558,7 @@ class SQLDatabaseToolkit(BaseToolkit):
                 model_name=self.model_name,
                 openai_fine_tuning=self.openai_fine_tuning,
                 embedding=self.embedding,
+                storage=self.storage,
             )
         )
         return tools
@@ -537,86 +625,83 @@ class DataheraldFinetuningAgent(SQLGenerator):
             **(agent_executor_kwargs or {}),
         )
 
-    @override
-    def generate_response(
+    def load_finetuning(self, storage: Any) -> Tuple[OpenAIFineTuning, Finetuning]:
+        finetunings_repository = FinetuningsRepository(storage)
+        finetuning = finetunings_repository.find_by_id(self.finetuning_id)
+        openai_fine_tuning = OpenAIFineTuning(self.system, storage, finetuning)
+        finetuning = openai_fine_tuning.retrieve_finetuning_job()
+        if finetuning.status != FineTuningStatus.SUCCEEDED.value:
+            raise FinetuningNotAvailableError(
+                f"Finetuning({self.finetuning_id}) has the status {finetuning.status}."
+                f"Finetuning should have the status {FineTuningStatus.SUCCEEDED.value} to generate SQL queries."
+            )
+        return openai_fine_tuning, finetuning
+
+    def create_embedding(
+        self, database_connection: DatabaseConnection
+    ) -> OpenAIEmbeddings:
+        if self.system.settings["azure_api_key"] is not None:
+            return AzureOpenAIEmbeddings(
+                openai_api_key=database_connection.decrypt_api_key(),
+                model=EMBEDDING_MODEL,
+            )
+        return OpenAIEmbeddings(
+            openai_api_key=database_connection.decrypt_api_key(),
+            model=EMBEDDING_MODEL,
+        )
+
+    def create_agent_executor(
         self,
         user_prompt: Prompt,
         database_connection: DatabaseConnection,
-        context: List[dict] = None,  # noqa: ARG002
-        metadata: dict = None,
-    ) -> SQLGeneration:
-        """
-        generate_response generates a response to a user question using a Finetuning model.
-
-        Args:
-            user_question (Question): The user question to generate a response to.
-            database_connection (DatabaseConnection): The database connection to use.
-            context (List[dict], optional): The context to use. Defaults to None.
-            generate_csv (bool, optional): Whether to generate a CSV. Defaults to False.
-
-        Returns:
-            Response: The response to the user question.
-        """
+    ) -> AgentExecutor:
+        """Loads the scanned tables, the context of the question and the finetuned model
+        and builds the agent."""
         context_store = self.system.instance(ContextStore)
         storage = self.system.instance(DB)
-        response = SQLGeneration(
-            prompt_id=user_prompt.id,
-            created_at=datetime.datetime.now(),
-            llm_config=self.llm_config,
-            finetuning_id=self.finetuning_id,
-        )
         self.llm = self.model.get_model(
             database_connection=database_connection,
             temperature=0,
             model_name=self.llm_config.llm_name,
             api_base=self.llm_config.api_base,
         )
-        repository = TableDescriptionRepository(storage)
-        db_scan = repository.get_all_tables_by_db(
+        # None of the stages depend on each other, the setup takes as long as the slowest
+        results, self.stage_timings = self.run_stages(
             {
-                "db_connection_id": str(database_connection.id),
-                "status": TableDescriptionStatus.SCANNED.value,
+                "db_scan": lambda: SchemaIndex(
+                    self.load_db_scan(storage, database_connection, user_prompt)
+                ),
+                "context": lambda: context_store.retrieve_context_for_question(
+                    user_prompt, number_of_samples=5
+                ),
+                "finetuning": lambda: self.load_finetuning(storage),
+                "database": lambda: SQLDatabase.get_sql_engine(database_connection),
+                "embedding": lambda: self.create_embedding(database_connection),
             }
         )
-        if not db_scan:
-            raise ValueError("No scanned tables found for database")
-        db_scan = SQLGenerator.filter_tables_by_schema(
-            db_scan=db_scan, prompt=user_prompt
-        )
-        few_shot_examples, instructions = context_store.retrieve_context_for_question(
-            user_prompt, number_of_samples=5
-        )
-        finetunings_repository = FinetuningsRepository(storage)
-        finetuning = finetunings_repository.find_by_id(self.finetuning_id)
-        openai_fine_tuning = OpenAIFineTuning(self.system, storage, finetuning)
-        finetuning = openai_fine_tuning.retrieve_finetuning_job()
-        if finetuning.status != FineTuningStatus.SUCCEEDED.value:
-            raise FinetuningNotAvailableError(
-                f"Finetuning({self.finetuning_id}) has the status {finetuning.status}."
-                f"Finetuning should have the status {FineTuningStatus.SUCCEEDED.value} to generate SQL queries."
-            )
-        self.database = SQLDatabase.get_sql_engine(database_connection)
-        if self.system.settings["azure_api_key"] is not None:
-            embedding = AzureOpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-        else:
-            embedding = OpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
+        schema_index = results["db_scan"]
+        few_shot_examples, instructions = results["context"]
+        openai_fine_tuning, finetuning = results["finetuning"]
+        self.database = results["database"]
+        SQLResultCache.remove_invalidated(database_connection.id, storage)
+        embedding = results["embedding"]
         toolkit = SQLDatabaseToolkit(
             db=self.database,
+            executed_queries=self.executed_queries,
+            memo=self.tool_memo,
+            db_connection_id=database_connection.id,
+            result_cache_stats=self.sql_result_cache_stats,
             instructions=instructions,
             few_shot_examples=few_shot_examples,
-            db_scan=db_scan,
+            db_scan=schema_index.tables,
+            schema_index=schema_index,
             api_key=database_connection.decrypt_api_key(),
             finetuning_model_id=finetuning.model_id,
             use_finetuned_model_only=self.use_fintuned_model_only,
             model_name=finetuning.base_llm.model_name,
             openai_fine_tuning=openai_fine_tuning,
             embedding=embedding,
+            storage=storage,
         )
         agent_executor = self.create_sql_agent(
             toolkit=toolkit,
@@ -625,6 +710,60 @@ class DataheraldFinetuningAgent(SQLGenerator):
         )
         agent_executor.return_intermediate_steps = True
         agent_executor.handle_parsing_errors = ERROR_PARSING_MESSAGE
+        return agent_executor
+
+    def complete_response(
+        self, response: SQLGeneration, result: dict, cb: OpenAICallbackHandler
+    ) -> SQLGeneration:
+        sql_query = ""
+        if "```sql" in result["output"]:
+            sql_query = self.remove_markdown(result["output"])
+        else:
+            sql_query = self.extract_query_from_intermediate_steps(
+                result["intermediate_steps"]
+            )
+        logger.info(f"cost: {str(cb.total_cost)} tokens: {str(cb.total_tokens)}")
+        response.sql = replace_unprocessable_characters(sql_query)
+        response.tokens_used = cb.total_tokens
+        response.completed_at = datetime.datetime.now()
+        response.stage_timings = self.stage_timings
+        self.report_tool_stats(response)
+        response.intermediate_steps = self.construct_intermediate_steps(
+            result["intermediate_steps"], FINETUNING_AGENT_SUFFIX
+        )
+        return self.create_sql_query_status(
+            self.database,
+            response.sql,
+            response,
+        )
+
+    @override
+    def generate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,  # noqa: ARG002
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        """
+        generate_response generates a response to a user question using a Finetuning model.
+
+        Args:
+            user_question (Question): The user question to generate a response to.
+            database_connection (DatabaseConnection): The database connection to use.
+            context (List[dict], optional): The context to use. Defaults to None.
+            generate_csv (bool, optional): Whether to generate a CSV. Defaults to False.
+
+        Returns:
+            Response: The response to the user question.
+        """
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            created_at=datetime.datetime.now(),
+            llm_config=self.llm_config,
+            finetuning_id=self.finetuning_id,
+        )
+        agent_executor = self.create_agent_executor(user_prompt, database_connection)
         with get_openai_callback() as cb:
             try:
                 result = agent_executor.invoke(
@@ -644,26 +783,50 @@ class DataheraldFinetuningAgent(SQLGenerator):
                     sql="",
                     status="INVALID",
                     error=str(e),
+                    stage_timings=self.stage_timings,
                 )
-        sql_query = ""
-        if "```sql" in result["output"]:
-            sql_query = self.remove_markdown(result["output"])
-        else:
-            sql_query = self.extract_query_from_intermediate_steps(
-                result["intermediate_steps"]
-            )
-        logger.info(f"cost: {str(cb.total_cost)} tokens: {str(cb.total_tokens)}")
-        response.sql = replace_unprocessable_characters(sql_query)
-        response.tokens_used = cb.total_tokens
-        response.completed_at = datetime.datetime.now()
-        response.intermediate_steps = self.construct_intermediate_steps(
-            result["intermediate_steps"], FINETUNING_AGENT_SUFFIX
+        return self.complete_response(response, result, cb)
+
+    @override
+    async def agenerate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,  # noqa: ARG002
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            created_at=datetime.datetime.now(),
+            llm_config=self.llm_config,
+            finetuning_id=self.finetuning_id,
         )
-        return self.create_sql_query_status(
-            self.database,
-            response.sql,
-            response,
+        agent_executor = await asyncio.to_thread(
+            self.create_agent_executor, user_prompt, database_connection
         )
+        with get_openai_callback() as cb:
+            try:
+                result = await agent_executor.ainvoke(
+                    {"input": user_prompt.text}, {"metadata": metadata}
+                )
+                result = self.check_for_time_out_or_tool_limit(result)
+            except SQLInjectionError as e:
+                raise SQLInjectionError(e) from e
+            except EngineTimeOutORItemLimitError as e:
+                raise EngineTimeOutORItemLimitError(e) from e
+            except Exception as e:
+                return SQLGeneration(
+                    prompt_id=user_prompt.id,
+                    tokens_used=cb.total_tokens,
+                    finetuning_id=self.finetuning_id,
+                    completed_at=datetime.datetime.now(),
+                    sql="",
+                    status="INVALID",
+                    error=str(e),
+                    stage_timings=self.stage_timings,
+                )
+        # Validating the SQL can run it against the database
+        return await asyncio.to_thread(self.complete_response, response, result, cb)
 
     @override
     def stream_response(
@@ -671,7 +834,7 @@ class DataheraldFinetuningAgent(SQLGenerator):
         user_prompt: Prompt,
         database_connection: DatabaseConnection,
         response: SQLGeneration,
-        queue: Queue,
+        queue: StreamChannel,
         metadata: dict = None,
     ):
         context_store = self.system.instance(ContextStore)
@@ -709,18 +872,14 @@ class DataheraldFinetuningAgent(SQLGenerator):
                 f"Finetuning should have the status {FineTuningStatus.SUCCEEDED.value} to generate SQL queries."
             )
         self.database = SQLDatabase.get_sql_engine(database_connection)
-        if self.system.settings["azure_api_key"] is not None:
-            embedding = AzureOpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-        else:
-            embedding = OpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
+        SQLResultCache.remove_invalidated(database_connection.id, storage)
+        embedding = self.create_embedding(database_connection)
         toolkit = SQLDatabaseToolkit(
             db=self.database,
+            executed_queries=self.executed_queries,
+            memo=self.tool_memo,
+            db_connection_id=database_connection.id,
+            result_cache_stats=self.sql_result_cache_stats,
             instructions=instructions,
             db_scan=db_scan,
             api_key=database_connection.decrypt_api_key(),
@@ -729,6 +888,7 @@ class DataheraldFinetuningAgent(SQLGenerator):
             model_name=finetuning.base_llm.model_name,
             openai_fine_tuning=openai_fine_tuning,
             embedding=embedding,
+            storage=storage,
         )
         agent_executor = self.create_sql_agent(
             toolkit=toolkit,
@@ -1,15 +1,15 @@
+import asyncio
 import datetime
 import difflib
+import inspect
 import logging
 import os
 from functools import wraps
-from queue import Queue
 from threading import Thread
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Set, Tuple
 
 import numpy as np
 import openai
-import pandas as pd
 from google.api_core.exceptions import GoogleAPIError
 from langchain.agents.agent import AgentExecutor
 from langchain.agents.agent_toolkits.base import BaseToolkit
@@ -22,6 +22,8 @@ from langchain.callbacks.manager import (
 from langchain.chains.llm import LLMChain
 from langchain.tools.base import BaseTool
 from langchain_community.callbacks import get_openai_callback
+from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+from langchain_core.runnables.config import run_in_executor
 from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
 from overrides import override
 from pydantic import BaseModel, Field
@@ -39,7 +41,13 @@ from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
 from dataherald.sql_database.models.types import (
     DatabaseConnection,
 )
+from dataherald.sql_database.result_cache import SQLResultCache
 from dataherald.sql_generator import EngineTimeOutORItemLimitError, SQLGenerator
+from dataherald.sql_generator.tool_memo import (
+    SQL_TIMEOUT_OBSERVATION,
+    ToolMemo,
+    memoize,
+)
 from dataherald.types import Prompt, SQLGeneration
 from dataherald.utils.agent_prompts import (
     AGENT_PREFIX,
@@ -52,43 +60,62 @@ from dataherald.utils.agent_prompts import (
     SUFFIX_WITH_FEW_SHOT_SAMPLES,
     SUFFIX_WITHOUT_FEW_SHOT_SAMPLES,
 )
-from dataherald.utils.timeout_utils import run_with_timeout
+from dataherald.utils.column_value_index import ColumnValueIndexCache, ValueIndex
+from dataherald.utils.schema_budget import (
+    SCHEMA_TOKEN_BUDGET,
+    SchemaBudgetStats,
+    render_budgeted_schema,
+)
+from dataherald.utils.schema_index import SchemaIndex
+from dataherald.utils.streaming import StreamChannel
+from dataherald.utils.table_embeddings import (
+    TableEmbeddingCache,
+    top_k_similarities,
+)
 
 logger = logging.getLogger(__name__)
 
 
 TOP_K = SQLGenerator.get_upper_bound_limit()
-EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL","text-embedding-3-large")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
 TOP_TABLES = 20
 
 
+def error_message(e: Exception) -> str:  # noqa: PLR0911
+    if isinstance(e, openai.AuthenticationError):
+        return f"OpenAI API authentication error: {e}"
+    if isinstance(e, openai.RateLimitError):
+        return f"OpenAI API request exceeded rate limit: {e}"
+    if isinstance(e, openai.BadRequestError):
+        return f"OpenAI API request timed out: {e}"
+    if isinstance(e, openai.APIResponseValidationError):
+        return f"OpenAI API response is invalid: {e}"
+    if isinstance(e, openai.OpenAIError):
+        return f"OpenAI API returned an error: {e}"
+    if isinstance(e, GoogleAPIError):
+        return f"Google API returned an error: {e}"
+    return f"Error: {e}"
+
+
 def catch_exceptions():  # noqa: C901
     def decorator(fn: Callable[[str], str]) -> Callable[[str], str]:  # noqa: C901
+        if inspect.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    return error_message(e)
+
+            return async_wrapper
+
         @wraps(fn)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: PLR0911
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
             try:
                 return fn(*args, **kwargs)
-            except openai.AuthenticationError as e:
-                # Handle authentication error here
-                return f"OpenAI API authentication error: {e}"
-            except openai.RateLimitError as e:
-                # Handle API error here, e.g. retry or log
-                return f"OpenAI API request exceeded rate limit: {e}"
-            except openai.BadRequestError as e:
-                # Handle connection error here
-                return f"OpenAI API request timed out: {e}"
-            except openai.APIResponseValidationError as e:
-                # Handle rate limit error (we recommend using exponential backoff)
-                return f"OpenAI API response is invalid: {e}"
-            except openai.OpenAIError as e:
-                # Handle timeout error (we recommend using exponential backoff)
-                return f"OpenAI API returned an error: {e}"
-            except GoogleAPIError as e:
-                return f"Google API returned an error: {e}"
-            except SQLAlchemyError as e:
-                return f"Error: {e}"
             except Exception as e:
-                return f"Error: {e}"
+                return error_message(e)
 
         return wrapper
 
@@ -107,6 +134,8 @@ class BaseSQLDatabaseTool(BaseModel):
 
     db: SQLDatabase = Field(exclude=True)
     context: List[dict] | None = Field(exclude=True, default=None)
+    memo: ToolMemo | None = Field(exclude=True, default=None)
+    schema_index: SchemaIndex | None = Field(exclude=True, default=None)
 
     class Config(BaseTool.Config):
         """Configuration for this pydantic object."""
@@ -114,6 +143,12 @@ class BaseSQLDatabaseTool(BaseModel):
         arbitrary_types_allowed = True
         extra = "allow"
 
+    def get_schema_index(self) -> SchemaIndex:
+        """The index passed by the toolkit, or one over db_scan for tools built on their own"""
+        if self.schema_index is None:
+            self.schema_index = SchemaIndex(self.db_scan)
+        return self.schema_index
+
 
 class SystemTime(BaseSQLDatabaseTool, BaseTool):
     """Tool for finding the current data and time."""
@@ -137,9 +172,9 @@ class SystemTime(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         tool_input: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GetCurrentTimeTool does not support async")
+        return self._run(tool_input)
 
 
 class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -154,7 +189,12 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
     Add newline after both ```sql and ``` tags.
     """
 
+    executed_queries: Any = Field(exclude=True, default=None)
+    db_connection_id: str | None = Field(exclude=True, default=None)
+    result_cache_stats: Any = Field(exclude=True, default=None)
+
     @catch_exceptions()
+    @memoize()
     def _run(
         self,
         query: str,
@@ -167,21 +207,28 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, BaseTool):
             query = query.replace("```sql", "").replace("```", "")
 
         try:
-            return run_with_timeout(
-                self.db.run_sql,
-                args=(query,),
-                kwargs={"top_k": top_k},
-                timeout_duration=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
-            )[0]
+            result = SQLResultCache.run_sql(
+                self.db,
+                self.db_connection_id,
+                query,
+                top_k=top_k,
+                timeout=int(os.getenv("SQL_EXECUTION_TIMEOUT", "60")),
+                stats=self.result_cache_stats,
+            )
+            if self.executed_queries is not None:
+                self.executed_queries.add(self.db.normalize_sql(query))
+            return result
         except TimeoutError:
-            return "SQL query execution time exceeded, proceed without query execution"
+            return SQL_TIMEOUT_OBSERVATION
 
     async def _arun(
         self,
         query: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        top_k: int = TOP_K,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("QuerySQLDataBaseTool does not support async")
+        """Execute the query in a worker thread, the database drivers are blocking."""
+        return await run_in_executor(None, self._run, query, top_k)
 
 
 class GetUserInstructions(BaseSQLDatabaseTool, BaseTool):
@@ -208,10 +255,10 @@ class GetUserInstructions(BaseSQLDatabaseTool, BaseTool):
 
     async def _arun(
         self,
-        tool_input: str = "",  # noqa: ARG002
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        tool_input: str = "",
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GetUserInstructions does not support async")
+        return self._run(tool_input)
 
 
 class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -225,6 +272,7 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     """
     db_scan: List[TableDescription]
     embedding: OpenAIEmbeddings
+    storage: Any = Field(exclude=True, default=None)
     few_shot_examples: List[dict] | None = Field(exclude=True, default=None)
 
     def get_embedding(
@@ -234,16 +282,24 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
         text = text.replace("\n", " ")
         return self.embedding.embed_query(text)
 
+    async def aget_embedding(
+        self,
+        text: str,
+    ) -> List[float]:
+        text = text.replace("\n", " ")
+        return await self.embedding.aembed_query(text)
+
     def get_docs_embedding(
         self,
         docs: List[str],
-    ) -> List[List[float]]:
-        return self.embedding.embed_documents(docs)
-
-    def cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        return round(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)), 4)
+    ) -> np.ndarray:
+        return TableEmbeddingCache(self.storage, self.embedding).embedding_matrix(
+            self.db_scan, docs
+        )
 
-    def similar_tables_based_on_few_shot_examples(self, df: pd.DataFrame) -> List[str]:
+    def similar_tables_based_on_few_shot_examples(
+        self, ranked_tables: List[Tuple[str | None, str, float]]
+    ) -> Set[Tuple[str | None, str]]:
         most_similar_tables = set()
         if self.few_shot_examples is not None:
             for example in self.few_shot_examples:
@@ -251,77 +307,90 @@ class TablesSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
                     tables = Parser(example["sql"]).tables
                 except Exception as e:
                     logger.error(f"Error parsing SQL: {str(e)}")
+                    continue
                 for table in tables:
-                    found_tables = df[df.table_name == table]
-                    for _, row in found_tables.iterrows():
-                        most_similar_tables.add((row["schema_name"], row["table_name"]))
-            df.drop(
-                df[
-                    df.table_name.isin([table[1] for table in most_similar_tables])
-                ].index,
-                inplace=True,
-            )
+                    for schema_name, table_name, _ in ranked_tables:
+                        if table_name == table:
+                            most_similar_tables.add((schema_name, table_name))
         return most_similar_tables
 
+    def get_table_representation(self, table: TableDescription) -> str:
+        col_rep = ""
+        for column in table.columns:
+            if column.description is not None:
+                col_rep += f"{column.name}: {column.description}, "
+            else:
+                col_rep += f"{column.name}, "
+        if table.description is not None:
+            return f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
+        return f"Table {table.table_name} contain columns: [{col_rep}]"
+
     @catch_exceptions()
-    def _run(  # noqa: PLR0912
+    @memoize()
+    def _run(
         self,
         user_question: str,
         run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
         """Use the concatenation of table name, columns names, and the description of the table as the table representation"""
         question_embedding = self.get_embedding(user_question)
-        table_representations = []
-        for table in self.db_scan:
-            col_rep = ""
-            for column in table.columns:
-                if column.description is not None:
-                    col_rep += f"{column.name}: {column.description}, "
-                else:
-                    col_rep += f"{column.name}, "
-            if table.description is not None:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}], this tables has: {table.description}"
-            else:
-                table_rep = f"Table {table.table_name} contain columns: [{col_rep}]"
-            table_representations.append(
-                [table.schema_name, table.table_name, table_rep]
-            )
-        df = pd.DataFrame(
-            table_representations,
-            columns=["schema_name", "table_name", "table_representation"],
+        table_embeddings = self.get_docs_embedding(
+            [self.get_table_representation(table) for table in self.db_scan]
+        )
+        return self.rank_tables(question_embedding, table_embeddings)
+
+    @catch_exceptions()
+    @memoize()
+    async def _arun(
+        self,
+        user_question: str = "",
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
+    ) -> str:
+        question_embedding = await self.aget_embedding(user_question)
+        # The cached table embeddings are read from and written to the storage
+        table_embeddings = await run_in_executor(
+            None,
+            self.get_docs_embedding,
+            [self.get_table_representation(table) for table in self.db_scan],
         )
-        df["table_embedding"] = self.get_docs_embedding(df.table_representation)
-        df["similarities"] = df.table_embedding.apply(
-            lambda x: self.cosine_similarity(x, question_embedding)
+        return self.rank_tables(question_embedding, table_embeddings)
+
+    def rank_tables(
+        self, question_embedding: List[float], table_embeddings: np.ndarray
+    ) -> str:
+        ranked_tables = [
+            (
+                self.db_scan[index].schema_name,
+                self.db_scan[index].table_name,
+                round(similarity, 4),
+            )
+            for index, similarity in top_k_similarities(
+                table_embeddings, question_embedding, TOP_TABLES
+            )
+        ]
+        most_similar_tables = self.similar_tables_based_on_few_shot_examples(
+            ranked_tables
         )
-        df = df.sort_values(by="similarities", ascending=False)
-        df = df.head(TOP_TABLES)
-        most_similar_tables = self.similar_tables_based_on_few_shot_examples(df)
+        most_similar_table_names = {table[1] for table in most_similar_tables}
+        ranked_tables = [
+            table for table in ranked_tables if table[1] not in most_similar_table_names
+        ]
         table_relevance = ""
-        for _, row in df.iterrows():
-            if row["schema_name"] is not None:
-                table_name = row["schema_name"] + "." + row["table_name"]
-            else:
-                table_name = row["table_name"]
-            table_relevance += (
-                f'Table: `{table_name}`, relevance score: {row["similarities"]}\n'
-            )
+        for schema_name, name, similarity in ranked_tables:
+            table_name = schema_name + "." + name if schema_name is not None else name
+            table_relevance += f"Table: `{table_name}`, relevance score: {similarity}\n"
         if len(most_similar_tables) > 0:
+            max_similarity = max([table[2] for table in ranked_tables], default=1.0)
             for table in most_similar_tables:
                 if table[0] is not None:
                     table_name = table[0] + "." + table[1]
                 else:
                     table_name = table[1]
-                table_relevance += f"Table: `{table_name}`, relevance score: {max(df['similarities'])}\n"
+                table_relevance += (
+                    f"Table: `{table_name}`, relevance score: {max_similarity}\n"
+                )
         return table_relevance
 
-    async def _arun(
-        self,
-        user_question: str = "",
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
-    ) -> str:
-        raise NotImplementedError("TablesSQLDatabaseTool does not support async")
-
 
 class ColumnEntityChecker(BaseSQLDatabaseTool, BaseTool):
     """Tool for checking the existance of an entity inside a column."""
@@ -336,6 +405,7 @@ class ColumnEntityChecker(BaseSQLDatabaseTool, BaseTool):
     """
     db_scan: List[TableDescription]
     is_multiple_schema: bool
+    storage: Any = Field(exclude=True, default=None)
 
     def find_similar_strings(
         self, input_list: List[tuple], target_string: str, threshold=0.4
@@ -350,7 +420,23 @@ class ColumnEntityChecker(BaseSQLDatabaseTool, BaseTool):
         similar_strings.sort(key=lambda x: x[1], reverse=True)
         return similar_strings[:25]
 
+    def get_value_index(self, table_name: str, column_name: str) -> ValueIndex | None:
+        """Returns the value index the scanner built for the column, if any"""
+        schema_name = None
+        if "." in table_name:
+            schema_name, table_name = table_name.rsplit(".", 1)
+        table = self.get_schema_index().find_table(table_name, schema_name)
+        if table is None:
+            return None
+        return ColumnValueIndexCache(self.storage).get(
+            table.db_connection_id,
+            table.table_name,
+            column_name,
+            table.schema_name,
+        )
+
     @catch_exceptions()
+    @memoize()
     def _run(
         self,
         tool_input: str,
@@ -367,6 +453,30 @@ class ColumnEntityChecker(BaseSQLDatabaseTool, BaseTool):
                 )
         except ValueError:
             return "Invalid input format, use following format: table_name -> column_name, entity (entity should be a string without ',')"
+        value_index = self.get_value_index(table_name, column_name)
+        if value_index is not None:
+            results = value_index.similar(entity.strip())
+            search_results = [(value,) for value in value_index.containing(entity)]
+        else:
+            results, search_results = self.search_column(
+                table_name, column_name, entity
+            )
+        similar_items = "Similar items:\n"
+        already_added = {}
+        for item in results:
+            similar_items += f"{item[0]}\n"
+            already_added[item[0]] = True
+        if len(search_results) > 0:
+            for item in search_results:
+                if item[0] not in already_added:
+                    similar_items += f"{item[0]}\n"
+        return similar_items
+
+    def search_column(
+        self, table_name: str, column_name: str, entity: str
+    ) -> Tuple[List[tuple], List[tuple]]:
+        """Looks up the entity in the column itself, used for the columns without a
+        value index"""
         search_pattern = f"%{entity.strip().lower()}%"
         search_query = f"SELECT DISTINCT {column_name} FROM {table_name} WHERE {column_name} ILIKE :search_pattern"  # noqa: S608
         try:
@@ -380,24 +490,14 @@ class ColumnEntityChecker(BaseSQLDatabaseTool, BaseTool):
             f"SELECT DISTINCT {column_name} FROM {table_name}"  # noqa: S608
         )
         results = self.db.engine.execute(distinct_query).fetchall()
-        results = self.find_similar_strings(results, entity)
-        similar_items = "Similar items:\n"
-        already_added = {}
-        for item in results:
-            similar_items += f"{item[0]}\n"
-            already_added[item[0]] = True
-        if len(search_results) > 0:
-            for item in search_results:
-                if item[0] not in already_added:
-                    similar_items += f"{item[0]}\n"
-        return similar_items
+        return self.find_similar_strings(results, entity), search_results
 
     async def _arun(
         self,
         tool_input: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("ColumnEntityChecker does not support async")
+        return await run_in_executor(None, self._run, tool_input)
 
 
 class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
@@ -412,9 +512,12 @@ class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
     Example Input: table1, table2, table3
     """
     db_scan: List[TableDescription]
+    question: str | None = None
+    schema_budget_stats: SchemaBudgetStats | None = Field(exclude=True, default=None)
 
     @catch_exceptions()
-    def _run(  # noqa: C901
+    @memoize()
+    def _run(
         self,
         table_names: str,
         run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
@@ -428,35 +531,30 @@ class SchemaSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):
                 processed_table_names.append(formatted_table.split(".")[1])
             else:
                 processed_table_names.append(formatted_table)
-        tables_schema = "```sql\n"
-        for table in self.db_scan:
-            if table.table_name in processed_table_names:
-                tables_schema += table.table_schema + "\n"
-                descriptions = []
-                if table.description is not None:
-                    if table.schema_name:
-                        table_name = f"{table.schema_name}.{table.table_name}"
-                    else:
-                        table_name = table.table_name
-                    descriptions.append(f"Table `{table_name}`: {table.description}\n")
-                    for column in table.columns:
-                        if column.description is not None:
-                            descriptions.append(
-                                f"Column `{column.name}`: {column.description}\n"
-                            )
-                if len(descriptions) > 0:
-                    tables_schema += f"/*\n{''.join(descriptions)}*/\n"
-        tables_schema += "```\n"
-        if tables_schema == "":
-            tables_schema += "Tables not found in the database"
-        return tables_schema
+        schema_index = self.get_schema_index()
+        tables = schema_index.find_tables(processed_table_names)
+        if SCHEMA_TOKEN_BUDGET > 0:
+            schemas = [
+                render_budgeted_schema(
+                    schema_index.tables[table.position],
+                    self.question,
+                    SCHEMA_TOKEN_BUDGET,
+                )
+                for table in tables
+            ]
+            if self.schema_budget_stats is not None:
+                self.schema_budget_stats.record(schemas)
+            snippets = [schema.snippet for schema in schemas]
+        else:
+            snippets = [table.schema_snippet for table in tables]
+        return "```sql\n" + "".join(snippets) + "```\n"
 
     async def _arun(
         self,
-        table_name: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        table_names: str,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("SchemaSQLDatabaseTool does not support async")
+        return self._run(table_names)
 
 
 class InfoRelevantColumns(BaseSQLDatabaseTool, BaseTool):
@@ -473,7 +571,8 @@ class InfoRelevantColumns(BaseSQLDatabaseTool, BaseTool):
     db_scan: List[TableDescription]
 
     @catch_exceptions()
-    def _run(  # noqa: C901, PLR0912
+    @memoize()
+    def _run(
         self,
         column_names: str,
         run_manager: CallbackManagerForToolRun | None = None,  # noqa: ARG002
@@ -489,25 +588,11 @@ class InfoRelevantColumns(BaseSQLDatabaseTool, BaseTool):
                 table_name = replace_unprocessable_characters(table_name)
                 column_name = replace_unprocessable_characters(column_name)
                 found = False
-                for table in self.db_scan:
-                    if table_name == table.table_name:
-                        col_info = ""
-                        for column in table.columns:
-                            if column_name == column.name:
-                                found = True
-                                col_info += f"Description: {column.description},"
-                                if column.low_cardinality:
-                                    col_info += f" categories = {column.categories},"
-                        col_info += " Sample rows: "
-                        if found:
-                            for row in table.examples:
-                                col_info += row[column_name] + ", "
-                            col_info = col_info[:-2]
-                            if table.schema_name:
-                                schema_table = f"{table.schema_name}.{table.table_name}"
-                            else:
-                                schema_table = table.table_name
-                            column_full_info += f"Table: {schema_table}, column: {column_name}, additional info: {col_info}\n"
+                for column in self.get_schema_index().find_columns(
+                    table_name, column_name
+                ):
+                    found = True
+                    column_full_info += column.column_info
             else:
                 return "Malformed input, input should be in the following format Example Input: table1 -> column1, table1 -> column2, table2 -> column1"  # noqa: E501
             if not found:
@@ -516,10 +601,10 @@ class InfoRelevantColumns(BaseSQLDatabaseTool, BaseTool):
 
     async def _arun(
         self,
-        table_name: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        column_names: str,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("InfoRelevantColumnsTool does not support async")
+        return self._run(column_names)
 
 
 class GetFewShotExamples(BaseSQLDatabaseTool, BaseTool):
@@ -558,9 +643,9 @@ class GetFewShotExamples(BaseSQLDatabaseTool, BaseTool):
     async def _arun(
         self,
         number_of_samples: str,
-        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,  # noqa: ARG002
     ) -> str:
-        raise NotImplementedError("GetFewShotExamplesTool does not support async")
+        return self._run(number_of_samples)
 
 
 class SQLDatabaseToolkit(BaseToolkit):
@@ -572,6 +657,14 @@ class SQLDatabaseToolkit(BaseToolkit):
     instructions: List[dict] | None = Field(exclude=True, default=None)
     db_scan: List[TableDescription] = Field(exclude=True)
     embedding: OpenAIEmbeddings = Field(exclude=True)
+    executed_queries: Any = Field(exclude=True, default=None)
+    db_connection_id: str | None = Field(exclude=True, default=None)
+    result_cache_stats: Any = Field(exclude=True, default=None)
+    storage: Any = Field(exclude=True, default=None)
+    memo: ToolMemo | None = Field(exclude=True, default=None)
+    schema_index: SchemaIndex | None = Field(exclude=True, default=None)
+    question: str | None = Field(exclude=True, default=None)
+    schema_budget_stats: SchemaBudgetStats | None = Field(exclude=True, default=None)
     is_multiple_schema: bool = False
 
     @property
@@ -586,8 +679,16 @@ class SQLDatabaseToolkit(BaseToolkit):
 
     def get_tools(self) -> List[BaseTool]:
         """Get the tools in the toolkit."""
+        schema_index = self.schema_index or SchemaIndex(self.db_scan)
         tools = []
-        query_sql_db_tool = QuerySQLDataBaseTool(db=self.db, context=self.context)
+        query_sql_db_tool = QuerySQLDataBaseTool(
+            db=self.db,
+            context=self.context,
+            executed_queries=self.executed_queries,
+            db_connection_id=self.db_connection_id,
+            result_cache_stats=self.result_cache_stats,
+            memo=self.memo,
+        )
         tools.append(query_sql_db_tool)
         if self.instructions is not None:
             tools.append(
@@ -602,22 +703,37 @@ class SQLDatabaseToolkit(BaseToolkit):
             context=self.context,
             db_scan=self.db_scan,
             embedding=self.embedding,
+            storage=self.storage,
             few_shot_examples=self.few_shot_examples,
+            memo=self.memo,
         )
         tools.append(tables_sql_db_tool)
         schema_sql_db_tool = SchemaSQLDatabaseTool(
-            db=self.db, context=self.context, db_scan=self.db_scan
+            db=self.db,
+            context=self.context,
+            db_scan=self.db_scan,
+            schema_index=schema_index,
+            question=self.question,
+            schema_budget_stats=self.schema_budget_stats,
+            memo=self.memo,
         )
         tools.append(schema_sql_db_tool)
         info_relevant_tool = InfoRelevantColumns(
-            db=self.db, context=self.context, db_scan=self.db_scan
+            db=self.db,
+            context=self.context,
+            db_scan=self.db_scan,
+            schema_index=schema_index,
+            memo=self.memo,
         )
         tools.append(info_relevant_tool)
         column_sample_tool = ColumnEntityChecker(
             db=self.db,
             context=self.context,
             db_scan=self.db_scan,
+            schema_index=schema_index,
             is_multiple_schema=self.is_multiple_schema,
+            storage=self.storage,
+            memo=self.memo,
         )
         tools.append(column_sample_tool)
         if self.few_shot_examples is not None:
@@ -710,77 +826,76 @@ class DataheraldSQLAgent(SQLGenerator):
             **(agent_executor_kwargs or {}),
         )
 
-    @override
-    def generate_response(  # noqa: PLR0912
+    def create_embedding(
+        self, database_connection: DatabaseConnection
+    ) -> OpenAIEmbeddings:
+        # Set Embeddings class depending on azure / not azure
+        if self.system.settings["azure_api_key"] is not None:
+            return AzureOpenAIEmbeddings(
+                openai_api_key=database_connection.decrypt_api_key(),
+                model=EMBEDDING_MODEL,
+            )
+        return OpenAIEmbeddings(
+            openai_api_key=database_connection.decrypt_api_key(),
+            model=EMBEDDING_MODEL,
+        )
+
+    def create_agent_executor(
         self,
         user_prompt: Prompt,
         database_connection: DatabaseConnection,
         context: List[dict] = None,
-        metadata: dict = None,
-    ) -> SQLGeneration:  # noqa: PLR0912
+    ) -> Tuple[AgentExecutor, int]:
+        """Loads the scanned tables and the context of the question and builds the agent,
+        returns it with the number of few shot examples it was given."""
         context_store = self.system.instance(ContextStore)
         storage = self.system.instance(DB)
-        response = SQLGeneration(
-            prompt_id=user_prompt.id,
-            llm_config=self.llm_config,
-            created_at=datetime.datetime.now(),
-        )
         self.llm = self.model.get_model(
             database_connection=database_connection,
             temperature=0,
             model_name=self.llm_config.llm_name,
             api_base=self.llm_config.api_base,
         )
-        repository = TableDescriptionRepository(storage)
-        db_scan = repository.get_all_tables_by_db(
+        logger.info(f"Generating SQL response to question: {str(user_prompt.dict())}")
+        # None of the stages depend on each other, the setup takes as long as the slowest
+        results, self.stage_timings = self.run_stages(
             {
-                "db_connection_id": str(database_connection.id),
-                "status": TableDescriptionStatus.SCANNED.value,
+                "db_scan": lambda: SchemaIndex(
+                    self.load_db_scan(storage, database_connection, user_prompt)
+                ),
+                "context": lambda: context_store.retrieve_context_for_question(
+                    user_prompt, number_of_samples=self.max_number_of_examples
+                ),
+                "database": lambda: SQLDatabase.get_sql_engine(database_connection),
+                "embedding": lambda: self.create_embedding(database_connection),
             }
         )
-        if not db_scan:
-            raise ValueError("No scanned tables found for database")
-        db_scan = SQLGenerator.filter_tables_by_schema(
-            db_scan=db_scan, prompt=user_prompt
-        )
-        few_shot_examples, instructions = context_store.retrieve_context_for_question(
-            user_prompt, number_of_samples=self.max_number_of_examples
-        )
+        few_shot_examples, instructions = results["context"]
         if few_shot_examples is not None:
             new_fewshot_examples = self.remove_duplicate_examples(few_shot_examples)
             number_of_samples = len(new_fewshot_examples)
         else:
             new_fewshot_examples = None
             number_of_samples = 0
-        logger.info(f"Generating SQL response to question: {str(user_prompt.dict())}")
-        self.database = SQLDatabase.get_sql_engine(database_connection)
-        # Set Embeddings class depending on azure / not azure
-        if self.system.settings["azure_api_key"] is not None:
-            toolkit = SQLDatabaseToolkit(
-                db=self.database,
-                context=context,
-                few_shot_examples=new_fewshot_examples,
-                instructions=instructions,
-                is_multiple_schema=True if user_prompt.schemas else False,
-                db_scan=db_scan,
-                embedding=AzureOpenAIEmbeddings(
-                    openai_api_key=database_connection.decrypt_api_key(),
-                    model=EMBEDDING_MODEL,
-                ),
-            )
-        else:
-            toolkit = SQLDatabaseToolkit(
-                db=self.database,
-                context=context,
-                few_shot_examples=new_fewshot_examples,
-                instructions=instructions,
-                is_multiple_schema=True if user_prompt.schemas else False,
-                db_scan=db_scan,
-                embedding=OpenAIEmbeddings(
-                    openai_api_key=database_connection.decrypt_api_key(),
-                    model=EMBEDDING_MODEL,
-                ),
-            )
+        self.database = results["database"]
+        SQLResultCache.remove_invalidated(database_connection.id, storage)
+        toolkit = SQLDatabaseToolkit(
+            db=self.database,
+            executed_queries=self.executed_queries,
+            memo=self.tool_memo,
+            db_connection_id=database_connection.id,
+            result_cache_stats=self.sql_result_cache_stats,
+            question=user_prompt.text,
+            schema_budget_stats=self.schema_budget_stats,
+            context=context,
+            few_shot_examples=new_fewshot_examples,
+            instructions=instructions,
+            is_multiple_schema=True if user_prompt.schemas else False,
+            db_scan=results["db_scan"].tables,
+            schema_index=results["db_scan"],
+            storage=storage,
+            embedding=results["embedding"],
+        )
         agent_executor = self.create_sql_agent(
             toolkit=toolkit,
             verbose=True,
@@ -790,25 +905,15 @@ class DataheraldSQLAgent(SQLGenerator):
         )
         agent_executor.return_intermediate_steps = True
         agent_executor.handle_parsing_errors = ERROR_PARSING_MESSAGE
-        with get_openai_callback() as cb:
-            try:
-                result = agent_executor.invoke(
-                    {"input": user_prompt.text}, {"metadata": metadata}
-                )
-                result = self.check_for_time_out_or_tool_limit(result)
-            except SQLInjectionError as e:
-                raise SQLInjectionError(e) from e
-            except EngineTimeOutORItemLimitError as e:
-                raise EngineTimeOutORItemLimitError(e) from e
-            except Exception as e:
-                return SQLGeneration(
-                    prompt_id=user_prompt.id,
-                    tokens_used=cb.total_tokens,
-                    completed_at=datetime.datetime.now(),
-                    sql="",
-                    status="INVALID",
-                    error=str(e),
-                )
+        return agent_executor, number_of_samples
+
+    def complete_response(
+        self,
+        response: SQLGeneration,
+        result: dict,
+        number_of_samples: int,
+        cb: OpenAICallbackHandler,
+    ) -> SQLGeneration:
         sql_query = ""
         if "```sql" in result["output"]:
             sql_query = self.remove_markdown(result["output"])
@@ -820,6 +925,8 @@ class DataheraldSQLAgent(SQLGenerator):
         response.sql = replace_unprocessable_characters(sql_query)
         response.tokens_used = cb.total_tokens
         response.completed_at = datetime.datetime.now()
+        response.stage_timings = self.stage_timings
+        self.report_tool_stats(response)
         if number_of_samples > 0:
             suffix = SUFFIX_WITH_FEW_SHOT_SAMPLES
         else:
@@ -833,13 +940,92 @@ class DataheraldSQLAgent(SQLGenerator):
             response,
         )
 
+    @override
+    def generate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            llm_config=self.llm_config,
+            created_at=datetime.datetime.now(),
+        )
+        agent_executor, number_of_samples = self.create_agent_executor(
+            user_prompt, database_connection, context
+        )
+        with get_openai_callback() as cb:
+            try:
+                result = agent_executor.invoke(
+                    {"input": user_prompt.text}, {"metadata": metadata}
+                )
+                result = self.check_for_time_out_or_tool_limit(result)
+            except SQLInjectionError as e:
+                raise SQLInjectionError(e) from e
+            except EngineTimeOutORItemLimitError as e:
+                raise EngineTimeOutORItemLimitError(e) from e
+            except Exception as e:
+                return SQLGeneration(
+                    prompt_id=user_prompt.id,
+                    tokens_used=cb.total_tokens,
+                    completed_at=datetime.datetime.now(),
+                    sql="",
+                    status="INVALID",
+                    error=str(e),
+                    stage_timings=self.stage_timings,
+                )
+        return self.complete_response(response, result, number_of_samples, cb)
+
+    @override
+    async def agenerate_response(
+        self,
+        user_prompt: Prompt,
+        database_connection: DatabaseConnection,
+        context: List[dict] = None,
+        metadata: dict = None,
+    ) -> SQLGeneration:
+        response = SQLGeneration(
+            prompt_id=user_prompt.id,
+            llm_config=self.llm_config,
+            created_at=datetime.datetime.now(),
+        )
+        agent_executor, number_of_samples = await asyncio.to_thread(
+            self.create_agent_executor, user_prompt, database_connection, context
+        )
+        with get_openai_callback() as cb:
+            try:
+                result = await agent_executor.ainvoke(
+                    {"input": user_prompt.text}, {"metadata": metadata}
+                )
+                result = self.check_for_time_out_or_tool_limit(result)
+            except SQLInjectionError as e:
+                raise SQLInjectionError(e) from e
+            except EngineTimeOutORItemLimitError as e:
+                raise EngineTimeOutORItemLimitError(e) from e
+            except Exception as e:
+                return SQLGeneration(
+                    prompt_id=user_prompt.id,
+                    tokens_used=cb.total_tokens,
+                    completed_at=datetime.datetime.now(),
+                    sql="",
+                    status="INVALID",
+                    error=str(e),
+                    stage_timings=self.stage_timings,
+                )
+        # Validating the SQL can run it against the database
+        return await asyncio.to_thread(
+            self.complete_response, response, result, number_of_samples, cb
+        )
+
     @override
     def stream_response(
         self,
         user_prompt: Prompt,
         database_connection: DatabaseConnection,
         response: SQLGeneration,
-        queue: Queue,
+        queue: StreamChannel,
         metadata: dict = None,
     ):
         context_store = self.system.instance(ContextStore)
@@ -874,27 +1060,24 @@ class DataheraldSQLAgent(SQLGenerator):
             new_fewshot_examples = None
             number_of_samples = 0
         self.database = SQLDatabase.get_sql_engine(database_connection)
-        # Set Embeddings class depending on azure / not azure
-        if self.system.settings["azure_api_key"] is not None:
-            embedding = AzureOpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-        else:
-            embedding = OpenAIEmbeddings(
-                openai_api_key=database_connection.decrypt_api_key(),
-                model=EMBEDDING_MODEL,
-            )
-            toolkit = SQLDatabaseToolkit(
-                queuer=queue,
-                db=self.database,
-                context=[{}],
-                few_shot_examples=new_fewshot_examples,
-                instructions=instructions,
-                is_multiple_schema=True if user_prompt.schemas else False,
-                db_scan=db_scan,
-                embedding=embedding,
-            )
+        SQLResultCache.remove_invalidated(database_connection.id, storage)
+        embedding = self.create_embedding(database_connection)
+        toolkit = SQLDatabaseToolkit(
+            queuer=queue,
+            db=self.database,
+            memo=self.tool_memo,
+            db_connection_id=database_connection.id,
+            result_cache_stats=self.sql_result_cache_stats,
+            question=user_prompt.text,
+            schema_budget_stats=self.schema_budget_stats,
+            context=[{}],
+            few_shot_examples=new_fewshot_examples,
+            instructions=instructions,
+            is_multiple_schema=True if user_prompt.schemas else False,
+            db_scan=db_scan,
+            storage=storage,
+            embedding=embedding,
+        )
         agent_executor = self.create_sql_agent(
             toolkit=toolkit,
             verbose=True,
@@ -1,3 +1,4 @@
+import os
 from datetime import date, datetime
 from decimal import Decimal
 
@@ -6,12 +7,12 @@ from langchain.prompts.chat import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
 )
-from sqlalchemy import text
 
 from dataherald.model.chat_model import ChatModel
 from dataherald.repositories.database_connections import DatabaseConnectionRepository
 from dataherald.repositories.prompts import PromptRepository
 from dataherald.sql_database.base import SQLDatabase, SQLInjectionError
+from dataherald.sql_database.result_snapshots import ResultSnapshots
 from dataherald.types import LLMConfig, NLGeneration, SQLGeneration
 
 HUMAN_TEMPLATE = """Given a Question, a Sql query and the sql query result try to answer the question
@@ -48,7 +49,7 @@ class GeneratesNlAnswer:
             model_name=self.llm_config.llm_name,
             api_base=self.llm_config.api_base,
         )
-        database = SQLDatabase.get_sql_engine(database_connection, True)
+        database = SQLDatabase.get_sql_engine(database_connection)
 
         if sql_generation.status == "INVALID":
             return NLGeneration(
@@ -58,14 +59,17 @@ class GeneratesNlAnswer:
             )
 
         try:
-            query = database.parser_to_filter_commands(sql_generation.sql)
-            with database._engine.connect() as connection:
-                execution = connection.execute(text(query))
-                result = execution.fetchmany(top_k)
+            result = ResultSnapshots.fetch(
+                database,
+                sql_generation.id,
+                sql_generation.sql,
+                top_k,
+                timeout=int(os.environ.get("DH_ENGINE_TIMEOUT", "150")),
+            ).records(top_k)
             rows = []
             for row in result:
                 modified_row = {}
-                for key, value in zip(row.keys(), row, strict=True):
+                for key, value in row.items():
                     if type(value) in [
                         date,
                         datetime,
@@ -0,0 +1,106 @@
+import inspect
+from collections import defaultdict
+from functools import wraps
+from threading import Lock
+from typing import Any, Callable
+
+from dataherald.sql_database.base import SQLDatabase
+
+SQL_TOOLS = {"SqlDbQuery"}
+# Returned by the SQL tools instead of raising when a query times out
+SQL_TIMEOUT_OBSERVATION = (
+    "SQL query execution time exceeded, proceed without query execution"
+)
+# Failures the tools report as observations, they are not stored either
+ERROR_OBSERVATIONS = {SQL_TIMEOUT_OBSERVATION}
+
+
+def normalize_tool_input(tool_name: str, tool_input: str) -> str:
+    tool_input = str(tool_input).strip()
+    if tool_name not in SQL_TOOLS:
+        return tool_input
+    return SQLDatabase.fingerprint_sql(tool_input)
+
+
+def first_input(args: tuple, kwargs: dict) -> str:
+    """The input of a tool call, tools with an args schema get it as a keyword"""
+    if args:
+        return args[0]
+    inputs = [value for key, value in kwargs.items() if key != "run_manager"]
+    return inputs[0] if inputs else ""
+
+
+class ToolMemo:
+    """Observations of the deterministic tools during one generation, keyed by tool name
+    and normalized input. Calls that raise or return one of the ERROR_OBSERVATIONS are
+    not stored.
+
+    Every lookup is recorded in call order so the intermediate steps can be marked as
+    answered from the memo.
+    """
+
+    def __init__(self):
+        self.observations = {}
+        self.lookups = defaultdict(list)
+        self.hits = 0
+        self._lock = Lock()
+
+    def get(self, tool_name: str, tool_input: str) -> str | None:
+        key = (tool_name, normalize_tool_input(tool_name, tool_input))
+        with self._lock:
+            observation = self.observations.get(key)
+            self.lookups[key].append(observation is not None)
+            if observation is not None:
+                self.hits += 1
+            return observation
+
+    def set(self, tool_name: str, tool_input: str, observation: str) -> None:
+        if observation in ERROR_OBSERVATIONS:
+            return
+        key = (tool_name, normalize_tool_input(tool_name, tool_input))
+        with self._lock:
+            self.observations[key] = observation
+
+    def was_hit(self, tool_name: str, tool_input: str) -> bool:
+        """Pops the oldest lookup of the step, True if it was answered from the memo"""
+        key = (tool_name, normalize_tool_input(tool_name, tool_input))
+        with self._lock:
+            lookups = self.lookups.get(key)
+            return lookups.pop(0) if lookups else False
+
+
+def memoize():
+    """Answers repeated calls of a tool from its `memo` field. Goes under
+    catch_exceptions, so errors are returned to the agent but never stored, and neither
+    are the timeouts the tools return as observations."""
+
+    def decorator(fn: Callable[..., str]) -> Callable[..., str]:
+        if inspect.iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(self: Any, *args: Any, **kwargs: Any) -> str:
+                if self.memo is None:
+                    return await fn(self, *args, **kwargs)
+                tool_input = first_input(args, kwargs)
+                observation = self.memo.get(self.name, tool_input)
+                if observation is None:
+                    observation = await fn(self, *args, **kwargs)
+                    self.memo.set(self.name, tool_input, observation)
+                return observation
+
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> str:
+            if self.memo is None:
+                return fn(self, *args, **kwargs)
+            tool_input = first_input(args, kwargs)
+            observation = self.memo.get(self.name, tool_input)
+            if observation is None:
+                observation = fn(self, *args, **kwargs)
+                self.memo.set(self.name, tool_input, observation)
+            return observation
+
+        return wrapper
+
+    return decorator
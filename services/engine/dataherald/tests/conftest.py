@@ -1,9 +1,15 @@
+import os
+
 import pytest
 from sqlalchemy import create_engine
 
 
 @pytest.fixture(scope="session", autouse=True)
-def execute_before_any_test():
+def execute_before_any_test(tmp_path_factory):
+    # The tests connect to sqlite:///mydb2.db, relative to a temporary directory so the
+    # database is not written to the source tree
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("sqlite"))
     engine = create_engine("sqlite:///mydb2.db")
     try:
         engine.execute(
@@ -12,3 +18,5 @@ def execute_before_any_test():
         )
     except Exception:
         pass
+    yield
+    os.chdir(cwd)
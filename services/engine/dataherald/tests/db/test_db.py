@@ -1,5 +1,6 @@
 from bson.objectid import ObjectId
 from overrides import override
+from pymongo import DESCENDING
 
 from dataherald.config import System
 from dataherald.db import DB
@@ -28,6 +29,25 @@ class TestDB(DB):
             }
         ]
 
+    @staticmethod
+    def matches(row: dict, query: dict) -> bool:
+        """Evaluates the operators the repositories filter with: equality, $in, $lt and
+        $or"""
+        for field, condition in query.items():
+            value = row.get(field)
+            if field == "$or":
+                matched = any(TestDB.matches(row, clause) for clause in condition)
+            elif isinstance(condition, dict):
+                matched = ("$in" not in condition or value in condition["$in"]) and (
+                    "$lt" not in condition
+                    or (value is not None and value < condition["$lt"])
+                )
+            else:
+                matched = value == condition
+            if not matched:
+                return False
+        return True
+
     @override
     def insert_one(self, collection: str, obj: dict) -> int:
         obj["_id"] = ObjectId("651f2d76275132d5b65175eb")
@@ -39,11 +59,50 @@ class TestDB(DB):
         return ObjectId("651f2d76275132d5b65175eb")
 
     @override
-    def find_one(self, collection: str, query: dict) -> dict:  # noqa: ARG002
+    def find_one(
+        self,
+        collection: str,
+        query: dict,  # noqa: ARG002
+        projection: dict | None = None,  # noqa: ARG002
+    ) -> dict:
         if collection in self.memory:
             return self.memory[collection][0]
         return {}
 
+    @override
+    def upsert_many(self, collection: str, key: str, objs: list[dict]) -> int:
+        rows = self.memory.setdefault(collection, [])
+        inserted = 0
+        for obj in objs:
+            row = next((row for row in rows if row.get(key) == obj[key]), None)
+            if row is None:
+                rows.append({"_id": ObjectId(), **obj})
+                inserted += 1
+            else:
+                row.update(obj)
+        return inserted
+
+    @override
+    def find_one_and_update(
+        self,
+        collection: str,
+        query: dict,
+        update: dict,
+        sort: list = None,
+    ) -> dict | None:
+        rows = [
+            row for row in self.memory.get(collection, []) if self.matches(row, query)
+        ]
+        for field, direction in reversed(sort or []):
+            rows.sort(key=lambda row: row.get(field), reverse=direction == DESCENDING)
+        if not rows:
+            return None
+        item = rows[0]
+        item.update(update.get("$set", {}))
+        for field, value in update.get("$inc", {}).items():
+            item[field] = item.get(field, 0) + value
+        return item
+
     @override
     def find_by_id(self, collection: str, id: str) -> dict:
         try:
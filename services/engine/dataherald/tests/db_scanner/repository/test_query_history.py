@@ -0,0 +1,34 @@
+from dataherald.config import Settings, System
+from dataherald.db_scanner.models.types import QueryHistory
+from dataherald.db_scanner.repository.query_history import (
+    DB_COLLECTION,
+    QueryHistoryRepository,
+)
+from dataherald.tests.db.test_db import TestDB
+
+DB_CONNECTION_ID = "64dfa0e103f5134086f7090c"
+
+
+def query_histories(occurrences: int) -> list[QueryHistory]:
+    return [
+        QueryHistory(
+            db_connection_id=DB_CONNECTION_ID,
+            table_name=table_name,
+            query="select * from orders join customers using (customer_id)",
+            user="analyst",
+            occurrences=occurrences,
+        )
+        for table_name in ["orders", "customers"]
+    ]
+
+
+def test_upsert_many_is_idempotent():
+    storage = TestDB(System(Settings()))
+    repository = QueryHistoryRepository(storage)
+
+    assert repository.upsert_many(query_histories(1)) == 2  # noqa: PLR2004
+    assert repository.upsert_many(query_histories(3)) == 0
+
+    rows = storage.memory[DB_COLLECTION]
+    assert sorted(row["table_name"] for row in rows) == ["customers", "orders"]
+    assert {row["occurrences"] for row in rows} == {3}
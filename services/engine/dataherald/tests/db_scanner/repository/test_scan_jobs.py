@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from dataherald.config import Settings, System
+from dataherald.db_scanner.models.types import ScanJob, ScanJobStatus
+from dataherald.db_scanner.repository.scan_jobs import (
+    DB_COLLECTION,
+    ScanJobRepository,
+)
+from dataherald.tests.db.test_db import TestDB
+
+DB_CONNECTION_ID = "64dfa0e103f5134086f7090c"
+LEASE_TIMEOUT = 60
+
+
+def add_scan_job(storage: TestDB, **fields) -> str:
+    row = ScanJob(db_connection_id=DB_CONNECTION_ID, **fields).dict(exclude={"id"})
+    row["_id"] = ObjectId()
+    storage.memory.setdefault(DB_COLLECTION, []).append(row)
+    return str(row["_id"])
+
+
+def test_claim_takes_the_oldest_queued_job():
+    storage = TestDB(System(Settings()))
+    repository = ScanJobRepository(storage)
+    now = datetime.now()
+    add_scan_job(storage, status=ScanJobStatus.SUCCEEDED.value, created_at=now)
+    newer = add_scan_job(storage, created_at=now - timedelta(minutes=1))
+    older = add_scan_job(storage, created_at=now - timedelta(minutes=2))
+
+    assert repository.claim("worker-1", LEASE_TIMEOUT).id == older
+    assert repository.claim("worker-2", LEASE_TIMEOUT).id == newer
+    assert repository.claim("worker-3", LEASE_TIMEOUT) is None
+
+
+def test_claim_takes_over_running_jobs_without_heartbeats():
+    storage = TestDB(System(Settings()))
+    repository = ScanJobRepository(storage)
+    now = datetime.now()
+    add_scan_job(
+        storage,
+        status=ScanJobStatus.RUNNING.value,
+        worker_id="worker-1",
+        heartbeat_at=now,
+    )
+    stale = add_scan_job(
+        storage,
+        status=ScanJobStatus.RUNNING.value,
+        worker_id="worker-2",
+        heartbeat_at=now - timedelta(seconds=LEASE_TIMEOUT * 2),
+    )
+
+    scan_job = repository.claim("worker-3", LEASE_TIMEOUT)
+    assert scan_job.id == stale
+    assert scan_job.worker_id == "worker-3"
+    assert repository.heartbeat(stale, "worker-2") is None
+    assert repository.heartbeat(stale, "worker-3").id == stale
+
+
+def test_cancel_only_stops_unfinished_jobs():
+    storage = TestDB(System(Settings()))
+    repository = ScanJobRepository(storage)
+    queued = add_scan_job(storage)
+    finished = add_scan_job(storage, status=ScanJobStatus.FAILED.value)
+
+    assert repository.cancel(finished) is None
+    assert repository.cancel(queued).status == ScanJobStatus.CANCELLED.value
+    assert repository.finish(queued, ScanJobStatus.SUCCEEDED.value) is None
+    assert repository.claim("worker-1", LEASE_TIMEOUT) is None
@@ -0,0 +1,297 @@
+from sqlalchemy import create_engine
+
+from dataherald.config import Settings, System
+from dataherald.db_scanner import sqlalchemy as sqlalchemy_scanner
+from dataherald.db_scanner.models.types import (
+    ColumnDetail,
+    TableDescription,
+    TableDescriptionStatus,
+)
+from dataherald.db_scanner.services import base_scanner
+from dataherald.db_scanner.sqlalchemy import SqlAlchemyScanner
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_generator.dataherald_sqlagent import ColumnEntityChecker
+from dataherald.utils.column_value_index import ColumnValueIndexCache
+
+DB_CONNECTION_ID = "64dfa0e103f5134086f7090c"
+
+
+class FakeStorage:
+    def __init__(self):
+        self.collections = {}
+
+    def find(self, collection, query, sort=None, page=0, limit=0):  # noqa: ARG002
+        return [
+            row
+            for row in self.collections.get(collection, [])
+            if all(row.get(key) == value for key, value in query.items())
+        ]
+
+    def find_one(self, collection, query, projection=None):
+        rows = self.find(collection, query)
+        if rows and projection:
+            return {key: rows[0][key] for key in ["_id", *projection]}
+        return rows[0] if rows else None
+
+    def find_by_id(self, collection, id):
+        return self.find_one(collection, {"_id": id})
+
+    def update_or_create(self, collection, query, obj):
+        row = self.find_one(collection, query)
+        if row:
+            row.update(obj)
+            return row["_id"]
+        rows = self.collections.setdefault(collection, [])
+        rows.append({**obj, "_id": str(len(rows))})
+        return rows[-1]["_id"]
+
+    def delete_by_id(self, collection, id):
+        rows = self.collections.get(collection, [])
+        self.collections[collection] = [row for row in rows if row["_id"] != id]
+        return len(rows) - len(self.collections[collection])
+
+
+class FakeRepository:
+    def __init__(self):
+        self.storage = FakeStorage()
+        self.rows = []
+
+    def save_table_info(self, table_info: TableDescription) -> TableDescription:
+        self.rows.append(table_info)
+        return table_info
+
+    def upsert_many(self, query_histories):
+        return len(query_histories)
+
+
+def test_scan_in_parallel_stores_each_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    tables = ["orders", "customers", "products"]
+    for table in tables:
+        engine.execute(f"CREATE TABLE {table} (id integer, name text)")
+        engine.execute(f"INSERT INTO {table} VALUES (1, 'a')")
+    repository = FakeRepository()
+
+    SqlAlchemyScanner(System(Settings())).scan(
+        SQLDatabase(engine),
+        [
+            TableDescription(db_connection_id=DB_CONNECTION_ID, table_name=table)
+            for table in [*tables, "missing"]
+        ],
+        repository,
+        repository,
+        concurrency=4,
+    )
+
+    statuses = {row.table_name: row.status for row in repository.rows}
+    assert statuses == {
+        "orders": TableDescriptionStatus.SCANNED.value,
+        "customers": TableDescriptionStatus.SCANNED.value,
+        "products": TableDescriptionStatus.SCANNED.value,
+        "missing": TableDescriptionStatus.FAILED.value,
+    }
+
+
+def test_scan_profiles_low_cardinality_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    engine.execute("CREATE TABLE orders (id integer, status text, notes text)")
+    for index in range(150):
+        engine.execute(
+            f"INSERT INTO orders VALUES ({index}, 'status_{index % 3}', '{'x' * 60}')"
+        )
+    repository = FakeRepository()
+
+    SqlAlchemyScanner(System(Settings())).scan(
+        SQLDatabase(engine),
+        [TableDescription(db_connection_id=DB_CONNECTION_ID, table_name="orders")],
+        repository,
+        repository,
+    )
+
+    columns = {column.name: column for column in repository.rows[0].columns}
+    assert sorted(columns["status"].categories) == [
+        "status_0",
+        "status_1",
+        "status_2",
+    ]
+    assert not columns["id"].low_cardinality
+    assert not columns["notes"].low_cardinality
+    assert len(repository.rows[0].examples) == 3  # noqa: PLR2004
+
+
+def test_sampled_profile_checks_the_distinct_values(tmp_path, monkeypatch):
+    monkeypatch.setattr(base_scanner, "SCAN_PROFILE_SAMPLE_ROWS", 50)
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    engine.execute("CREATE TABLE orders (id integer, status text)")
+    for index in range(150):
+        engine.execute(f"INSERT INTO orders VALUES ({index}, 'status_{index % 3}')")
+    columns = (
+        SqlAlchemyScanner(System(Settings()))
+        .reflect_tables(SQLDatabase(engine), ["orders"])
+        .tables["orders"]
+        .columns
+    )
+
+    profiles = base_scanner.BaseScanner().profile_columns(
+        list(columns), SQLDatabase(engine)
+    )
+
+    assert sorted(profiles["status"].categories) == ["status_0", "status_1", "status_2"]
+    assert profiles["id"].categories is None
+    assert profiles["id"].distinct_count is None
+
+
+def test_scan_skips_tables_with_the_same_fingerprint(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        base_scanner.BaseScanner,
+        "get_table_stats",
+        lambda self, table, db_engine: {"rows": 0},  # noqa: ARG005
+    )
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    engine.execute("CREATE TABLE orders (id integer, status text)")
+    scanner = SqlAlchemyScanner(System(Settings()))
+    repository = FakeRepository()
+    table = TableDescription(db_connection_id=DB_CONNECTION_ID, table_name="orders")
+
+    scanner.scan(SQLDatabase(engine), [table], repository, repository)
+    scanned = repository.rows[-1]
+    assert scanned.fingerprint is not None
+
+    scanner.scan(SQLDatabase(engine), [scanned], repository, repository)
+    assert repository.rows[-1].columns == []
+    assert repository.rows[-1].fingerprint == scanned.fingerprint
+
+    scanner.scan(SQLDatabase(engine), [scanned], repository, repository, force=True)
+    assert len(repository.rows[-1].columns) == 2  # noqa: PLR2004
+
+    engine.execute("ALTER TABLE orders ADD COLUMN total integer")
+    scanner.scan(SQLDatabase(engine), [scanned], repository, repository)
+    assert repository.rows[-1].fingerprint != scanned.fingerprint
+    assert len(repository.rows[-1].columns) == 3  # noqa: PLR2004
+
+
+def test_scan_refreshes_the_columns_of_tables_without_stats(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    engine.execute("CREATE TABLE orders (id integer, status text)")
+    scanner = SqlAlchemyScanner(System(Settings()))
+    repository = FakeRepository()
+    table = TableDescription(db_connection_id=DB_CONNECTION_ID, table_name="orders")
+    scanner.scan(SQLDatabase(engine), [table], repository, repository)
+    scanned = repository.rows[-1]
+    assert scanned.fingerprint.stats_hash is None
+
+    schemas = []
+    get_table_schema = scanner.get_table_schema
+    monkeypatch.setattr(
+        scanner,
+        "get_table_schema",
+        lambda **kwargs: schemas.append(kwargs) or get_table_schema(**kwargs),
+    )
+    engine.execute("INSERT INTO orders VALUES (1, 'shipped')")
+    scanner.scan(SQLDatabase(engine), [scanned], repository, repository)
+
+    assert schemas == []
+    assert repository.rows[-1].table_schema == scanned.table_schema
+    assert len(repository.rows[-1].columns) == 2  # noqa: PLR2004
+    assert repository.rows[-1].examples[0]["status"] == "shipped"
+
+
+def test_scan_stops_when_progress_returns_false(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlalchemy_scanner, "SCAN_REFLECTION_BATCH_SIZE", 1)
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    tables = ["orders", "customers", "products"]
+    for table in tables:
+        engine.execute(f"CREATE TABLE {table} (id integer)")
+    repository = FakeRepository()
+    finished = []
+
+    def progress(table: TableDescription, scanned: bool) -> bool:
+        finished.append((table.table_name, scanned))
+        return False
+
+    SqlAlchemyScanner(System(Settings())).scan(
+        SQLDatabase(engine),
+        [
+            TableDescription(db_connection_id=DB_CONNECTION_ID, table_name=table)
+            for table in tables
+        ],
+        repository,
+        repository,
+        progress=progress,
+    )
+
+    assert finished == [("orders", True)]
+    assert [row.table_name for row in repository.rows] == ["orders"]
+
+
+def test_scan_indexes_string_column_values(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    engine.execute("CREATE TABLE customers (id integer, city text, name text)")
+    for index in range(150):
+        city = ["New York", "Newark", "Boston"][index % 3]
+        engine.execute(
+            f"INSERT INTO customers VALUES ({index}, '{city}', 'Customer {index}')"
+        )
+    repository = FakeRepository()
+    SqlAlchemyScanner(System(Settings())).scan(
+        SQLDatabase(engine),
+        [TableDescription(db_connection_id=DB_CONNECTION_ID, table_name="customers")],
+        repository,
+        repository,
+    )
+    indexes = {
+        row["column_name"]: row["values"]
+        for row in repository.storage.find("column_value_indexes", {})
+    }
+    assert sorted(indexes) == ["city", "name"]
+    assert len(indexes["name"]) == 150  # noqa: PLR2004
+
+    # Lookups of indexed columns are answered without querying the table
+    engine.execute("DROP TABLE customers")
+    tool = ColumnEntityChecker(
+        db=SQLDatabase(engine),
+        db_scan=repository.rows,
+        is_multiple_schema=False,
+        storage=repository.storage,
+    )
+    result = tool.run("customers -> city, new york")
+    assert result.splitlines()[:3] == ["Similar items:", "New York", "Newark"]
+    result = tool.run("customers -> name, customer 14")
+    assert result.splitlines()[1] == "Customer 14"
+    assert "Customer 149" in result.splitlines()
+
+    # The values are only loaded the first time, later lookups read the index id
+    loaded = []
+    find_by_id = repository.storage.find_by_id
+    repository.storage.find_by_id = lambda *args: loaded.append(args) or find_by_id(
+        *args
+    )
+    ColumnValueIndexCache._indexes.clear()
+    cache = ColumnValueIndexCache(repository.storage)
+    assert cache.get(DB_CONNECTION_ID, "customers", "city") is cache.get(
+        DB_CONNECTION_ID, "customers", "city"
+    )
+    assert len(loaded) == 1
+
+
+def test_columns_with_many_distinct_values_are_not_indexed(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/scan.db")
+    engine.execute("CREATE TABLE customers (id integer, city text, name text)")
+    engine.execute("INSERT INTO customers VALUES (1, 'Boston', 'Customer 1')")
+    scanner = SqlAlchemyScanner(System(Settings()))
+    meta = scanner.reflect_tables(SQLDatabase(engine), ["customers"])
+    table = TableDescription(
+        db_connection_id=DB_CONNECTION_ID,
+        table_name="customers",
+        columns=[
+            ColumnDetail(name="city"),
+            ColumnDetail(name="name", distinct_count=50_000),
+        ],
+    )
+    storage = FakeStorage()
+
+    scanner.index_column_values(meta, table, SQLDatabase(engine), storage)
+
+    assert [row["column_name"] for row in storage.find("column_value_indexes", {})] == [
+        "city"
+    ]
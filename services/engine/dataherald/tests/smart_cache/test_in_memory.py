@@ -0,0 +1,79 @@
+from dataherald.config import Settings, System
+from dataherald.services.sql_generations import SQLGenerationService
+from dataherald.smart_cache import in_memory
+from dataherald.smart_cache.in_memory import InMemorySmartCache
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.types import Prompt, SQLGeneration
+
+DB_CONNECTION_ID = "64dfa0e103f5134086f7090c"
+TEST_DB = "dataherald.tests.db.test_db.TestDB"
+
+
+def test_exact_match_and_invalidation(monkeypatch):
+    monkeypatch.setattr(in_memory, "SMART_CACHE_SIMILARITY_THRESHOLD", 2.0)
+    smart_cache = InMemorySmartCache(System(Settings(db_impl=TEST_DB)))
+    database_connection = DatabaseConnection(
+        id=DB_CONNECTION_ID, alias="alias", connection_uri="sqlite:///mydb2.db"
+    )
+    prompt = Prompt(text="How many users signed up?", db_connection_id=DB_CONNECTION_ID)
+    smart_cache.add(
+        prompt,
+        SQLGeneration(prompt_id="1", sql="SELECT COUNT(*) FROM users", status="VALID"),
+        database_connection,
+    )
+
+    same_prompt = Prompt(
+        text="  how many users   signed up ", db_connection_id=DB_CONNECTION_ID
+    )
+    cached = smart_cache.lookup(same_prompt, database_connection)
+    assert cached.sql == "SELECT COUNT(*) FROM users"
+    assert smart_cache.lookup(same_prompt, database_connection, "finetuning") is None
+
+    smart_cache.invalidate(DB_CONNECTION_ID)
+    assert smart_cache.lookup(same_prompt, database_connection) is None
+
+
+def test_cache_hits_keep_the_request_metadata():
+    cached = SQLGeneration(
+        prompt_id="1",
+        sql="SELECT COUNT(*) FROM users",
+        metadata={"sql_result_cache": {"hits": 1}, "team": "sales", "source": "old"},
+    )
+
+    sql_generation = SQLGenerationService.from_smart_cache(
+        cached, "2", {"source": "api"}
+    )
+
+    assert sql_generation.prompt_id == "2"
+    assert sql_generation.metadata == {"team": "sales", "source": "api"}
+
+
+def test_invalidation_reaches_other_processes_and_lookup_embedding_is_reused(
+    monkeypatch,
+):
+    embedded = []
+
+    def embed_prompt(self, text, database_connection):  # noqa: ARG001
+        embedded.append(text)
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(InMemorySmartCache, "embed_prompt", embed_prompt)
+    system = System(Settings(db_impl=TEST_DB))
+    smart_cache, other_process_cache = (
+        InMemorySmartCache(system),
+        InMemorySmartCache(system),
+    )
+    database_connection = DatabaseConnection(
+        id=DB_CONNECTION_ID, alias="alias", connection_uri="sqlite:///mydb2.db"
+    )
+    prompt = Prompt(text="How many users signed up?", db_connection_id=DB_CONNECTION_ID)
+    assert smart_cache.lookup(prompt, database_connection) is None
+    smart_cache.add(
+        prompt,
+        SQLGeneration(prompt_id="1", sql="SELECT COUNT(*) FROM users", status="VALID"),
+        database_connection,
+    )
+    assert embedded == ["how many users signed up"]
+
+    other_process_cache.invalidate(DB_CONNECTION_ID)
+    assert smart_cache.lookup(prompt, database_connection) is None
@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy.engine import Connection
+
+from dataherald.sql_database.base import DBConnections, SQLDatabase
+from dataherald.sql_database.models.types import DatabaseConnection
+from dataherald.sql_database.query_timeout import QueryStats
+
+DB_CONNECTION_ID = "64dfa0e103f5134086f7090c"
+
+
+def test_get_sql_engine_reuses_engine_until_settings_change():
+    database_connection = DatabaseConnection(
+        id=DB_CONNECTION_ID, alias="alias", connection_uri="sqlite:///mydb2.db"
+    )
+    sql_database = SQLDatabase.get_sql_engine(database_connection)
+    assert SQLDatabase.get_sql_engine(database_connection) is sql_database
+    assert (
+        SQLDatabase.get_sql_engine(database_connection, schema="other")
+        is not sql_database
+    )
+
+    database_connection = DatabaseConnection(
+        id=DB_CONNECTION_ID,
+        alias="alias",
+        connection_uri="sqlite:///mydb2.db?timeout=10",
+    )
+    assert SQLDatabase.get_sql_engine(database_connection) is not sql_database
+    DBConnections.remove((DB_CONNECTION_ID, None))
+    DBConnections.remove((DB_CONNECTION_ID, "other"))
+    assert (DB_CONNECTION_ID, None) not in DBConnections.db_connections
+
+
+def test_get_tables_and_views_is_cached_until_cleared(tmp_path):
+    sql_database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/inspection.db")
+    sql_database.engine.execute("CREATE TABLE orders (id integer)")
+    assert sql_database.get_tables_and_views() == ["orders"]
+
+    sql_database.engine.execute("CREATE TABLE customers (id integer)")
+    assert sql_database.get_tables_and_views() == ["orders"]
+    sql_database.clear_inspection_cache()
+    assert sorted(sql_database.get_tables_and_views()) == ["customers", "orders"]
+
+
+def test_inspection_caches_of_a_db_connection_are_cleared(tmp_path):
+    database_connection = DatabaseConnection(
+        id=DB_CONNECTION_ID,
+        alias="alias",
+        connection_uri=f"sqlite:///{tmp_path}/inspection.db",
+    )
+    sql_database = SQLDatabase.get_sql_engine(database_connection, schema="cleared")
+    sql_database.engine.execute("CREATE TABLE orders (id integer)")
+    assert sql_database.get_tables_and_views() == ["orders"]
+
+    sql_database.engine.execute("CREATE TABLE customers (id integer)")
+    DBConnections.clear_inspection_caches(DB_CONNECTION_ID)
+    assert sorted(sql_database.get_tables_and_views()) == ["customers", "orders"]
+    DBConnections.remove((DB_CONNECTION_ID, "cleared"))
+
+
+def test_run_sql_cancels_the_query_after_the_timeout(tmp_path):
+    sql_database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/timeout.db")
+    cancelled = QueryStats.stats()["cancelled"]
+    with pytest.raises(TimeoutError):
+        sql_database.run_sql(
+            "WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers) "
+            "SELECT count(*) FROM numbers",
+            timeout=1,
+        )
+    assert QueryStats.stats()["cancelled"] == cancelled + 1
+    assert sql_database.run_sql("SELECT 1", timeout=1)[1]["result"] == [(1,)]
+
+
+def test_stream_sql_cancels_the_query_after_the_timeout(tmp_path):
+    sql_database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/timeout.db")
+    timed_out = QueryStats.stats()["timed_out"]
+    with pytest.raises(TimeoutError):
+        sql_database.stream_sql(
+            "WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers) "
+            "SELECT count(*) FROM numbers",
+            timeout=1,
+        )
+    assert QueryStats.stats()["timed_out"] == timed_out + 1
+    columns, chunks = sql_database.stream_sql("SELECT 1 AS one", timeout=1)
+    assert columns == ["one"]
+    assert [list(chunk) for chunk in chunks] == [[(1,)]]
+
+
+def test_stream_sql_closes_the_connection_when_the_rows_are_not_read(
+    tmp_path, monkeypatch
+):
+    sql_database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/stream.db")
+    closed = []
+    close = Connection.close
+    monkeypatch.setattr(
+        Connection, "close", lambda self: closed.append(1) or close(self)
+    )
+
+    _, chunks = sql_database.stream_sql("SELECT 1 AS one")
+    assert closed == []
+    chunks.close()
+    assert closed == [1]
+
+
+def test_evicted_engines_forget_their_key_lock():
+    database_connection = DatabaseConnection(
+        id=DB_CONNECTION_ID, alias="alias", connection_uri="sqlite:///mydb2.db"
+    )
+    SQLDatabase.get_sql_engine(database_connection, schema="evicted")
+    assert (DB_CONNECTION_ID, "evicted") in DBConnections._key_locks
+
+    DBConnections.evict((DB_CONNECTION_ID, "evicted"))
+    assert (DB_CONNECTION_ID, "evicted") not in DBConnections._key_locks
+    assert (DB_CONNECTION_ID, "evicted") not in DBConnections.db_connections
@@ -0,0 +1,74 @@
+from dataherald.config import Settings, System
+from dataherald.db import DB
+from dataherald.repositories.cache_invalidations import CacheInvalidationRepository
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.query_timeout import QueryStats
+from dataherald.sql_database.result_cache import SQLResultCache, SQLResultCacheStats
+
+DB_CONNECTION_ID = "64dfa0e103f5134086f7090c"
+TEST_DB = "dataherald.tests.db.test_db.TestDB"
+
+
+def test_repeated_queries_of_a_connection_run_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLResultCache, "ttl", 60)
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/cache.db")
+    db.engine.execute("CREATE TABLE orders (id integer, status text)")
+    db.engine.execute("INSERT INTO orders VALUES (1, 'Shipped')")
+    stats = SQLResultCacheStats()
+
+    executed = QueryStats.stats()["executed"]
+    first = SQLResultCache.run_sql(
+        db,
+        DB_CONNECTION_ID,
+        "SELECT DISTINCT status FROM orders",
+        top_k=10,
+        stats=stats,
+    )
+    second = SQLResultCache.run_sql(
+        db,
+        DB_CONNECTION_ID,
+        "select distinct status\nfrom orders;",
+        top_k=10,
+        stats=stats,
+    )
+    assert first == second
+    assert stats.dict() == {"hits": 1, "misses": 1}
+    assert QueryStats.stats()["executed"] == executed + 1
+
+    SQLResultCache.invalidate(DB_CONNECTION_ID)
+    SQLResultCache.run_sql(
+        db,
+        DB_CONNECTION_ID,
+        "SELECT DISTINCT status FROM orders",
+        top_k=10,
+        stats=stats,
+    )
+    assert stats.dict() == {"hits": 1, "misses": 2}
+
+
+def test_only_deterministic_reads_are_cached():
+    assert SQLResultCache.cacheable("WITH a AS (SELECT 1) SELECT * FROM a")
+    assert not SQLResultCache.cacheable("SELECT 1; SELECT 2")
+    assert not SQLResultCache.cacheable("DELETE FROM orders")
+    assert not SQLResultCache.cacheable("SELECT * FROM orders WHERE day = CURRENT_DATE")
+    assert SQLResultCache.fingerprint(
+        "SELECT 1 WHERE a = 'X'", 10
+    ) != SQLResultCache.fingerprint("SELECT 1 WHERE a = 'x'", 10)
+
+
+def test_invalidations_of_other_processes_drop_older_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLResultCache, "ttl", 60)
+    storage = System(Settings(db_impl=TEST_DB)).instance(DB)
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/cache.db")
+    db.engine.execute("CREATE TABLE orders (id integer, status text)")
+    stats = SQLResultCacheStats()
+    SQLResultCache.run_sql(db, DB_CONNECTION_ID, "SELECT * FROM orders", stats=stats)
+
+    # Another process scanned the db connection
+    CacheInvalidationRepository(storage).invalidate(DB_CONNECTION_ID)
+    SQLResultCache.remove_invalidated(DB_CONNECTION_ID, storage)
+    SQLResultCache.run_sql(db, DB_CONNECTION_ID, "SELECT * FROM orders", stats=stats)
+    SQLResultCache.remove_invalidated(DB_CONNECTION_ID, storage)
+    SQLResultCache.run_sql(db, DB_CONNECTION_ID, "SELECT * FROM orders", stats=stats)
+
+    assert stats.dict() == {"hits": 1, "misses": 2}
@@ -0,0 +1,64 @@
+import pytest
+
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.query_timeout import QueryStats
+from dataherald.sql_database.result_cursors import (
+    ContinuationToken,
+    InvalidContinuationTokenError,
+    ResultCursors,
+)
+
+SQL = "SELECT id FROM orders ORDER BY id"
+
+
+def test_cursor_reads_the_pages_with_one_execution(tmp_path):
+    database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/cursors.db")
+    database.engine.execute("CREATE TABLE orders (id integer)")
+    for i in range(5):
+        database.engine.execute(f"INSERT INTO orders VALUES ({i})")
+
+    executed = QueryStats.stats()["executed"]
+    cursor_id, cursor = ResultCursors.open(database, SQL, 2)
+    assert cursor.columns == ["id"]
+    assert cursor.fetch(2) == ([(0,), (1,)], True)
+    assert ResultCursors.get(cursor_id, SQL) is cursor
+    assert ResultCursors.get(cursor_id, "SELECT 1") is None
+    assert cursor.fetch(2) == ([(2,), (3,)], True)
+    assert cursor.fetch(2) == ([(4,)], False)
+    assert cursor.position == 5  # noqa: PLR2004
+    assert QueryStats.stats()["executed"] == executed + 1
+    ResultCursors.close(cursor_id)
+    assert ResultCursors.get(cursor_id, SQL) is None
+
+    _, cursor = ResultCursors.open(database, SQL, 2)
+    cursor.skip(3)
+    assert cursor.fetch(5) == ([(3,), (4,)], False)
+    cursor.close()
+
+
+def test_cursors_of_an_engine_are_kept_below_its_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(ResultCursors, "max_per_engine", 2)
+    database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/cursors.db")
+    database.engine.execute("CREATE TABLE orders (id integer)")
+    database.engine.execute("INSERT INTO orders VALUES (1)")
+
+    first_id, _ = ResultCursors.open(database, SQL, 2)
+    second_id, _ = ResultCursors.open(database, SQL, 2)
+    third_id, _ = ResultCursors.open(database, SQL, 2)
+    assert ResultCursors.get(first_id, SQL) is None
+    assert ResultCursors.get(second_id, SQL) is not None
+    assert ResultCursors.get(third_id, SQL) is not None
+
+    ResultCursors.cursors[second_id].expires_at = 0
+    ResultCursors.evict()
+    assert ResultCursors.get(second_id, SQL) is None
+    ResultCursors.close(third_id)
+
+
+def test_continuation_token_round_trip():
+    token = ContinuationToken(
+        sql_generation_id="64dfa0e103f5134086f7090c", offset=100, cursor_id="abc"
+    )
+    assert ContinuationToken.decode(token.encode()) == token
+    with pytest.raises(InvalidContinuationTokenError):
+        ContinuationToken.decode("not a token")
@@ -0,0 +1,43 @@
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.query_timeout import QueryStats
+from dataherald.sql_database.result_snapshots import ResultSnapshots
+
+SQL_GENERATION_ID = "64dfa0e103f5134086f7090c"
+SQL = "SELECT id, total FROM orders ORDER BY id"
+
+
+def test_fetch_reuses_the_snapshot_while_it_covers_the_rows(tmp_path):
+    database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/snapshots.db")
+    database.engine.execute("CREATE TABLE orders (id integer, total integer)")
+    for i in range(5):
+        database.engine.execute(f"INSERT INTO orders VALUES ({i}, {i * 10})")
+
+    executed = QueryStats.stats()["executed"]
+    snapshot = ResultSnapshots.fetch(database, SQL_GENERATION_ID, SQL, 2)
+    assert snapshot.records() == [{"id": 0, "total": 0}, {"id": 1, "total": 10}]
+    assert not snapshot.complete
+    ResultSnapshots.fetch(database, SQL_GENERATION_ID, SQL, 1)
+    assert QueryStats.stats()["executed"] == executed + 1
+
+    snapshot = ResultSnapshots.fetch(database, SQL_GENERATION_ID, SQL)
+    assert snapshot.complete
+    assert snapshot.data == [(0, 1, 2, 3, 4), (0, 10, 20, 30, 40)]
+    ResultSnapshots.fetch(database, SQL_GENERATION_ID, SQL, 3)
+    assert QueryStats.stats()["executed"] == executed + 2
+
+    ResultSnapshots.fetch(database, SQL_GENERATION_ID, "SELECT id FROM orders")
+    assert QueryStats.stats()["executed"] == executed + 3
+    ResultSnapshots.remove(SQL_GENERATION_ID)
+
+
+def test_fetch_runs_the_query_with_the_timeout(tmp_path, monkeypatch):
+    database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/snapshots.db")
+    calls = []
+
+    def run_sql(command, top_k=None, timeout=None):
+        calls.append((command, top_k, timeout))
+        return "", {"columns": ["id"], "result": [(1,)]}
+
+    monkeypatch.setattr(database, "run_sql", run_sql)
+    ResultSnapshots.fetch(database, None, SQL, 2, timeout=30)
+    assert calls == [(SQL, 3, 30)]
@@ -0,0 +1,65 @@
+from dataherald.sql_database import ssh_tunnel
+from dataherald.sql_database.ssh_tunnel import SSHTunnelManager
+
+ACQUIRED_TWICE = 2
+
+
+class FakeForwarder:
+    started = 0
+
+    def __init__(self, *args, **kwargs):  # noqa: ARG002
+        self.is_active = False
+        self.tunnel_is_up = {}
+        self.local_bind_host = "127.0.0.1"
+        self.local_bind_port = 40000
+
+    def start(self):
+        FakeForwarder.started += 1
+        self.is_active = True
+        self.tunnel_is_up = {("127.0.0.1", 40000): True}
+
+    def stop(self, force=False):  # noqa: ARG002
+        self.is_active = False
+
+    def check_tunnels(self):
+        pass
+
+
+def test_tunnel_is_shared_and_closed_when_idle(monkeypatch):
+    monkeypatch.setattr(ssh_tunnel, "SSHTunnelForwarder", FakeForwarder)
+    monkeypatch.setattr(SSHTunnelManager, "idle_timeout", -1)
+    monkeypatch.setattr(SSHTunnelManager, "health_check_interval", 0)
+    key = SSHTunnelManager.tunnel_key("bastion", 22, "user", "db", 5432)
+
+    assert SSHTunnelManager.acquire(key) == ("127.0.0.1", 40000)
+    assert SSHTunnelManager.acquire(key) == ("127.0.0.1", 40000)
+    assert FakeForwarder.started == 1
+    assert SSHTunnelManager.stats()["engines"] == ACQUIRED_TWICE
+
+    SSHTunnelManager.tunnels[key]["server"].is_active = False
+    SSHTunnelManager.ensure_active(key)
+    assert FakeForwarder.started == ACQUIRED_TWICE
+
+    SSHTunnelManager.release(key)
+    assert key in SSHTunnelManager.tunnels
+    SSHTunnelManager.release(key)
+    assert key not in SSHTunnelManager.tunnels
+
+
+def test_checked_out_connections_keep_the_tunnel(monkeypatch):
+    monkeypatch.setattr(ssh_tunnel, "SSHTunnelForwarder", FakeForwarder)
+    monkeypatch.setattr(SSHTunnelManager, "idle_timeout", -1)
+    monkeypatch.setattr(SSHTunnelManager, "health_check_interval", 0)
+    key = SSHTunnelManager.tunnel_key("bastion", 22, "user", "warehouse", 5432)
+    SSHTunnelManager.acquire(key)
+
+    SSHTunnelManager.checkout(key)
+    SSHTunnelManager.release(key)
+    SSHTunnelManager.tunnels[key]["server"].is_active = False
+    SSHTunnelManager.check_tunnels()
+    assert SSHTunnelManager.tunnels[key]["server"].is_active
+    assert SSHTunnelManager.stats()["connections"] == 1
+
+    SSHTunnelManager.checkin(key)
+    SSHTunnelManager.check_tunnels()
+    assert key not in SSHTunnelManager.tunnels
@@ -0,0 +1,28 @@
+import asyncio
+
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_generator.dataherald_sqlagent import (
+    GetFewShotExamples,
+    QuerySQLDataBaseTool,
+)
+
+
+def test_tools_run_asynchronously(tmp_path):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/tools.db")
+    db.engine.execute("CREATE TABLE orders (id integer, total integer)")
+    db.engine.execute("INSERT INTO orders VALUES (1, 10)")
+    executed_queries = set()
+    query_tool = QuerySQLDataBaseTool(db=db, executed_queries=executed_queries)
+
+    result = asyncio.run(query_tool.arun("```sql\nSELECT id, total FROM orders\n```"))
+    assert result == str([(1, 10)])
+    assert executed_queries == {db.normalize_sql("SELECT id, total FROM orders")}
+
+    result = asyncio.run(query_tool.arun("SELECT amount FROM orders"))
+    assert result.startswith("Error:")
+
+    examples_tool = GetFewShotExamples(
+        db=db, few_shot_examples=[{"prompt_text": "Orders", "sql": "SELECT id"}]
+    )
+    result = asyncio.run(examples_tool.arun("1"))
+    assert result == "Question: Orders \n```sql\nSELECT id\n```\n"
@@ -0,0 +1,72 @@
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.query_timeout import QueryStats
+from dataherald.sql_generator.create_sql_query_status import create_sql_query_status
+from dataherald.types import SQLGeneration
+
+PROMPT_ID = "64dfa0e103f5134086f7090c"
+
+
+def test_validation_compiles_the_query_or_reuses_the_agent_execution(tmp_path):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/validation.db")
+    db.engine.execute("CREATE TABLE orders (id integer, total integer)")
+
+    sql_generation = create_sql_query_status(
+        db, "SELECT id FROM orders", SQLGeneration(prompt_id=PROMPT_ID)
+    )
+    assert sql_generation.status == "VALID"
+
+    sql_generation = create_sql_query_status(
+        db, "SELECT amount FROM orders", SQLGeneration(prompt_id=PROMPT_ID)
+    )
+    assert sql_generation.status == "INVALID"
+    assert "amount" in sql_generation.error
+
+    executed = QueryStats.stats()["executed"]
+    sql_generation = create_sql_query_status(
+        db,
+        "SELECT id,\n  total\nFROM orders;",
+        SQLGeneration(prompt_id=PROMPT_ID),
+        executed_queries={db.normalize_sql("SELECT id, total FROM orders")},
+    )
+    assert sql_generation.status == "VALID"
+    assert QueryStats.stats()["executed"] == executed
+
+
+def test_planning_errors_returned_as_the_plan_are_invalid(tmp_path, monkeypatch):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/validation.db")
+    plan = (
+        "== Physical Plan ==\nError occurred during query planning: \nUNRESOLVED_COLUMN"
+    )
+    monkeypatch.setattr(
+        db, "run_sql", lambda *_, **__: (str([(plan,)]), {"result": [(plan,)]})
+    )
+
+    sql_generation = create_sql_query_status(
+        db, "SELECT amount FROM orders", SQLGeneration(prompt_id=PROMPT_ID)
+    )
+
+    assert sql_generation.status == "INVALID"
+    assert sql_generation.error.startswith("Error occurred during query planning")
+
+
+def test_validation_mode_is_read_on_each_call(tmp_path, monkeypatch, caplog):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/validation.db")
+    db.engine.execute("CREATE TABLE orders (id integer)")
+    calls = []
+    monkeypatch.setattr(db, "run_sql", lambda *_, **__: calls.append("run_sql"))
+    monkeypatch.setattr(
+        db, "validate_sql", lambda *_, **__: calls.append("validate_sql")
+    )
+
+    monkeypatch.setenv("SQL_VALIDATION_MODE", "execute")
+    create_sql_query_status(
+        db, "SELECT id FROM orders", SQLGeneration(prompt_id=PROMPT_ID)
+    )
+    monkeypatch.setenv("SQL_VALIDATION_MODE", "exec")
+    sql_generation = create_sql_query_status(
+        db, "SELECT id FROM orders", SQLGeneration(prompt_id=PROMPT_ID)
+    )
+
+    assert calls == ["run_sql", "validate_sql"]
+    assert sql_generation.status == "VALID"
+    assert "Unknown SQL_VALIDATION_MODE 'exec'" in caplog.text
@@ -0,0 +1,27 @@
+import time
+
+import pytest
+
+from dataherald.sql_generator import SQLGenerator
+
+
+def test_stages_run_concurrently_and_are_timed():
+    def stage(value):
+        time.sleep(0.2)
+        return value
+
+    results, timings = SQLGenerator.run_stages(
+        {"db_scan": lambda: stage("tables"), "context": lambda: stage("examples")}
+    )
+    assert results == {"db_scan": "tables", "context": "examples"}
+    assert set(timings) == {"db_scan", "context", "setup"}
+    assert timings["db_scan"] >= 0.2  # noqa: PLR2004
+    assert timings["setup"] < timings["db_scan"] + timings["context"]
+
+
+def test_stage_errors_are_raised():
+    def no_tables():
+        raise ValueError("No scanned tables found for database")
+
+    with pytest.raises(ValueError, match="No scanned tables"):
+        SQLGenerator.run_stages({"db_scan": no_tables, "database": lambda: None})
@@ -0,0 +1,63 @@
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.sql_database.query_timeout import QueryStats
+from dataherald.sql_database.result_cache import SQLResultCache
+from dataherald.sql_generator.dataherald_sqlagent import QuerySQLDataBaseTool
+from dataherald.sql_generator.tool_memo import (
+    SQL_TIMEOUT_OBSERVATION,
+    ToolMemo,
+    normalize_tool_input,
+)
+
+
+def test_sql_inputs_are_case_folded_outside_literals():
+    assert normalize_tool_input(
+        "SqlDbQuery", "```sql\nSELECT  name\nFROM Orders WHERE city = 'Boston';\n```"
+    ) == normalize_tool_input(
+        "SqlDbQuery", "select name from orders where city = 'Boston'"
+    )
+    assert normalize_tool_input(
+        "SqlDbQuery", "SELECT 1 WHERE city = 'Boston'"
+    ) != normalize_tool_input("SqlDbQuery", "SELECT 1 WHERE city = 'boston'")
+    assert normalize_tool_input("DbRelevantTablesSchema", " Orders ") == "Orders"
+
+
+def test_repeated_queries_are_answered_from_the_memo(tmp_path):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/memo.db")
+    db.engine.execute("CREATE TABLE orders (id integer)")
+    db.engine.execute("INSERT INTO orders VALUES (1)")
+    memo = ToolMemo()
+    tool = QuerySQLDataBaseTool(db=db, executed_queries=set(), memo=memo)
+
+    executed = QueryStats.stats()["executed"]
+    first = tool.run("SELECT id FROM orders")
+    assert tool.run("select id\nfrom orders;") == first
+    assert QueryStats.stats()["executed"] == executed + 1
+    assert memo.hits == 1
+
+    # Errors are returned to the agent but the query runs again next time
+    assert tool.run("SELECT total FROM orders").startswith("Error:")
+    assert tool.run("SELECT total FROM orders").startswith("Error:")
+    assert memo.hits == 1
+
+    assert not memo.was_hit("SqlDbQuery", "SELECT id FROM orders")
+    assert memo.was_hit("SqlDbQuery", "SELECT id FROM orders")
+    assert not memo.was_hit("SqlDbQuery", "SELECT id FROM orders")
+
+
+def test_timed_out_queries_run_again(tmp_path, monkeypatch):
+    db = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/memo.db")
+    memo = ToolMemo()
+    tool = QuerySQLDataBaseTool(db=db, executed_queries=set(), memo=memo)
+    results = [TimeoutError(), "[(1,)]"]
+
+    def run_sql(*args, **kwargs):  # noqa: ARG001
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(SQLResultCache, "run_sql", run_sql)
+    assert tool.run("SELECT id FROM orders") == SQL_TIMEOUT_OBSERVATION
+    assert tool.run("SELECT id FROM orders") == "[(1,)]"
+    assert tool.run("SELECT id FROM orders") == "[(1,)]"
+    assert memo.hits == 1
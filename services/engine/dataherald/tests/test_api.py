@@ -12,3 +12,15 @@ HTTP_404_CODE = 404
 def test_heartbeat():
     response = client.get("/api/v1/heartbeat")
     assert response.status_code == HTTP_200_CODE
+
+
+def test_stats():
+    response = client.get("/api/v1/stats")
+    assert response.status_code == HTTP_200_CODE
+    assert set(response.json()) == {"queries", "ssh_tunnels"}
+
+
+def test_get_scan_jobs():
+    response = client.get("/api/v1/scan-jobs")
+    assert response.status_code == HTTP_200_CODE
+    assert response.json() == []
@@ -0,0 +1,88 @@
+import gzip
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataherald.sql_database.base import SQLDatabase
+from dataherald.utils.exports import (
+    EXECUTE_FORMATS,
+    EXPORT_FORMATS,
+    arrow_chunks,
+    csv_chunks,
+    gzip_chunks,
+    negotiate_format,
+    record_batches,
+)
+
+
+def test_csv_export_streams_the_rows_in_chunks(tmp_path):
+    database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/export.db")
+    database.engine.execute("CREATE TABLE orders (id integer, name text)")
+    for i in range(5):
+        database.engine.execute(f"INSERT INTO orders VALUES ({i}, 'order, {i}')")
+
+    columns, chunks = database.stream_sql("SELECT id, name FROM orders", chunk_size=2)
+    pieces = list(csv_chunks(columns, chunks))
+    assert len(pieces) == 3  # noqa: PLR2004
+    expected = "id,name\r\n" + "".join(f'{i},"order, {i}"\r\n' for i in range(5))
+    assert b"".join(pieces).decode("utf-8") == expected
+    assert gzip.decompress(b"".join(gzip_chunks(iter(pieces)))) == b"".join(pieces)
+
+
+def test_arrow_export_falls_back_to_converting_the_rows(tmp_path):
+    database = SQLDatabase.from_uri(f"sqlite:///{tmp_path}/export.db")
+    database.engine.execute("CREATE TABLE orders (id integer, name text)")
+    for i in range(5):
+        database.engine.execute(f"INSERT INTO orders VALUES ({i}, NULL)")
+
+    columns, batches = database.stream_arrow(
+        "SELECT id, name FROM orders", chunk_size=2
+    )
+    stream = b"".join(arrow_chunks(columns, batches, "arrow"))
+    table = pa.ipc.open_stream(stream).read_all()
+    assert table.column_names == ["id", "name"]
+    assert table.column("id").to_pylist() == list(range(5))
+    assert table.schema.field("name").type == pa.string()
+
+
+def test_parquet_export_writes_a_row_group_per_chunk():
+    chunks = [[(1, "a"), (2, "b")], [(3, None)]]
+    batches = record_batches(["id", "name"], chunks)
+    parquet = b"".join(arrow_chunks(["id", "name"], batches, "parquet"))
+    metadata = pq.read_metadata(pa.BufferReader(parquet))
+    assert metadata.num_rows == 3  # noqa: PLR2004
+    assert metadata.num_row_groups == 2  # noqa: PLR2004
+
+
+def test_later_chunks_with_wider_values_fit_the_schema():
+    chunks = [
+        [(1, 1.5, Decimal("1.50"))],
+        [(2**40, 2.5, Decimal("123456.789"))],
+    ]
+    batches = record_batches(["id", "price", "amount"], chunks)
+    stream = b"".join(arrow_chunks(["id", "price", "amount"], batches, "arrow"))
+    table = pa.ipc.open_stream(stream).read_all()
+    assert table.schema.field("amount").type == pa.decimal128(38, 2)
+    assert table.column("amount").to_pylist() == [Decimal("1.50"), Decimal("123456.79")]
+    assert table.column("id").to_pylist() == [1, 2**40]
+
+
+def test_negotiate_format():
+    assert negotiate_format(None, EXPORT_FORMATS, "csv") == "csv"
+    assert (
+        negotiate_format("application/vnd.apache.parquet;q=0.9", EXPORT_FORMATS, "csv")
+        == "parquet"
+    )
+    assert (
+        negotiate_format(
+            "*/*, application/vnd.apache.arrow.stream", EXECUTE_FORMATS, "json"
+        )
+        == "arrow"
+    )
+    accept = "application/json, text/plain, */*"
+    assert negotiate_format(accept, EXPORT_FORMATS, "csv") == "csv"
+    assert negotiate_format("text/csv", EXECUTE_FORMATS, "json") == "json"
+    accept = "application/vnd.apache.parquet;q=0.5, application/vnd.apache.arrow.stream"
+    assert negotiate_format(accept, EXPORT_FORMATS, "csv") == "arrow"
+    assert negotiate_format("text/csv;q=0, */*", EXPORT_FORMATS, "csv") == "arrow"
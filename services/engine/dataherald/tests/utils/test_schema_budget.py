@@ -0,0 +1,72 @@
+import pytest
+
+from dataherald.db_scanner.models.types import ColumnDetail, TableDescription
+from dataherald.utils import schema_budget
+from dataherald.utils.schema_budget import (
+    SchemaBudgetStats,
+    count_schema_tokens,
+    render_budgeted_schema,
+)
+from dataherald.utils.schema_index import render_schema_snippet
+
+COLUMNS = ["id", "customer_id", "city", "state", "price"] + [
+    f"extra_{index}" for index in range(20)
+]
+
+
+@pytest.fixture(autouse=True)
+def count_words(monkeypatch):
+    monkeypatch.setattr(schema_budget, "count_tokens", lambda text: len(text.split()))
+
+
+def sales_table() -> TableDescription:
+    table = TableDescription(
+        db_connection_id="64dfa0e103f5134086f7090c",
+        schema_name="public",
+        table_name="sales",
+        description="Home sales",
+        table_schema="CREATE TABLE sales (\n\tid INTEGER NOT NULL, \n"
+        + "".join(f"\t{name} VARCHAR(255), \n" for name in COLUMNS[1:])
+        + "\tPRIMARY KEY (id),\n"
+        + "\tFOREIGN KEY (`customer_id`) REFERENCES `customers` (`id`));",
+        columns=[ColumnDetail(name=name) for name in COLUMNS],
+    )
+    table.columns[4].description = "Sale price in dollars"
+    count_schema_tokens(table)
+    return table
+
+
+def test_small_schemas_are_not_abbreviated():
+    table = sales_table()
+
+    schema = render_budgeted_schema(table, "average price", 1000)
+
+    assert schema.snippet == render_schema_snippet(table)
+    assert schema.omitted_columns == 0
+
+
+def test_keys_and_relevant_columns_are_kept():
+    table = sales_table()
+    stats = SchemaBudgetStats()
+
+    schema = render_budgeted_schema(table, "What is the average price by city?", 44)
+    stats.record([schema])
+
+    assert "\tid INTEGER NOT NULL, " in schema.snippet
+    assert "\tcustomer_id VARCHAR(255), " in schema.snippet
+    assert "\tcity VARCHAR(255), " in schema.snippet
+    assert "\tprice VARCHAR(255), " in schema.snippet
+    assert "\tstate VARCHAR(255), " not in schema.snippet
+    assert "/* 21 more columns, see DbRelevantColumnsInfo: state, ... */" in (
+        schema.snippet
+    )
+    assert "Column `price`: Sale price in dollars" in schema.snippet
+    assert schema.tokens < schema.full_tokens
+    assert stats.calls == [
+        {
+            "tables": ["sales"],
+            "full_tokens": schema.full_tokens,
+            "tokens": schema.tokens,
+            "omitted_columns": schema.omitted_columns,
+        }
+    ]
@@ -0,0 +1,48 @@
+from dataherald.db_scanner.models.types import ColumnDetail, TableDescription
+from dataherald.utils.schema_index import SchemaIndex
+
+
+def table(name: str, schema_name: str | None = None, **kwargs) -> TableDescription:
+    return TableDescription(
+        db_connection_id="64dfa0e103f5134086f7090c",
+        schema_name=schema_name,
+        table_name=name,
+        table_schema=f"CREATE TABLE {name} (id INT, city TEXT)",
+        columns=[ColumnDetail(name="id"), ColumnDetail(name="city")],
+        examples=[{"id": "1", "city": "Miami"}],
+        **kwargs,
+    )
+
+
+def test_tables_are_returned_in_scan_order():
+    index = SchemaIndex(
+        [table("sales"), table("users", description="App users"), table("orders")]
+    )
+
+    records = index.find_tables(["orders", "users", "missing"])
+
+    assert [record.table_name for record in records] == ["users", "orders"]
+    assert records[0].schema_snippet == (
+        "CREATE TABLE users (id INT, city TEXT)\n/*\nTable `users`: App users\n*/\n"
+    )
+
+
+def test_find_table_by_schema_ignoring_case():
+    index = SchemaIndex([table("Sales", "public"), table("sales", "archive")])
+
+    assert index.find_table("sales", "archive").schema_name == "archive"
+    assert index.find_table(" SALES ", "PUBLIC").schema_name == "public"
+    assert index.find_table("sales").schema_name == "public"
+    assert index.find_table("sales", "other") is None
+
+
+def test_columns_render_their_sample_rows():
+    index = SchemaIndex([table("sales", "public")])
+
+    records = index.find_columns("sales", "city")
+
+    assert [record.column_info for record in records] == [
+        "Table: public.sales, column: city, additional info: "
+        "Description: None, Sample rows: Miami\n"
+    ]
+    assert index.find_columns("sales", "missing") == []
@@ -0,0 +1,41 @@
+import asyncio
+import time
+from threading import Thread
+
+import pytest
+
+from dataherald.utils.streaming import HEARTBEAT, StreamCancelledError, StreamChannel
+
+
+def test_channel_streams_thread_messages_with_heartbeats():
+    async def consume():
+        channel = StreamChannel()
+
+        def produce():
+            channel.put("first")
+            time.sleep(0.2)
+            channel.put("second")
+            channel.put(None)
+
+        Thread(target=produce).start()
+        return [value async for value in channel.messages(0.05)]
+
+    messages = asyncio.run(consume())
+    assert messages[0] == "first"
+    assert messages[-1] == "second"
+    assert HEARTBEAT in messages[1:-1]
+    assert "".join(messages).split() == ["first", "second"]
+
+
+def test_cancelled_channel_stops_the_producer():
+    async def cancel():
+        channel = StreamChannel()
+        channel.raise_if_cancelled()
+        channel.cancel()
+        return channel
+
+    channel = asyncio.run(cancel())
+    with pytest.raises(StreamCancelledError):
+        channel.raise_if_cancelled()
+    channel.put("late")
+    assert channel.cancelled.is_set()
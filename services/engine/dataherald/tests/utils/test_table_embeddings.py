@@ -0,0 +1,26 @@
+import numpy as np
+
+from dataherald.utils.table_embeddings import normalize_rows, top_k_similarities
+
+
+def test_top_k_similarities_matches_full_sort():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((200, 16)).tolist()
+    question = rng.standard_normal(16).tolist()
+
+    ranking = top_k_similarities(normalize_rows(embeddings), question, 10)
+
+    expected = sorted(
+        range(len(embeddings)),
+        key=lambda i: np.dot(embeddings[i], question)
+        / (np.linalg.norm(embeddings[i]) * np.linalg.norm(question)),
+        reverse=True,
+    )[:10]
+    assert [index for index, _ in ranking] == expected
+    assert ranking[0][1] >= ranking[-1][1]
+
+
+def test_top_k_similarities_with_fewer_rows_than_k():
+    ranking = top_k_similarities(normalize_rows([[1.0, 0.0], [0.0, 1.0]]), [0, 1], 20)
+    assert [index for index, _ in ranking] == [1, 0]
+    assert top_k_similarities(normalize_rows([]), [0, 1], 20) == []
@@ -81,6 +81,7 @@ class SupportedDatabase(Enum):
 class ScannerRequest(BaseModel):
     ids: list[str] | None
     metadata: dict | None
+    force: bool = False
 
     @validator("ids")
     def ids_validation(cls, ids: list = None):
@@ -102,6 +103,7 @@ class DatabaseConnectionRequest(BaseModel):
     ssh_settings: SSHSettings | None
     file_storage: FileStorage | None
     metadata: dict | None
+    scan_concurrency: int | None = Field(default=None, ge=1)
 
 
 class ForeignKeyDetail(BaseModel):
@@ -195,6 +197,7 @@ class IntermediateStep(BaseModel):
     action: str
     action_input: str
     observation: str
+    cached: bool = False
 
 
 class SQLGeneration(BaseModel):
@@ -213,6 +216,7 @@ class SQLGeneration(BaseModel):
     error: str | None
     created_at: datetime = Field(default_factory=datetime.now)
     metadata: dict | None
+    stage_timings: dict[str, float] | None
 
 
 class NLGeneration(BaseModel):
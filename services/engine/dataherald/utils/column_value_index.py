@@ -0,0 +1,165 @@
+import difflib
+import logging
+import os
+import re
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from typing import Any, List, Tuple
+
+from dataherald.db_scanner.models.types import ColumnValueIndex
+from dataherald.db_scanner.repository.column_value_indexes import (
+    ColumnValueIndexRepository,
+)
+
+# String columns with more distinct values than this are not indexed, 0 disables the index
+COLUMN_VALUE_INDEX_MAX_VALUES = int(
+    os.environ.get("COLUMN_VALUE_INDEX_MAX_VALUES", "10000")
+)
+COLUMN_VALUE_INDEX_MAX_LENGTH = 256
+MAX_CACHED_INDEXES = int(os.environ.get("COLUMN_VALUE_INDEX_CACHE_SIZE", "256"))
+MAX_SCORED_CANDIDATES = 500
+SIMILARITY_THRESHOLD = 0.4
+MAX_RESULTS = 25
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_value(value: str) -> str:
+    return re.sub(r"\s+", " ", str(value).strip().lower())
+
+
+def trigrams(value: str) -> set[str]:
+    padded = f" {value} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+class ValueIndex:
+    """Trigram inverted index over the distinct values of a column.
+
+    Only the values sharing the most trigrams with the entity are scored with
+    SequenceMatcher, so a lookup doesn't depend on the number of values in the column.
+    """
+
+    def __init__(self, values: List[str]):
+        self.values = values
+        self.normalized = [normalize_value(value) for value in values]
+        self.postings = defaultdict(list)
+        for index, value in enumerate(self.normalized):
+            for trigram in trigrams(value):
+                self.postings[trigram].append(index)
+
+    def similar(self, entity: str) -> List[Tuple[str, float]]:
+        """Returns the values similar to the entity, most similar first, like
+        DbColumnEntityChecker does over the full column"""
+        target = normalize_value(entity)
+        shared = defaultdict(int)
+        for trigram in trigrams(target):
+            for index in self.postings.get(trigram, []):
+                shared[index] += 1
+        candidates = sorted(shared, key=shared.get, reverse=True)
+        similar_strings = []
+        for index in candidates[:MAX_SCORED_CANDIDATES]:
+            similarity = difflib.SequenceMatcher(
+                None, self.values[index].strip().lower(), entity.lower()
+            ).ratio()
+            if similarity >= SIMILARITY_THRESHOLD:
+                similar_strings.append((self.values[index].strip(), similarity))
+        similar_strings.sort(key=lambda x: x[1], reverse=True)
+        return similar_strings[:MAX_RESULTS]
+
+    def containing(self, entity: str) -> List[str]:
+        """Returns the values that contain the entity, ignoring case"""
+        target = normalize_value(entity)
+        if len(target) < 3:  # noqa: PLR2004
+            candidates = range(len(self.values))
+        else:
+            postings = [
+                set(self.postings.get(target[index : index + 3], []))
+                for index in range(len(target) - 2)
+            ]
+            candidates = sorted(set.intersection(*postings))
+        return [
+            self.values[index]
+            for index in candidates
+            if target in self.normalized[index]
+        ][:MAX_RESULTS]
+
+
+class ColumnValueIndexCache:
+    """Loads the column value indexes built by the scanner.
+
+    The inverted indexes are kept in process by stored index id, rescans replace the
+    stored index of a table so its id changes. Only the id is read on each lookup, the
+    values are loaded when the index isn't cached.
+    """
+
+    _indexes: OrderedDict = OrderedDict()
+    _indexes_lock = Lock()
+
+    def __init__(self, storage: Any):
+        self.repository = (
+            ColumnValueIndexRepository(storage) if storage is not None else None
+        )
+
+    def get(
+        self,
+        db_connection_id: str,
+        table_name: str,
+        column_name: str,
+        schema_name: str | None = None,
+    ) -> ValueIndex | None:
+        if self.repository is None:
+            return None
+        try:
+            index_id = self.repository.find_id_by_column(
+                db_connection_id, table_name, column_name, schema_name
+            )
+        except Exception as e:
+            logger.warning(f"Unable to load the value index of {column_name}: {e}")
+            return None
+        if index_id is None:
+            return None
+        with self._indexes_lock:
+            index = self._indexes.get(index_id)
+            if index is not None:
+                self._indexes.move_to_end(index_id)
+                return index
+        return self.load(index_id, column_name)
+
+    def load(self, index_id: str, column_name: str) -> ValueIndex | None:
+        try:
+            column_value_index = self.repository.find_by_id(index_id)
+        except Exception as e:
+            logger.warning(f"Unable to load the value index of {column_name}: {e}")
+            return None
+        if column_value_index is None:
+            return None
+        index = ValueIndex(column_value_index.values)
+        with self._indexes_lock:
+            self._indexes[index_id] = index
+            while len(self._indexes) > MAX_CACHED_INDEXES:
+                self._indexes.popitem(last=False)
+        return index
+
+
+def build_column_value_index(
+    db_connection_id: str,
+    schema_name: str | None,
+    table_name: str,
+    column_name: str,
+    values: List[Any],
+) -> ColumnValueIndex | None:
+    """Returns the index of the distinct values of a column, None if the column is over
+    the size cap or has long values, those are still looked up in the database"""
+    values = [str(value) for value in values if value is not None]
+    if not values or len(values) > COLUMN_VALUE_INDEX_MAX_VALUES:
+        return None
+    if any(len(value) > COLUMN_VALUE_INDEX_MAX_LENGTH for value in values):
+        return None
+    return ColumnValueIndex(
+        db_connection_id=db_connection_id,
+        schema_name=schema_name,
+        table_name=table_name,
+        column_name=column_name,
+        values=values,
+    )
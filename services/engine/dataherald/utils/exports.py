@@ -0,0 +1,231 @@
+import csv
+import io
+import itertools
+import zlib
+from decimal import Decimal
+from typing import Iterable, Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+FILE_EXTENSIONS = {"csv": "csv", "arrow": "arrow", "parquet": "parquet"}
+EXECUTE_FORMATS = ["json", "arrow", "parquet"]
+EXPORT_FORMATS = ["csv", "arrow", "parquet"]
+MAX_DECIMAL128_PRECISION = 38
+
+
+def csv_chunks(columns: list[str], chunks: Iterable[list]) -> Iterator[bytes]:
+    """Encodes the header and each chunk of rows as a CSV piece, so only one chunk is in
+    memory at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class ChunkSink(io.RawIOBase):
+    """Write only file that keeps what was written until it is taken. It tracks the
+    position itself since the Parquet footer stores absolute offsets."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def decimal_types(description: list[tuple]) -> list[pa.DataType | None]:
+    """The Arrow types of the numeric columns whose precision and scale the driver reports
+    in the DB-API cursor description, None for the columns whose type is inferred"""
+    types = []
+    for column in description:
+        precision, scale = (list(column[4:6]) + [None, None])[:2]
+        if (
+            isinstance(precision, int)
+            and isinstance(scale, int)
+            and 0 <= scale <= precision <= MAX_DECIMAL128_PRECISION
+            and precision > 0
+        ):
+            types.append(pa.decimal128(precision, scale))
+        else:
+            types.append(None)
+    return types
+
+
+def widen(data_type: pa.DataType) -> pa.DataType:
+    """The widest type of the same kind, so the larger values of later chunks fit the
+    schema inferred from the first one. Columns that are all null are sent as strings.
+    """
+    if pa.types.is_null(data_type):
+        return pa.string()
+    if pa.types.is_integer(data_type):
+        return pa.int64()
+    if pa.types.is_floating(data_type):
+        return pa.float64()
+    if (
+        pa.types.is_decimal128(data_type)
+        and data_type.precision < MAX_DECIMAL128_PRECISION
+    ):
+        return pa.decimal128(MAX_DECIMAL128_PRECISION, data_type.scale)
+    return data_type
+
+
+def column_array(column: Iterable, data_type: pa.DataType) -> pa.Array:
+    if pa.types.is_string(data_type):
+        strings = [None if value is None else str(value) for value in column]
+        return pa.array(strings, type=data_type)
+    try:
+        return pa.array(column, type=data_type, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if not pa.types.is_decimal(data_type):
+            raise
+    exponent = Decimal(1).scaleb(-data_type.scale)
+    rounded = [
+        None if value is None else Decimal(str(value)).quantize(exponent)
+        for value in column
+    ]
+    return pa.array(rounded, type=data_type)
+
+
+def record_batches(
+    columns: list[str],
+    chunks: Iterable[list],
+    types: list[pa.DataType | None] | None = None,
+) -> Iterator[pa.RecordBatch]:
+    """Converts chunks of rows into record batches. The schema is fixed once the first
+    batch is written, so the types of the columns not given in `types` are inferred from
+    the first chunk and widened, and decimals with more digits than its scale are
+    rounded."""
+    types = types or [None] * len(columns)
+    schema = None
+    for rows in chunks:
+        values = list(zip(*rows, strict=True)) if rows else [() for _ in columns]
+        if schema is None:
+            schema = pa.schema(
+                [
+                    (
+                        name,
+                        data_type or widen(pa.array(column, from_pandas=True).type),
+                    )
+                    for name, data_type, column in zip(
+                        columns, types, values, strict=True
+                    )
+                ]
+            )
+        arrays = [
+            column_array(column, field.type)
+            for field, column in zip(schema, values, strict=True)
+        ]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def arrow_chunks(
+    columns: list[str], batches: Iterable[pa.RecordBatch], result_format: str
+) -> Iterator[bytes]:
+    """Encodes the record batches as an Arrow IPC stream or as a Parquet file with a row
+    group per batch, yielding the bytes as soon as each batch is written. The schema is
+    taken from the first batch, an empty result has string columns."""
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        schema = pa.schema([(name, pa.string()) for name in columns])
+        batches = iter(())
+    else:
+        schema = first.schema
+        batches = itertools.chain([first], batches)
+    sink = ChunkSink()
+    file = pa.PythonFile(sink, mode="w")
+    if result_format == "parquet":
+        writer = pq.ParquetWriter(file, schema)
+    else:
+        writer = pa.ipc.new_stream(file, schema)
+    for batch in batches:
+        if result_format == "parquet":
+            writer.write_table(pa.Table.from_batches([batch], schema=schema))
+        else:
+            writer.write_batch(batch)
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
+
+
+def parse_accept(accept: str | None) -> list[tuple[str, float]]:
+    """The media ranges of the Accept header with their quality"""
+    media_ranges = []
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip().lower() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type:
+            media_ranges.append((media_type, quality))
+    return media_ranges
+
+
+def negotiate_format(accept: str | None, formats: list[str], default: str) -> str:
+    """Returns the format of `formats` the Accept header prefers. Each format takes the
+    quality of the most specific media range matching it, ties go to the exact media
+    types, then to the default and then to the order of `formats`. The default is
+    returned when the header accepts none of the formats."""
+    media_ranges = parse_accept(accept)
+    preferences = []
+    for index, result_format in enumerate(formats):
+        format_media_type = MEDIA_TYPES[result_format]
+        matches = []
+        for media_type, quality in media_ranges:
+            if media_type == format_media_type:
+                matches.append((2, quality))
+            elif media_type == format_media_type.split("/")[0] + "/*":
+                matches.append((1, quality))
+            elif media_type == "*/*":
+                matches.append((0, quality))
+        if matches:
+            specificity, quality = max(matches)
+            if quality > 0:
+                preferences.append(
+                    (quality, specificity, result_format == default, -index)
+                )
+    return formats[-max(preferences)[3]] if preferences else default
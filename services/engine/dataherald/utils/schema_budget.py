@@ -0,0 +1,219 @@
+import logging
+import os
+import re
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, List, Set
+
+import tiktoken
+from pydantic import BaseModel
+from tiktoken import Encoding
+
+from dataherald.db_scanner.models.types import TableDescription
+from dataherald.utils.schema_index import qualified_name, render_schema_snippet
+
+# Maximum tokens of the schema of one table returned by DbRelevantTablesSchema,
+# 0 returns the full schemas
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "0"))
+ENCODING_NAME = "cl100k_base"
+CHARACTERS_PER_TOKEN = 4
+COLUMN_NAME = re.compile(r'^\s*(?:"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|([^\s,]+))')
+KEY_CONSTRAINT = re.compile(r"(?:PRIMARY|FOREIGN) KEY\s*\(([^)]*)\)", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+class RenderedSchema(BaseModel):
+    table_name: str
+    snippet: str
+    full_tokens: int
+    tokens: int
+    omitted_columns: int
+
+
+class SchemaBudgetStats:
+    """Tokens of the schemas returned by DbRelevantTablesSchema during one generation"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = Lock()
+
+    def record(self, schemas: List[RenderedSchema]) -> None:
+        call = {
+            "tables": [schema.table_name for schema in schemas],
+            "full_tokens": sum(schema.full_tokens for schema in schemas),
+            "tokens": sum(schema.tokens for schema in schemas),
+            "omitted_columns": sum(schema.omitted_columns for schema in schemas),
+        }
+        logger.info(
+            f"Returned {call['tokens']} of {call['full_tokens']} schema tokens of "
+            f"{call['tables']}, {call['omitted_columns']} columns abbreviated"
+        )
+        with self._lock:
+            self.calls.append(call)
+
+    def dict(self) -> dict:
+        return {"budget": SCHEMA_TOKEN_BUDGET, "calls": list(self.calls)}
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> Encoding | None:
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        logger.warning(f"Unable to load {ENCODING_NAME}, estimating the tokens: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // CHARACTERS_PER_TOKEN + 1
+    return len(encoding.encode(text))
+
+
+def column_name(definition: str) -> str:
+    match = COLUMN_NAME.match(definition)
+    return next((group for group in match.groups() if group), "") if match else ""
+
+
+def column_definitions(table: TableDescription) -> Dict[str, str]:
+    """The line of each column in the CREATE TABLE statement, by column name"""
+    names = {column.name for column in table.columns}
+    definitions = {}
+    for line in (table.table_schema or "").splitlines()[1:]:
+        name = column_name(line)
+        if name in names and name not in definitions:
+            definitions[name] = line
+    return definitions
+
+
+def count_schema_tokens(table: TableDescription) -> None:
+    """Counts the tokens of the definition of each column, the scanner stores them so
+    the schemas are budgeted without encoding the DDL on every call"""
+    definitions = column_definitions(table)
+    for column in table.columns:
+        if column.name in definitions:
+            column.schema_tokens = count_tokens(definitions[column.name] + "\n")
+
+
+def key_columns(table: TableDescription, definitions: Dict[str, str]) -> Set[str]:
+    keys = {
+        column.name
+        for column in table.columns
+        if column.is_primary_key or column.foreign_key is not None
+    }
+    for constraint in KEY_CONSTRAINT.finditer(table.table_schema or ""):
+        keys.update(column_name(name) for name in constraint.group(1).split(","))
+    keys.update(
+        name
+        for name, definition in definitions.items()
+        if "PRIMARY KEY" in definition.upper()
+    )
+    return keys
+
+
+def words(text: str) -> Set[str]:
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text).lower()
+    return {word.rstrip("s") or word for word in re.findall(r"[a-z0-9]+", text)}
+
+
+def render_budgeted_schema(  # noqa: C901
+    table: TableDescription, question: str | None, budget: int
+) -> RenderedSchema:
+    """Renders the schema of the table like render_schema_snippet within the token
+    budget.
+
+    Keys and foreign keys are always kept, the other columns are kept by the overlap of
+    their names and descriptions with the words of the question. The columns left out
+    are only listed by name at the end of the statement, as many as fit.
+    """
+    definitions = column_definitions(table)
+    descriptions = {}
+    if table.description is not None:
+        descriptions = {
+            column.name: f"Column `{column.name}`: {column.description}\n"
+            for column in table.columns
+            if column.description is not None
+        }
+    costs = {
+        column.name: (
+            column.schema_tokens or count_tokens(definitions[column.name] + "\n")
+        )
+        + count_tokens(descriptions.get(column.name, ""))
+        for column in table.columns
+        if column.name in definitions
+    }
+    table_description = (
+        f"Table `{qualified_name(table)}`: {table.description}\n"
+        if table.description is not None
+        else ""
+    )
+    lines = (table.table_schema or "").splitlines()
+    structure = lines[:1] + [
+        line for line in lines[1:] if column_name(line) not in definitions
+    ]
+    base_tokens = count_tokens("\n".join(structure) + "\n")
+    if table_description:
+        base_tokens += count_tokens(f"/*\n{table_description}*/\n")
+    full_tokens = base_tokens + sum(costs.values())
+    if full_tokens <= budget or len(lines) < 3:  # noqa: PLR2004
+        return RenderedSchema(
+            table_name=table.table_name,
+            snippet=render_schema_snippet(table),
+            full_tokens=full_tokens,
+            tokens=full_tokens,
+            omitted_columns=0,
+        )
+
+    kept = key_columns(table, definitions) & set(definitions)
+    used = base_tokens + sum(costs[name] for name in kept)
+    question_words = words(question or "")
+    position = {name: index for index, name in enumerate(definitions)}
+    relevance = {
+        column.name: 2 * len(words(column.name) & question_words)
+        + len(words(column.description or "") & question_words)
+        for column in table.columns
+        if column.name in definitions
+    }
+    abbreviation = "\t/* {} more columns, see DbRelevantColumnsInfo: {} */"
+    used += count_tokens(abbreviation.format(len(definitions), "..."))
+    for name in sorted(
+        set(definitions) - kept, key=lambda name: (-relevance[name], position[name])
+    ):
+        if used + costs[name] > budget:
+            break
+        kept.add(name)
+        used += costs[name]
+
+    omitted = [name for name in definitions if name not in kept]
+    listed = []
+    for name in omitted:
+        used += count_tokens(f"{name}, ")
+        if used > budget:
+            break
+        listed.append(name)
+    if len(listed) < len(omitted):
+        listed.append("...")
+    snippet_lines = lines[:1] + [
+        line
+        for line in lines[1:-1]
+        if column_name(line) not in definitions or column_name(line) in kept
+    ]
+    if omitted:
+        snippet_lines.append(abbreviation.format(len(omitted), ", ".join(listed)))
+    snippet = "\n".join(snippet_lines + lines[-1:]) + "\n"
+    kept_descriptions = [
+        description for name, description in descriptions.items() if name in kept
+    ]
+    if table_description:
+        snippet += f"/*\n{table_description}{''.join(kept_descriptions)}*/\n"
+    return RenderedSchema(
+        table_name=table.table_name,
+        snippet=snippet,
+        full_tokens=full_tokens,
+        tokens=count_tokens(snippet),
+        omitted_columns=len(omitted),
+    )
@@ -0,0 +1,122 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from dataherald.db_scanner.models.types import ColumnDetail, TableDescription
+
+
+class TableRecord(BaseModel):
+    position: int
+    schema_name: str | None
+    table_name: str
+    schema_snippet: str
+
+
+class ColumnRecord(BaseModel):
+    position: int
+    column_info: str
+
+
+def render_schema_snippet(table: TableDescription) -> str:
+    """The DDL of the table followed by the descriptions of the table and its columns"""
+    snippet = (table.table_schema or "") + "\n"
+    descriptions = []
+    if table.description is not None:
+        descriptions.append(f"Table `{qualified_name(table)}`: {table.description}\n")
+        for column in table.columns:
+            if column.description is not None:
+                descriptions.append(f"Column `{column.name}`: {column.description}\n")
+    if len(descriptions) > 0:
+        snippet += f"/*\n{''.join(descriptions)}*/\n"
+    return snippet
+
+
+def render_column_info(table: TableDescription, column: ColumnDetail) -> str:
+    col_info = f"Description: {column.description},"
+    if column.low_cardinality:
+        col_info += f" categories = {column.categories},"
+    col_info += " Sample rows: "
+    for row in table.examples:
+        col_info += str(row.get(column.name, "")) + ", "
+    col_info = col_info[:-2]
+    return f"Table: {qualified_name(table)}, column: {column.name}, additional info: {col_info}\n"
+
+
+def qualified_name(table: TableDescription) -> str:
+    if table.schema_name:
+        return f"{table.schema_name}.{table.table_name}"
+    return table.table_name
+
+
+class SchemaIndex:
+    """Lookup tables over the scanned tables of a generation.
+
+    Tables are keyed by name and by (schema, name), columns by (table name, column
+    name), and the schema and column snippets the tools return are rendered once.
+    Lookups keep the order of the scanned tables, like scanning the list would.
+    """
+
+    def __init__(self, db_scan: List[TableDescription]):
+        self.tables = db_scan
+        self.tables_by_name = {}
+        self.tables_by_folded_name = {}
+        self.tables_by_schema = {}
+        self.columns = {}
+        for position, table in enumerate(db_scan):
+            record = TableRecord(
+                position=position,
+                schema_name=table.schema_name,
+                table_name=table.table_name,
+                schema_snippet=render_schema_snippet(table),
+            )
+            self.tables_by_name.setdefault(table.table_name, []).append(record)
+            self.tables_by_folded_name.setdefault(table.table_name.lower(), []).append(
+                record
+            )
+            self.tables_by_schema.setdefault(
+                (table.schema_name, table.table_name), record
+            )
+            for column in table.columns:
+                self.columns.setdefault((table.table_name, column.name), []).append(
+                    ColumnRecord(
+                        position=position,
+                        column_info=render_column_info(table, column),
+                    )
+                )
+
+    def find_tables(self, table_names: List[str]) -> List[TableRecord]:
+        """Returns the tables with any of the names, in scan order"""
+        records = {
+            record.position: record
+            for table_name in table_names
+            for record in self.tables_by_name.get(table_name, [])
+        }
+        return [records[position] for position in sorted(records)]
+
+    def find_table(
+        self, table_name: str, schema_name: str | None = None
+    ) -> TableDescription | None:
+        """Returns the first table with the name, in the schema if it is given. Names are
+        compared ignoring case and surrounding whitespace."""
+        record = (
+            self.tables_by_schema.get((schema_name, table_name))
+            if schema_name
+            else None
+        )
+        if record is None:
+            folded_schema = schema_name.strip().lower() if schema_name else None
+            record = next(
+                (
+                    candidate
+                    for candidate in self.tables_by_folded_name.get(
+                        table_name.strip().lower(), []
+                    )
+                    if folded_schema is None
+                    or (candidate.schema_name or "").lower() == folded_schema
+                ),
+                None,
+            )
+        return None if record is None else self.tables[record.position]
+
+    def find_columns(self, table_name: str, column_name: str) -> List[ColumnRecord]:
+        return self.columns.get((table_name, column_name), [])
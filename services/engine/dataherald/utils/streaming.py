@@ -0,0 +1,60 @@
+import asyncio
+import os
+from threading import Event
+from typing import AsyncIterator
+
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+# The stream is raw markdown and the heartbeats are only sent between whole messages,
+# where a line break doesn't change the rendered answer. It keeps proxies from closing
+# the stream.
+HEARTBEAT = "\n"
+
+
+class StreamCancelledError(Exception):
+    pass
+
+
+class StreamChannel:
+    """Hands the messages of a generation that runs in a thread to the event loop.
+
+    The thread calls `put`, which never blocks, and the loop awaits `messages`, so a
+    worker can serve many streams at once. `None` ends the stream. When the client goes
+    away the channel is cancelled and the thread stops after its current step.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.cancelled = Event()
+
+    def put(self, value: str | None) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, value)
+        except RuntimeError:
+            # The loop is closed, nobody is reading the stream anymore
+            self.cancelled.set()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise StreamCancelledError("The client closed the stream")
+
+    async def messages(
+        self, heartbeat_interval: float = STREAM_HEARTBEAT_INTERVAL
+    ) -> AsyncIterator[str]:
+        """Yields the messages as they arrive and a heartbeat after `heartbeat_interval`
+        seconds without any, 0 disables the heartbeats."""
+        while True:
+            try:
+                if heartbeat_interval > 0:
+                    value = await asyncio.wait_for(self.queue.get(), heartbeat_interval)
+                else:
+                    value = await self.queue.get()
+            except TimeoutError:
+                yield HEARTBEAT
+                continue
+            if value is None:
+                return
+            yield value
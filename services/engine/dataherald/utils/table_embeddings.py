@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from dataherald.db_scanner.models.types import TableDescription, TableEmbedding
+from dataherald.db_scanner.repository.table_embeddings import TableEmbeddingRepository
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-large")
+MAX_CACHED_MATRICES = int(os.environ.get("TABLE_EMBEDDING_MATRIX_CACHE_SIZE", "32"))
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_rows(embeddings: List[List[float]]) -> np.ndarray:
+    if len(embeddings) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_similarities(
+    matrix: np.ndarray, query_embedding: List[float], k: int
+) -> List[Tuple[int, float]]:
+    """Returns the (row index, cosine similarity) pairs of the k rows most similar to the query, best first.
+
+    `matrix` must be row-normalized (see `normalize_rows`)."""
+    if matrix.shape[0] == 0 or k <= 0:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if query_norm:
+        query = query / query_norm
+    similarities = matrix @ query
+    k = min(k, similarities.shape[0])
+    if k < similarities.shape[0]:
+        indexes = np.argpartition(-similarities, k - 1)[:k]
+    else:
+        indexes = np.arange(similarities.shape[0])
+    indexes = indexes[np.argsort(-similarities[indexes], kind="stable")]
+    return [(int(index), float(similarities[index])) for index in indexes]
+
+
+class TableEmbeddingCache:
+    """Persists table representation embeddings so unchanged tables are never re-embedded.
+
+    Entries are keyed by db_connection_id, embedding model and the hash of the
+    representation text, so any change in the text (descriptions, columns) is a miss.
+    """
+
+    _matrices: OrderedDict = OrderedDict()
+    _matrices_lock = Lock()
+
+    def __init__(self, storage: Any, embedding: Embeddings):
+        self.embedding = embedding
+        self.embedding_model = getattr(embedding, "model", None) or EMBEDDING_MODEL
+        self.repository = (
+            TableEmbeddingRepository(storage) if storage is not None else None
+        )
+
+    def embed_tables(
+        self, tables: List[TableDescription], representations: List[str]
+    ) -> List[List[float]]:
+        if self.repository is None or not tables:
+            return self.embedding.embed_documents(representations)
+
+        db_connection_id = tables[0].db_connection_id
+        hashes = [content_hash(representation) for representation in representations]
+        cached = {
+            table_embedding.content_hash: table_embedding.embedding
+            for table_embedding in self.repository.find_by_hashes(
+                db_connection_id, self.embedding_model, list(set(hashes))
+            )
+        }
+        missing = {}
+        for index, hash_value in enumerate(hashes):
+            if hash_value not in cached and hash_value not in missing:
+                missing[hash_value] = index
+        if missing:
+            logger.info(
+                f"Embedding {len(missing)} of {len(tables)} tables for db_connection_id: {db_connection_id}"
+            )
+            new_embeddings = self.embedding.embed_documents(
+                [representations[index] for index in missing.values()]
+            )
+            for (hash_value, index), embedding in zip(
+                missing.items(), new_embeddings, strict=True
+            ):
+                cached[hash_value] = embedding
+                self.repository.save(
+                    TableEmbedding(
+                        db_connection_id=db_connection_id,
+                        embedding_model=self.embedding_model,
+                        schema_name=tables[index].schema_name,
+                        table_name=tables[index].table_name,
+                        content_hash=hash_value,
+                        embedding=embedding,
+                    )
+                )
+        return [cached[hash_value] for hash_value in hashes]
+
+    def embedding_matrix(
+        self, tables: List[TableDescription], representations: List[str]
+    ) -> np.ndarray:
+        """Returns the row-normalized embedding matrix of the tables, aligned with `tables`.
+
+        Matrices are kept in process per db_connection_id, embedding model and set of
+        table representations, so they are reused until any table changes."""
+        if not tables:
+            return np.empty((0, 0), dtype=np.float32)
+        key = (
+            tables[0].db_connection_id,
+            self.embedding_model,
+            content_hash("".join(map(content_hash, representations))),
+        )
+        with self._matrices_lock:
+            matrix = self._matrices.get(key)
+            if matrix is not None:
+                self._matrices.move_to_end(key)
+                return matrix
+        matrix = normalize_rows(self.embed_tables(tables, representations))
+        with self._matrices_lock:
+            self._matrices[key] = matrix
+            while len(self._matrices) > MAX_CACHED_MATRICES:
+                self._matrices.popitem(last=False)
+        return matrix
@@ -0,0 +1,209 @@
+"""Scan worker, claims the queued scan jobs and runs them outside the API processes.
+
+Usage: python -m dataherald.workers.scan
+
+Several workers can run at the same time, every job is claimed by a single worker. The worker
+renews the lease of its job every SCAN_JOB_HEARTBEAT_INTERVAL seconds, the jobs of a worker that
+stops sending heartbeats for SCAN_JOB_LEASE_TIMEOUT seconds are claimed again.
+"""
+
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+
+import dataherald.config
+from dataherald.config import System
+from dataherald.db import DB
+from dataherald.db_scanner import Scanner
+from dataherald.db_scanner.models.types import (
+    ScanJob,
+    ScanJobStatus,
+    TableDescription,
+    TableDescriptionStatus,
+)
+from dataherald.db_scanner.repository.base import TableDescriptionRepository
+from dataherald.db_scanner.repository.query_history import QueryHistoryRepository
+from dataherald.db_scanner.repository.scan_jobs import ScanJobRepository
+from dataherald.repositories.database_connections import (
+    DatabaseConnectionNotFoundError,
+    DatabaseConnectionRepository,
+)
+from dataherald.smart_cache import SmartCache
+from dataherald.sql_database.result_cache import SQLResultCache
+from dataherald.sql_database.services.database_connection import (
+    DatabaseConnectionService,
+)
+
+SCAN_WORKER_POLL_INTERVAL = float(os.environ.get("SCAN_WORKER_POLL_INTERVAL", "5"))
+SCAN_JOB_LEASE_TIMEOUT = int(os.environ.get("SCAN_JOB_LEASE_TIMEOUT", "300"))
+SCAN_JOB_HEARTBEAT_INTERVAL = float(os.environ.get("SCAN_JOB_HEARTBEAT_INTERVAL", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name(prefix: str | None = None) -> str:
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    return f"{prefix}-{name}" if prefix else name
+
+
+def renew_lease(
+    scan_job_repository: ScanJobRepository, scan_job: ScanJob, stopped: Event
+) -> None:
+    """Sends the heartbeats of a running job until it stops, so a table that takes longer
+    than the lease doesn't get the job claimed by another worker"""
+    while not stopped.wait(SCAN_JOB_HEARTBEAT_INTERVAL):
+        try:
+            if scan_job_repository.heartbeat(scan_job.id, scan_job.worker_id) is None:
+                return
+        except Exception as e:
+            logger.warning(f"Unable to renew the lease of scan job {scan_job.id}: {e}")
+
+
+def run_scan_job(system: System, storage: DB, scan_job: ScanJob) -> None:
+    """Scans the tables of a claimed job, updating its progress after every table"""
+    scan_job_repository = ScanJobRepository(storage)
+    table_description_repository = TableDescriptionRepository(storage)
+    table_descriptions = []
+    finished = set()
+
+    def progress(table_description: TableDescription, scanned: bool) -> bool:
+        finished.add(table_description.id)
+        job = scan_job_repository.add_progress(scan_job.id, scanned)
+        # The job stops once it is cancelled or claimed by another worker
+        return (
+            job is not None
+            and job.status == ScanJobStatus.RUNNING.value
+            and job.worker_id == scan_job.worker_id
+        )
+
+    stopped = Event()
+    Thread(
+        target=renew_lease,
+        args=(scan_job_repository, scan_job, stopped),
+        name=f"scan-job-{scan_job.id}-heartbeat",
+        daemon=True,
+    ).start()
+    try:
+        db_connection = DatabaseConnectionRepository(storage).find_by_id(
+            scan_job.db_connection_id
+        )
+        if not db_connection:
+            raise DatabaseConnectionNotFoundError(
+                f"Database connection {scan_job.db_connection_id} not found"
+            )
+        for id in scan_job.table_description_ids:
+            table_description = table_description_repository.find_by_id(id)
+            if table_description:
+                table_descriptions.append(table_description)
+
+        scanner = system.instance(Scanner)
+        database = DatabaseConnectionService(scanner, storage).get_sql_database(
+            db_connection, scan_job.schema_name
+        )
+        scanner.scan(
+            database,
+            table_descriptions,
+            table_description_repository,
+            QueryHistoryRepository(storage),
+            concurrency=db_connection.scan_concurrency,
+            force=scan_job.force,
+            progress=progress,
+        )
+        error = None
+        scan_job = scan_job_repository.finish(
+            scan_job.id, ScanJobStatus.SUCCEEDED.value
+        ) or scan_job_repository.find_by_id(scan_job.id)
+    except Exception as e:
+        logger.error(f"Scan job {scan_job.id} failed: {e}")
+        error = str(e)
+        scan_job_repository.finish(scan_job.id, ScanJobStatus.FAILED.value, error)
+    finally:
+        stopped.set()
+        # Both record the invalidation so the caches of the API processes drop the
+        # results of the previous scan too
+        system.instance(SmartCache).invalidate(scan_job.db_connection_id)
+        SQLResultCache.invalidate(scan_job.db_connection_id, storage)
+
+    if error is None and scan_job.status == ScanJobStatus.CANCELLED.value:
+        error = "Scan job cancelled"
+    # Tables the job didn't get to would stay in SYNCHRONIZING forever
+    for table_description in table_descriptions:
+        if table_description.id not in finished and error is not None:
+            table_description_repository.save_table_info(
+                TableDescription(
+                    db_connection_id=table_description.db_connection_id,
+                    table_name=table_description.table_name,
+                    status=TableDescriptionStatus.FAILED.value,
+                    error_message=error,
+                    schema_name=table_description.schema_name,
+                )
+            )
+
+
+class ScanJobRecovery:
+    """Runs the jobs a stopped API process left behind in background mode, the running
+    jobs whose lease expired and the jobs queued for longer than the lease. One thread
+    per API process checks them every SCAN_JOB_HEARTBEAT_INTERVAL seconds."""
+
+    _thread: Thread | None = None
+    _lock = Lock()
+
+    @staticmethod
+    def start(system: System, storage: DB) -> None:
+        with ScanJobRecovery._lock:
+            if ScanJobRecovery._thread is not None:
+                return
+            ScanJobRecovery._thread = Thread(
+                target=ScanJobRecovery.run,
+                args=(system, storage),
+                name="scan-job-recovery",
+                daemon=True,
+            )
+            ScanJobRecovery._thread.start()
+
+    @staticmethod
+    def run(system: System, storage: DB) -> None:
+        scan_job_repository = ScanJobRepository(storage)
+        worker_id = worker_name("api")
+        while True:
+            time.sleep(SCAN_JOB_HEARTBEAT_INTERVAL)
+            try:
+                scan_job = scan_job_repository.claim(
+                    worker_id,
+                    SCAN_JOB_LEASE_TIMEOUT,
+                    queued_before=datetime.now()
+                    - timedelta(seconds=SCAN_JOB_LEASE_TIMEOUT),
+                )
+                if scan_job is not None:
+                    logger.info(f"Recovering scan job {scan_job.id}")
+                    run_scan_job(system, storage, scan_job)
+            except Exception as e:
+                logger.warning(f"Unable to recover the scan jobs: {e}")
+
+
+def main() -> None:
+    settings = dataherald.config.Settings()
+    system = System(settings)
+    system.start()
+    storage = system.instance(DB)
+    scan_job_repository = ScanJobRepository(storage)
+    worker_id = worker_name()
+    logger.info(f"Scan worker {worker_id} started")
+
+    while True:
+        scan_job = scan_job_repository.claim(worker_id, SCAN_JOB_LEASE_TIMEOUT)
+        if scan_job is None:
+            time.sleep(SCAN_WORKER_POLL_INTERVAL)
+            continue
+        logger.info(
+            f"Running scan job {scan_job.id} with {len(scan_job.table_description_ids)} tables"
+        )
+        run_scan_job(system, storage, scan_job)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
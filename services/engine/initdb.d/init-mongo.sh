@@ -12,4 +12,6 @@ db.createUser({
   }]
 })
 
+db.query_history.createIndex({ query_hash: 1 })
+
 EOF